@@ -1,12 +1,34 @@
 import os
 import json
+import math
+import time
+import hashlib
 import logging
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+from .config import load_env
+from .utils import TitleIndex
+from .triggers import minute_changes
+from . import providers, metrics, preclassifier, resilience
 
-load_dotenv()
+_client = None
+_client_lock = threading.Lock()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def get_client():
+    """
+    Returns the shared OpenAI client. The openai package is only imported
+    once a classification is actually needed.
+    """
+    backend = providers.get("llm")
+    if backend is not None:
+        return backend
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                load_env()
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 SYSTEM_PROMPT = """
 You are a Commodity Risk Sentinel AI. Your job is to analyze price drops and news to classify market moves.
@@ -35,78 +57,675 @@ LANGUAGE INSTRUCTION:
 - Check the 'target_language' provided in the user prompt.
 - If 'zh-TW', write 'key_driver', 'recommended_action', and 'supporting_points' in Traditional Chinese (Taiwanese usage/繁體中文 台灣用語).
 - Keep 'trigger_level', 'news_type', 'direction', 'confidence' in English (as they are enum keys).
+- If the user prompt has an 'Also In' line, add a "translations" object at the end with one entry per listed
+  language: {"<language>": {"key_driver": "...", "recommended_action": "...", "supporting_points": ["..."]}},
+  written in that language. Leave "translations" out otherwise.
 """
 
-def analyze_risk(asset: str, trigger_level: str, price_data: dict, news_items: list) -> dict:
+# Model tiers: without routing every request goes to the strong model
+DEFAULT_STRONG_MODEL = "gpt-4o"
+DEFAULT_FAST_MODEL = "gpt-4o-mini"
+# Levels that get the strong model, however little news there is
+DEFAULT_STRONG_LEVELS = ["L2"]
+# Fast-tier answers with these confidences are re-run on the strong model
+DEFAULT_ESCALATE_CONFIDENCE = ["low"]
+# USD per 1M tokens (input, output), for the cost counters
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60)
+}
+
+SCHEMA_ENUMS = {
+    "news_type": ("emotional", "structural", "unclear"),
+    "direction": ("bullish", "bearish", "neutral"),
+    "confidence": ("low", "medium", "high")
+}
+
+def validate(result) -> list:
     """
-    Uses LLM to classify the situation.
+    Checks a classification against the output schema and returns the
+    problems found (empty when valid). Enum values are lower-cased in place.
     """
-    target_lang = os.getenv("LANGUAGE", "en")
-    news_text = "\n".join([f"- [{n['published_at']}] {n['title']} ({n['source']})" for n in news_items])
-    
-    user_content = f"""
-    ANALYSIS REQUEST
-    Target Language: {target_lang}
+    if not isinstance(result, dict):
+        return ["not a JSON object"]
+    problems = []
+    for field, allowed in SCHEMA_ENUMS.items():
+        value = result.get(field)
+        if isinstance(value, str):
+            value = result[field] = value.strip().lower()
+        if value not in allowed:
+            problems.append(f"{field}={value!r}")
+    for field in ("key_driver", "recommended_action"):
+        if not isinstance(result.get(field), str):
+            problems.append(f"{field} missing")
+    return problems
+
+def route(trigger_level: str, routing: dict) -> str:
+    """
+    Model tier for a request: 'strong' for the strong levels (L2), even when
+    the news fetch came back thin or empty, 'fast' for the lower levels (L1).
+    Always 'strong' without routing.
+    """
+    if not routing or not routing.get('enabled'):
+        return "strong"
+    if trigger_level in routing.get('strong_levels', DEFAULT_STRONG_LEVELS):
+        return "strong"
+    return "fast"
+
+def tier_model(tier: str, routing: dict) -> str:
+    routing = routing or {}
+    if tier == "fast":
+        return routing.get('fast_model', DEFAULT_FAST_MODEL)
+    return routing.get('strong_model', DEFAULT_STRONG_MODEL)
+
+# Price moves are bucketed (in % points) so small wiggles reuse a cached classification
+DEFAULT_PRICE_BUCKET = 1.0
+# Oldest cached classification served while the LLM is unavailable
+DEFAULT_MAX_STALE_HOURS = 48
+
+def headline_hash(news_items: list) -> str:
+    """
+    Order-independent hash of the normalized headline set.
+    """
+    titles = sorted({" ".join(n.get('title', '').lower().split()) for n in news_items})
+    return hashlib.sha256("\n".join(titles).encode("utf-8")).hexdigest()[:16]
+
+def classification_key(asset: str, trigger_level: str, price_data: dict, news_items: list,
+                       target_lang: str, price_bucket: float = DEFAULT_PRICE_BUCKET) -> str:
+    """
+    Cache key: asset, trigger level, language, bucketed 1D/3D move and headline hash.
+    """
+    def bucket(change):
+        return math.floor(float(change) / price_bucket) * price_bucket
+
+    return "|".join([
+        "risk",
+        asset,
+        trigger_level,
+        target_lang,
+        f"{bucket(price_data['change_1d']):g}",
+        f"{bucket(price_data['change_3d']):g}",
+        headline_hash(news_items)
+    ])
+
+# The fields that make an alert actionable. They come before supporting_points
+# and news_used in the schema, so a streamed answer has them early.
+PROVISIONAL_FIELDS = ("news_type", "direction", "confidence", "key_driver", "recommended_action")
+
+class FieldScanner:
+    """
+    Incremental parser for a JSON object that arrives in pieces. Top-level
+    fields are picked up as soon as their value is complete, long before the
+    closing brace.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self._pos = None
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos: int, chars: str = " \t\r\n") -> int:
+        while pos < len(self.text) and self.text[pos] in chars:
+            pos += 1
+        return pos
+
+    def feed(self, chunk: str) -> dict:
+        """Adds streamed text; returns the fields completed by it."""
+        self.text += chunk
+        if self._pos is None:
+            start = self.text.find("{")
+            if start < 0:
+                return {}
+            self._pos = start + 1
+
+        completed = {}
+        while True:
+            pos = self._skip(self._pos, " \t\r\n,")
+            if pos >= len(self.text) or self.text[pos] == "}":
+                break
+            try:
+                key, pos = self._decoder.raw_decode(self.text, pos)
+                pos = self._skip(pos)
+                if pos >= len(self.text) or self.text[pos] != ":":
+                    break
+                value, end = self._decoder.raw_decode(self.text, self._skip(pos + 1))
+            except ValueError:
+                # Key or value still incomplete
+                break
+            # A number is only complete once something follows it
+            if self._skip(end) >= len(self.text):
+                break
+            completed[key] = value
+            self._pos = end
+
+        self.fields.update(completed)
+        return completed
+
+class ResultsScanner:
+    """
+    Incremental parser for a streamed batch answer ({"results": [...]}).
+    Each result object is picked up as soon as it is complete, before the
+    rest of the batch has arrived.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.results = []
+        self._pos = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str) -> list:
+        """Adds streamed text; returns the result objects completed by it."""
+        self.text += chunk
+        if self._pos is None:
+            key = self.text.find('"results"')
+            start = self.text.find("[", key) if key >= 0 else -1
+            if start < 0:
+                return []
+            self._pos = start + 1
+
+        completed = []
+        while True:
+            pos = self._pos
+            while pos < len(self.text) and self.text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.text) or self.text[pos] == "]":
+                break
+            try:
+                value, end = self._decoder.raw_decode(self.text, pos)
+            except ValueError:
+                # Result still incomplete
+                break
+            completed.append(value)
+            self._pos = end
+
+        self.results.extend(completed)
+        return completed
+
+BATCH_INSTRUCTION = """
+BATCH MODE:
+You will receive several assets in one request, each in its own ASSET block.
+Classify every asset independently using the Output Schema above.
+Return a single JSON object: {"results": [<one Output Schema object per asset>]}
+Keep the same order as the ASSET blocks and copy each block's 'asset' value exactly.
+"""
+
+def _coverage(news_item: dict) -> str:
+    # Story intensity: how many near-duplicate headlines were clustered together
+    size = news_item.get('cluster_size', 1)
+    return f" [reported by {size} outlets]" if size > 1 else ""
+
+def build_request_text(asset: str, trigger_level: str, price_data: dict, news_items: list) -> str:
+    """
+    The per-asset part of the user prompt.
+    """
+    news_text = "\n".join([f"- [{n['published_at']}] {n['title']} ({n['source']}){_coverage(n)}" for n in news_items])
+    # Headlines from a cached feed when the live one failed
+    stale = max((n.get('stale_seconds', 0) for n in news_items if n.get('stale')), default=None)
+    news_heading = "Recent News:" if stale is None else (
+        f"Recent News (from a cached feed {stale / 3600:.0f}h old; the live feed was unavailable):"
+    )
+    # Intraday triggers also carry the moves over the last minutes
+    intraday = ", ".join(f"{n}min: {change}%" for n, change in minute_changes(price_data))
+    movement = f"1D: {price_data['change_1d']}%, 3D: {price_data['change_3d']}%"
+    if intraday:
+        movement += f", Intraday: {intraday} (as of {price_data.get('bar_time')})"
+    # Grouped triggers: the asset is a group index, the members moved together
+    members = "".join(
+        f"\n    - {m['symbol']}: 1D {m['change_1d']}%, 3D {m['change_3d']}%" + (f" ({m['level']})" if m.get('level') else "")
+        for m in price_data.get('members') or []
+    )
+    if members:
+        members = f"\n    Group Members (average correlation {price_data.get('correlation')}):{members}"
+    return f"""
     Asset: {asset}
     Trigger Level: {trigger_level}
-    Price Movement: 1D: {price_data['change_1d']}%, 3D: {price_data['change_3d']}%
-    Current Price: {price_data['current_price']}
+    Price Movement: {movement}
+    Current Price: {price_data['current_price']}{members}
 
-    Recent News:
+    {news_heading}
     {news_text}
+    """
 
-    Task: Classify if this Move is EMOTIONAL (panic) or STRUCTURAL (fundamental).
+def resolve_languages(languages: list = None) -> list:
+    """
+    Languages a classification is written in, main language first
+    (default: the LANGUAGE setting).
+    """
+    return list(languages) if languages else [os.getenv("LANGUAGE", "en")]
+
+def _also_in(extra_langs: list) -> str:
+    # Prompt line asking for translations of the texts
+    return f"\n    Also In: {', '.join(extra_langs)}" if extra_langs else ""
+
+RECOMMENDED_ACTIONS = {
+    "en": {
+        "contrarian": "Potential contrarian opportunity (consider DCA)",
+        "against_trend": "Do NOT buy against trend",
+        "wait": "Wait and monitor"
+    },
+    "zh-TW": {
+        "contrarian": "潛在反向操作機會 (考慮分批進場)",
+        "against_trend": "切勿逆勢承接",
+        "wait": "觀望為宜，持續監控"
+    }
+}
+
+def recommended_action(trigger_level: str, news_type: str, direction: str, lang: str) -> str:
+    """
+    The rule-based recommended_action in `lang`, or None when no rule applies.
+    """
+    actions = RECOMMENDED_ACTIONS.get(lang, RECOMMENDED_ACTIONS["en"])
+    if trigger_level == "L2" and news_type == "emotional":
+        return actions["contrarian"]
+    if news_type == "structural" and direction == "bearish":
+        return actions["against_trend"]
+    if news_type == "unclear":
+        return actions["wait"]
+    return None
+
+def postprocess(result: dict, trigger_level: str, news_items: list, target_lang: str,
+                extra_langs: list = ()) -> dict:
+    """
+    Backfills news links and enforces the recommended_action rules, in the
+    main language and in the translations for extra_langs.
+    """
+    # Post-Processing: Backfill LINKS to news_used items
+    # The AI output might not have the 'link' or might hallucinate it.
+    # We match based on title similarity or just assume the AI picked from our list.
+    # Simpler approach: Just augment the report with the top provided news items
+    # that match the titles the AI chose.
+
+    if result.get('news_used'):
+        # Built once per news batch; each lookup is a hash hit or a handful of fuzzy compares
+        index = TitleIndex(news_items)
+        for ai_news in result['news_used']:
+            # Find best matching original item to get the link
+            link, score = index.find_link(ai_news.get('title', ''))
+            ai_news['link'] = link
+            ai_news['match_score'] = round(score, 2)
+
+    # Enforce overrides just in case LLM misses strict specific logic
+    # We only override if it matches the specific condition AND we match the language of the output
+    # To avoid complexity, we rely on the prompt for language, but if we must override, we check env.
+
+    action = recommended_action(trigger_level, result.get("news_type"), result.get("direction"), target_lang)
+    if action:
+        result["recommended_action"] = action
+
+    if extra_langs:
+        # Same rules per language; a missing translation falls back to the main texts
+        translations = result.get("translations") if isinstance(result.get("translations"), dict) else {}
+        result["translations"] = {}
+        for lang in extra_langs:
+            translation = translations.get(lang) if isinstance(translations.get(lang), dict) else {}
+            action = recommended_action(trigger_level, result.get("news_type"), result.get("direction"), lang)
+            if action:
+                translation["recommended_action"] = action
+            result["translations"][lang] = translation
+
+    return result
+
+def classify_locally(asset: str, trigger_level: str, news_items: list, settings: dict = None,
+                     languages: list = None) -> dict:
+    """
+    Local lexicon pre-classification (see preclassifier). Returns a
+    postprocessed result for clear-cut headline sets, or None when the LLM
+    is needed.
     """
+    load_env()
+    target_lang, *extra_langs = resolve_languages(languages)
+    with metrics.timer("preclassify"):
+        result = preclassifier.preclassify(asset, trigger_level, news_items, target_lang, settings, extra_langs)
+    metrics.incr("preclassified_total", outcome=result['news_type'] if result else "llm")
+    if result is None:
+        return None
+    return postprocess(result, trigger_level, news_items, target_lang, extra_langs)
+
+def _cache_lookup(cache, asset, trigger_level, price_data, news_items, target_lang, price_bucket):
+    # Returns (cache_key, cached_result); both None without a cache
+    if cache is None:
+        return None, None
+    cache_key = classification_key(asset, trigger_level, price_data, news_items, target_lang, price_bucket)
+    cached = cache.get(cache_key)
+    if cached:
+        logging.info(f"Classification cache hit for {asset} ({trigger_level})")
+        metrics.incr("cache_requests_total", cache="llm", result="hit")
+        return cache_key, cached['result']
+    metrics.incr("cache_requests_total", cache="llm", result="miss")
+    return cache_key, None
+
+def _record_usage(usage, tier: str, model: str, routing: dict):
+    # Token counts as reported by the API (absent on some backends)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    metrics.incr("llm_tokens_total", prompt_tokens, kind="prompt", tier=tier)
+    metrics.incr("llm_tokens_total", completion_tokens, kind="completion", tier=tier)
+
+    pricing = dict(MODEL_PRICING)
+    pricing.update((routing or {}).get('pricing') or {})
+    input_price, output_price = pricing.get(model, (0.0, 0.0))
+    metrics.incr("llm_cost_usd_total", (prompt_tokens * input_price + completion_tokens * output_price) / 1e6, tier=tier)
+
+def _cache_store(cache, cache_key, result, news_items):
+    if cache is not None and cache_key:
+        cache.set(cache_key, {
+            "result": result,
+            # With their coverage, so eval_preclassifier replays the live decision
+            "headlines": [
+                {"title": n.get('title', ''), "cluster_size": n.get('cluster_size', 1)} for n in news_items
+            ]
+        })
+
+def _last_known_good(cache, asset: str, trigger_level: str, languages: list,
+                     max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> dict:
+    """
+    The latest cached classification of the asset at this level and in these
+    languages, whatever its headlines and price move, marked 'stale' with its
+    age in 'stale_seconds'. Served when the LLM is unavailable; None without
+    one younger than max_stale_hours.
+    """
+    if cache is None:
+        return None
+    entries = cache.items(f"risk|{asset}|{trigger_level}|{'+'.join(languages)}|", max_age=float(max_stale_hours) * 3600)
+    if not entries:
+        return None
+    _, value, created_at = entries[-1]
+    age = max(0.0, time.time() - created_at)
+    logging.warning(f"Serving the last known classification of {asset} ({trigger_level}), "
+                    f"{age / 3600:.1f}h old, while the LLM is unavailable.")
+    metrics.incr("llm_fallback_total", source="last_known_good")
+    return dict(value['result'], stale=True, stale_seconds=round(age))
 
+def _send_provisional(fields: dict, asset: str, trigger_level: str, languages: list, on_provisional):
+    # Hands the PROVISIONAL_FIELDS of a streamed answer to on_provisional if they validate
+    partial = {field: fields.get(field) for field in PROVISIONAL_FIELDS}
+    partial.update(asset=asset, trigger_level=trigger_level, provisional=True)
+    problems = validate(partial)
+    if problems:
+        logging.warning(f"Partial answer for {asset} does not match the schema ({', '.join(problems)}); "
+                        f"no preliminary alert.")
+        metrics.incr("llm_invalid_total", tier="provisional")
+        return
     try:
-        logging.info(f"Sending analysis request for {asset}...")
-        response = client.chat.completions.create(
-            model="gpt-4o",  # or gpt-3.5-turbo if preferred, assuming gpt-4o for quality
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_content}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3
-        )
-        
-        content = response.choices[0].message.content
-        result = json.loads(content)
-        
-        # Post-Processing: Backfill LINKS to news_used items
-        # The AI output might not have the 'link' or might hallucinate it.
-        # We match based on title similarity or just assume the AI picked from our list.
-        # Simpler approach: Just augment the report with the top provided news items 
-        # that match the titles the AI chose.
-        
-        if result.get('news_used'):
-            from .utils import find_best_match_link
-            for ai_news in result['news_used']:
-                # Find best matching original item to get the link
-                link = find_best_match_link(ai_news.get('title', ''), news_items)
-                ai_news['link'] = link
-        
-        # Enforce overrides just in case LLM misses strict specific logic
-        # We only override if it matches the specific condition AND we match the language of the output
-        # To avoid complexity, we rely on the prompt for language, but if we must override, we check env.
-        
-        if target_lang == "zh-TW":
-            if trigger_level == "L2" and result.get("news_type") == "emotional":
-                result["recommended_action"] = "潛在反向操作機會 (考慮分批進場)"
-            elif result.get("news_type") == "structural" and result.get("direction") == "bearish":
-                result["recommended_action"] = "切勿逆勢承接"
-            elif result.get("news_type") == "unclear":
-                result["recommended_action"] = "觀望為宜，持續監控"
+        on_provisional(postprocess(partial, trigger_level, [], languages[0], languages[1:]))
+    except Exception as e:
+        logging.error(f"Provisional alert for {asset} failed: {e}")
+
+def _stream_completion(request: dict, on_text) -> tuple:
+    """
+    Streams the completion, passing each piece of text to on_text as it
+    arrives. Returns (response text, usage).
+    """
+    parts = []
+    usage = None
+    stream = get_client().chat.completions.create(
+        **request, stream=True, stream_options={"include_usage": True}
+    )
+    for chunk in stream:
+        if getattr(chunk, 'usage', None) is not None:
+            usage = chunk.usage
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        delta = chunk.choices[0].delta.content
+        parts.append(delta)
+        on_text(delta)
+    return "".join(parts), usage
+
+def _stream_single(asset: str, trigger_level: str, languages: list, on_provisional):
+    """
+    on_text for a streamed single answer: calls on_provisional once the
+    PROVISIONAL_FIELDS are complete.
+    """
+    scanner = FieldScanner()
+    started = time.perf_counter()
+    sent = False
+
+    def on_text(delta):
+        nonlocal sent
+        if sent:
+            return
+        scanner.feed(delta)
+        if all(field in scanner.fields for field in PROVISIONAL_FIELDS):
+            sent = True
+            metrics.observe("llm_first_fields", time.perf_counter() - started)
+            _send_provisional(scanner.fields, asset, trigger_level, languages, on_provisional)
+    return on_text
+
+def _stream_batch(requests: list, languages: list):
+    """
+    on_text for a streamed batch answer: calls each request's on_provisional
+    once its result object is complete, matched by asset name or position.
+    """
+    scanner = ResultsScanner()
+    started = time.perf_counter()
+    by_name = {req['asset']: req for req in requests}
+
+    def on_text(delta):
+        for result in scanner.feed(delta):
+            n = len(scanner.results) - 1
+            req = by_name.get(result.get('asset')) if isinstance(result, dict) else None
+            if req is None and n < len(requests):
+                req = requests[n]
+            if req is None or not req.get('on_provisional') or not isinstance(result, dict):
+                continue
+            metrics.observe("llm_first_fields", time.perf_counter() - started)
+            _send_provisional(result, req['asset'], req['trigger_level'], languages, req['on_provisional'])
+    return on_text
+
+def _request_completion(messages: list, tier: str, routing: dict, on_text=None) -> str:
+    """
+    One chat completion on the model of `tier`. Records per-tier latency,
+    tokens and cost. With on_text, the answer is streamed through it.
+    Returns the response text.
+    """
+    model = tier_model(tier, routing)
+    request = dict(
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"},
+        temperature=0.3
+    )
+    with metrics.timer(f"llm_request_{tier}"):
+        if on_text is not None:
+            content, usage = resilience.call("llm", _stream_completion, request, on_text)
         else:
-            if trigger_level == "L2" and result.get("news_type") == "emotional":
-                result["recommended_action"] = "Potential contrarian opportunity (consider DCA)"
-            elif result.get("news_type") == "structural" and result.get("direction") == "bearish":
-                result["recommended_action"] = "Do NOT buy against trend"
-            elif result.get("news_type") == "unclear":
-                result["recommended_action"] = "Wait and monitor"
-            
+            response = resilience.call("llm", get_client().chat.completions.create, **request)
+            content, usage = response.choices[0].message.content, getattr(response, 'usage', None)
+    _record_usage(usage, tier, model, routing)
+    return content
+
+def _parse_checked(content: str) -> tuple:
+    # (result, schema problems); malformed JSON is a problem like any other
+    try:
+        result = json.loads(content)
+    except ValueError as e:
+        return None, [f"invalid JSON ({e})"]
+    return result, validate(result)
+
+def _should_escalate(tier: str, result: dict, problems: list, routing: dict) -> bool:
+    if tier != "fast":
+        return False
+    escalate_confidence = (routing or {}).get('escalate_confidence', DEFAULT_ESCALATE_CONFIDENCE)
+    return bool(problems) or result.get('confidence') in escalate_confidence
+
+def analyze_risk(asset: str, trigger_level: str, price_data: dict, news_items: list,
+                 cache=None, price_bucket: float = DEFAULT_PRICE_BUCKET, on_provisional=None,
+                 routing: dict = None, tier: str = None, languages: list = None,
+                 max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> dict:
+    """
+    Uses LLM to classify the situation.
+    With a cache, identical situations (same asset, level, bucketed move and
+    headlines) are answered from the cache without calling the API. When the
+    LLM fails, the last cached classification younger than max_stale_hours
+    is served instead, marked 'stale'.
+    With on_provisional, a strong-tier answer is streamed and on_provisional
+    receives a partial result (classification and action, no supporting
+    points or news links, 'provisional': True) as soon as those fields have
+    arrived and validate. It is called while the LLM request is still in
+    flight, so it should hand the alert off rather than send it. A fast-tier
+    answer is not streamed, since it may still be escalated; its strong
+    re-run is.
+    With routing (the 'llm.routing' config), the model tier is picked by
+    route() unless `tier` is given; a fast-tier answer that is invalid or
+    not confident enough is re-run on the strong model.
+    With several languages, the texts are written in the first one and
+    'translations' carries them in the others, all from the same request.
+    """
+    load_env()
+    languages = resolve_languages(languages)
+    target_lang, *extra_langs = languages
+
+    cache_key, cached = _cache_lookup(
+        cache, asset, trigger_level, price_data, news_items, "+".join(languages), price_bucket
+    )
+    if cached:
+        return cached
+
+    user_content = f"""
+    ANALYSIS REQUEST
+    Target Language: {target_lang}{_also_in(extra_langs)}
+    {build_request_text(asset, trigger_level, price_data, news_items)}
+    Task: Classify if this Move is EMOTIONAL (panic) or STRUCTURAL (fundamental).
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+    tier = tier or route(trigger_level, routing)
+
+    try:
+        while True:
+            # A fast answer may still be escalated, so only strong answers
+            # send a preliminary alert
+            on_text = None
+            if on_provisional is not None and tier == "strong":
+                on_text = _stream_single(asset, trigger_level, languages, on_provisional)
+            logging.info(f"Sending analysis request for {asset} ({tier_model(tier, routing)})...")
+            result, problems = _parse_checked(_request_completion(messages, tier, routing, on_text))
+            if not _should_escalate(tier, result, problems, routing):
+                break
+            reason = ", ".join(problems) or f"confidence {result.get('confidence')}"
+            logging.info(f"Escalating {asset} to the strong model ({reason})")
+            metrics.incr("llm_escalations_total")
+            tier = "strong"
+
+        if problems:
+            logging.error(f"AI Analysis for {asset} does not match the schema: {', '.join(problems)}")
+            metrics.incr("llm_invalid_total", tier=tier)
+            return None
+
+        result = postprocess(result, trigger_level, news_items, target_lang, extra_langs)
+
+        _cache_store(cache, cache_key, result, news_items)
         return result
 
     except Exception as e:
         logging.error(f"AI Analysis failed: {e}")
-        return None
+        metrics.incr("api_errors_total", service="llm")
+        return _last_known_good(cache, asset, trigger_level, languages, max_stale_hours)
+
+def analyze_risk_batch(requests: list, cache=None, price_bucket: float = DEFAULT_PRICE_BUCKET,
+                       routing: dict = None, max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> list:
+    """
+    Classifies several triggered assets with a single LLM request.
+    Each request is a dict with 'asset', 'trigger_level', 'price_data', 'news_items'
+    and optionally 'languages' and 'on_provisional' (the analyze_risk
+    arguments); all requests of a batch must share the same languages.
+    Returns one result (or None) per request, in order.
+    With routing, the batch uses the fast model only if every asset routes
+    there; fast answers that need escalation are re-run one by one.
+    A strong-tier batch with on_provisional requests is streamed; each of
+    them gets its preliminary result as soon as its part of the answer is
+    complete.
+    """
+    load_env()
+    languages = resolve_languages(requests[0].get('languages') if requests else None)
+    target_lang, *extra_langs = languages
+    results = [None] * len(requests)
+
+    # 1. Serve what we can from the cache
+    pending = []
+    cache_keys = {}
+    for i, req in enumerate(requests):
+        cache_key, cached = _cache_lookup(
+            cache, req['asset'], req['trigger_level'], req['price_data'], req['news_items'], "+".join(languages), price_bucket
+        )
+        if cached:
+            results[i] = cached
+        else:
+            cache_keys[i] = cache_key
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    tiers = {route(requests[i]['trigger_level'], routing) for i in pending}
+    tier = "fast" if tiers == {"fast"} else "strong"
+    if len(pending) == 1:
+        i = pending[0]
+        results[i] = analyze_risk(**requests[i], cache=cache, price_bucket=price_bucket, routing=routing, tier=tier,
+                                  max_stale_hours=max_stale_hours)
+        return results
+
+    # 2. One request for all remaining assets
+    blocks = "\n".join(
+        f"    ASSET {n + 1}{build_request_text(req['asset'], req['trigger_level'], req['price_data'], req['news_items'])}"
+        for n, req in enumerate(requests[i] for i in pending)
+    )
+    user_content = f"""
+    BATCH ANALYSIS REQUEST
+    Target Language: {target_lang}{_also_in(extra_langs)}
+    Number of Assets: {len(pending)}
+{blocks}
+    Task: For EACH asset, classify if the Move is EMOTIONAL (panic) or STRUCTURAL (fundamental).
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT + BATCH_INSTRUCTION},
+        {"role": "user", "content": user_content}
+    ]
+
+    names = [requests[i]['asset'] for i in pending]
+    on_text = None
+    if tier == "strong" and any(requests[i].get('on_provisional') for i in pending):
+        on_text = _stream_batch([requests[i] for i in pending], languages)
+    try:
+        logging.info(f"Sending batched analysis request for {', '.join(names)} ({tier_model(tier, routing)})...")
+        batch = json.loads(_request_completion(messages, tier, routing, on_text)).get('results') or []
+    except Exception as e:
+        logging.error(f"Batched AI Analysis failed: {e}")
+        metrics.incr("api_errors_total", service="llm")
+        for i in pending:
+            results[i] = _last_known_good(cache, requests[i]['asset'], requests[i]['trigger_level'], languages,
+                                          max_stale_hours)
+        return results
+
+    # 3. Match results back by asset name, falling back to position
+    by_name = {r.get('asset'): r for r in batch if isinstance(r, dict)}
+    for n, i in enumerate(pending):
+        req = requests[i]
+        result = by_name.get(req['asset'])
+        if result is None and len(batch) == len(pending) and isinstance(batch[n], dict):
+            result = batch[n]
+        if result is None:
+            logging.error(f"Batched AI Analysis returned no result for {req['asset']}")
+            continue
+        problems = validate(result)
+        if _should_escalate(tier, result, problems, routing):
+            reason = ", ".join(problems) or f"confidence {result.get('confidence')}"
+            logging.info(f"Escalating {req['asset']} to the strong model ({reason})")
+            metrics.incr("llm_escalations_total")
+            results[i] = analyze_risk(**req, cache=cache, price_bucket=price_bucket, routing=routing, tier="strong",
+                                      max_stale_hours=max_stale_hours)
+            continue
+        if problems:
+            logging.error(f"Batched AI Analysis for {req['asset']} does not match the schema: {', '.join(problems)}")
+            metrics.incr("llm_invalid_total", tier=tier)
+            continue
+        results[i] = postprocess(result, req['trigger_level'], req['news_items'], target_lang, extra_langs)
+        _cache_store(cache, cache_keys[i], results[i], req['news_items'])
+
+    return results
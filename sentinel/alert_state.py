@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Higher rank = more severe
+LEVEL_RANK = {None: 0, "L1": 1, "L2": 2}
+
+DEFAULT_COOLDOWN_MINUTES = 240
+DEFAULT_HYSTERESIS_PCT = 1.0
+
+class AlertState:
+    """
+    Remembers the last alert per asset (level, price, time, headline hash) in a
+    JSON file, and decides whether a new trigger is worth the
+    news -> AI -> notify path.
+
+    Policies (the 'alerts' config section):
+    - escalation: a more severe level always alerts.
+    - hysteresis_pct: a further drop of this many % below the last alerted
+      price alerts again; the asset re-arms only after recovering this much
+      above it with no trigger firing.
+    - cooldown_minutes: otherwise nothing re-alerts within the cooldown.
+    - escalation_only: after the cooldown the same level still stays quiet
+      until the asset re-arms.
+    - unchanged headlines after the cooldown never re-alert on their own.
+    """
+
+    def __init__(self, path: str, cooldown_minutes: float = DEFAULT_COOLDOWN_MINUTES,
+                 hysteresis_pct: float = DEFAULT_HYSTERESIS_PCT, escalation_only: bool = False):
+        self.path = path
+        self.cooldown = float(cooldown_minutes) * 60
+        self.hysteresis_pct = float(hysteresis_pct)
+        self.escalation_only = escalation_only
+        self._lock = threading.Lock()
+        self.records = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Could not read alert state {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        # Write-then-rename so a crash never leaves a half-written file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.records, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, ticker: str) -> dict:
+        return self.records.get(ticker)
+
+    def check(self, ticker: str, level: str, price: float, now: float = None) -> tuple:
+        """
+        Decides whether a fired trigger should be analyzed.
+        Returns (proceed, reason).
+        """
+        now = time.time() if now is None else now
+        record = self.records.get(ticker)
+        if record is None:
+            return True, "new"
+        if LEVEL_RANK.get(level, 0) > LEVEL_RANK.get(record.get('level'), 0):
+            return True, "escalated"
+        if self.hysteresis_pct and price <= record['price'] * (1 - self.hysteresis_pct / 100):
+            return True, "fell further"
+        if now - record['alerted_at'] < self.cooldown:
+            return False, "cooldown"
+        if self.escalation_only:
+            return False, "no escalation"
+        return True, "cooldown expired"
+
+    def headlines_changed(self, ticker: str, headline_hash: str, reason: str) -> bool:
+        """
+        After the cooldown, the same level with the same headlines is not a new situation.
+        """
+        record = self.records.get(ticker)
+        if record is None or reason != "cooldown expired":
+            return True
+        return record.get('headline_hash') != headline_hash
+
+    def record_alert(self, ticker: str, level: str, price: float, headline_hash: str, now: float = None):
+        with self._lock:
+            self.records[ticker] = {
+                "level": level,
+                "price": float(price),
+                "alerted_at": time.time() if now is None else now,
+                "headline_hash": headline_hash
+            }
+            self._save()
+
+    def observe_quiet(self, ticker: str, price: float):
+        """
+        Called for assets without a trigger. Re-arms the asset once it has
+        recovered hysteresis_pct above the last alerted price.
+        """
+        record = self.records.get(ticker)
+        if record is None:
+            return
+        if price >= record['price'] * (1 + self.hysteresis_pct / 100):
+            with self._lock:
+                self.records.pop(ticker, None)
+                self._save()
+            logging.info(f"{ticker} recovered; alert state cleared.")
+
+def open_alert_state(alert_config: dict):
+    """
+    Builds the AlertState from the 'alerts' config section, or None when disabled.
+    """
+    alert_config = alert_config or {}
+    if not alert_config.get('enabled'):
+        return None
+    root = os.path.dirname(os.path.dirname(__file__))
+    return AlertState(
+        os.path.join(root, alert_config.get('path', 'data/alert_state.json')),
+        cooldown_minutes=alert_config.get('cooldown_minutes', DEFAULT_COOLDOWN_MINUTES),
+        hysteresis_pct=alert_config.get('hysteresis_pct', DEFAULT_HYSTERESIS_PCT),
+        escalation_only=bool(alert_config.get('escalation_only', False))
+    )
@@ -0,0 +1,275 @@
+"""
+Historical replay of the price triggers over the local price store.
+
+Replays the configured triggers over every stored daily bar of the
+watchlist and reports trigger counts, hit rates and forward returns per
+level. It also sweeps level_1 / level_2 threshold grids. The sweep bins every
+(symbol, day) once into a 3-D histogram indexed by the grid positions of its
+1D and 3D changes. Cumulative sums over that histogram then give the result of
+every threshold combination at once. Symbols are binned in parallel across cores.
+
+    venv/bin/python -m sentinel.backtest --l1 -2:-5:0.5 --l2-1d -4:-8:0.5 --l2-3d -6:-12:1
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from . import price
+from .triggers import TriggerEngine, LEVELS
+
+DEFAULT_HORIZONS = [1, 5, 20]
+
+def load_history(symbols: list, store) -> dict:
+    """
+    {symbol: closes} for every symbol with stored bars (copied out of the memmap).
+    """
+    history = {}
+    for symbol in symbols:
+        closes = np.array(store.bars(symbol)['close'], dtype=float)
+        if len(closes):
+            history[symbol] = closes
+    return history
+
+def changes_and_forward(closes: np.ndarray, horizons: list) -> tuple:
+    """
+    Per-day 1D and 3D % changes and forward % returns for each horizon.
+    Days without enough history or future are NaN.
+    """
+    n = len(closes)
+
+    def shifted_change(back, forward):
+        out = np.full(n, np.nan)
+        if n > back + forward:
+            start, end = back, n - forward
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[start:end] = (closes[start + forward:n] / closes[0:end - back] - 1) * 100
+        return out
+
+    # Rounded like the live market data, so thresholds behave identically
+    change_1d = np.round(shifted_change(1, 0), 2)
+    change_3d = np.round(shifted_change(3, 0), 2)
+    forward = {}
+    for h in horizons:
+        fwd = np.full(n, np.nan)
+        if n > h:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fwd[:n - h] = (closes[h:] / closes[:n - h] - 1) * 100
+        forward[h] = fwd
+    return change_1d, change_3d, forward
+
+def parse_grid(spec: str) -> np.ndarray:
+    """
+    'start:stop:step' (inclusive, e.g. '-2:-5:0.5') or a comma list ('-3,-4').
+    """
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        step = -abs(step) if stop < start else abs(step)
+        count = int(round((stop - start) / step)) + 1
+        return np.round(start + step * np.arange(count), 6)
+    return np.array([float(x) for x in spec.split(",")])
+
+def _histograms(args) -> dict:
+    """
+    Bins one chunk of symbols. Grid axes: L1 1D threshold (c), L2 1D threshold (a),
+    L2 3D threshold (b). Cell [kc, ka, kb] holds days where
+      c1 <= C[k]  for k >= kc,   c1 > A[i] for i < ka,   c3 > B[j] for j < kb.
+    """
+    closes_list, grid_c, grid_a, grid_b, horizons = args
+    shape = (len(grid_c) + 1, len(grid_a) + 1, len(grid_b) + 1)
+    size = int(np.prod(shape))
+    result = {"count": np.zeros(size)}
+    for h in horizons:
+        result[f"valid_{h}"] = np.zeros(size)
+        result[f"sum_{h}"] = np.zeros(size)
+        result[f"hits_{h}"] = np.zeros(size)
+
+    for closes in closes_list:
+        c1, c3, forward = changes_and_forward(closes, horizons)
+        ok = ~np.isnan(c1) & ~np.isnan(c3)
+        if not ok.any():
+            continue
+        c1, c3 = c1[ok], c3[ok]
+        kc = np.searchsorted(grid_c, c1, side='left')
+        ka = np.searchsorted(grid_a, c1, side='left')
+        kb = np.searchsorted(grid_b, c3, side='left')
+        flat = np.ravel_multi_index((kc, ka, kb), shape)
+
+        result["count"] += np.bincount(flat, minlength=size)
+        for h in horizons:
+            fwd = forward[h][ok]
+            valid = ~np.isnan(fwd)
+            result[f"valid_{h}"] += np.bincount(flat[valid], minlength=size)
+            result[f"sum_{h}"] += np.bincount(flat[valid], weights=fwd[valid], minlength=size)
+            result[f"hits_{h}"] += np.bincount(flat[valid], weights=(fwd[valid] > 0).astype(float), minlength=size)
+    return {k: v.reshape(shape) for k, v in result.items()}
+
+def sweep(history: dict, grid_l1: np.ndarray, grid_l2_1d: np.ndarray, grid_l2_3d: np.ndarray,
+          horizons: list = DEFAULT_HORIZONS, workers: int = None) -> dict:
+    """
+    Evaluates every (level_1.change_1d, level_2.change_1d, level_2.change_3d)
+    combination. Returns arrays of shape (len(grid_l1), len(grid_l2_1d), len(grid_l2_3d))
+    under keys like 'L2_count', 'L1_mean_5', 'L2_hit_rate_20'.
+    """
+    # Sorted ascending for searchsorted; results are mapped back to input order
+    order = [np.argsort(g) for g in (grid_l1, grid_l2_1d, grid_l2_3d)]
+    grid_c, grid_a, grid_b = (np.asarray(g, dtype=float)[o] for g, o in zip((grid_l1, grid_l2_1d, grid_l2_3d), order))
+
+    series = list(history.values())
+    workers = max(1, min(workers or os.cpu_count() or 1, len(series) or 1))
+    chunks = [series[i::workers] for i in range(workers)]
+    jobs = [(chunk, grid_c, grid_a, grid_b, horizons) for chunk in chunks if chunk]
+
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+            parts = list(executor.map(_histograms, jobs))
+    else:
+        parts = [_histograms(job) for job in jobs]
+
+    if not parts:
+        raise ValueError("No price history to replay")
+    totals = {k: sum(p[k] for p in parts) for k in parts[0]}
+
+    results = {}
+    for key, hist in totals.items():
+        # Days NOT fired by L2 (i, j): c1 > A[i] and c3 > B[j]  -> ka > i and kb > j
+        quiet = hist[:, ::-1, ::-1].cumsum(axis=1).cumsum(axis=2)[:, ::-1, ::-1][:, 1:, 1:]
+        quiet_all = quiet.sum(axis=0)
+        # L1 (k, i, j): not L2 and c1 <= C[k]  -> kc <= k among the quiet days
+        l1 = quiet.cumsum(axis=0)[:-1]
+        l2 = hist.sum() - quiet_all
+
+        results[f"L2_{key}"] = np.broadcast_to(l2, l1.shape)
+        results[f"L1_{key}"] = l1
+
+    out = {}
+    for label in ("L1", "L2"):
+        count = results[f"{label}_count"]
+        out[f"{label}_count"] = count
+        for h in horizons:
+            valid = results[f"{label}_valid_{h}"]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[f"{label}_mean_{h}"] = np.where(valid > 0, results[f"{label}_sum_{h}"] / valid, np.nan)
+                out[f"{label}_hit_rate_{h}"] = np.where(valid > 0, results[f"{label}_hits_{h}"] / valid, np.nan)
+
+    # Undo the sort so index [k, i, j] matches the caller's grids
+    inverse = [np.argsort(o) for o in order]
+    out = {k: np.ascontiguousarray(v)[np.ix_(*inverse)] for k, v in out.items()}
+    out["days"] = int(totals["count"].sum())
+    return out
+
+def replay_config(history: dict, triggers: dict, assets: dict, horizons: list = DEFAULT_HORIZONS) -> dict:
+    """
+    Replays the exact configured triggers (including per-asset overrides and
+    extra windows) through TriggerEngine over every stored day.
+    Returns {level: {'count', 'mean_<h>', 'hit_rate_<h>'}}.
+    """
+    engine = TriggerEngine(triggers, assets)
+    lookback = engine.lookback
+    levels, forwards = [], {h: [] for h in horizons}
+
+    for symbol, closes in history.items():
+        if len(closes) < lookback:
+            continue
+        windows = sliding_window_view(closes, lookback)
+        symbol_levels, _ = engine.evaluate([symbol] * len(windows), windows)
+        levels.append(symbol_levels)
+        _, _, forward = changes_and_forward(closes, horizons)
+        for h in horizons:
+            forwards[h].append(forward[h][lookback - 1:])
+
+    report = {}
+    if not levels:
+        return report
+    levels = np.concatenate(levels)
+    forwards = {h: np.concatenate(v) for h, v in forwards.items()}
+    for _, label in LEVELS:
+        mask = levels == label
+        entry = {"count": int(mask.sum())}
+        for h in horizons:
+            fwd = forwards[h][mask]
+            fwd = fwd[~np.isnan(fwd)]
+            entry[f"mean_{h}"] = round(float(fwd.mean()), 3) if len(fwd) else None
+            entry[f"hit_rate_{h}"] = round(float((fwd > 0).mean()), 3) if len(fwd) else None
+        report[label] = entry
+    return report
+
+def best_combinations(results: dict, grids: tuple, horizon: int, min_triggers: int, top: int) -> list:
+    """
+    Threshold combinations ranked by L2 forward hit rate (then mean return)
+    among those with at least min_triggers L2 events.
+    """
+    count = results["L2_count"]
+    hit = results[f"L2_hit_rate_{horizon}"]
+    mean = results[f"L2_mean_{horizon}"]
+    eligible = (count >= min_triggers) & ~np.isnan(hit)
+    idx = np.argwhere(eligible)
+    if not len(idx):
+        return []
+    keys = np.lexsort((-mean[eligible], -hit[eligible]))[:top]
+
+    rows = []
+    for k, i, j in idx[keys]:
+        rows.append({
+            "level_1.change_1d": float(grids[0][k]),
+            "level_2.change_1d": float(grids[1][i]),
+            "level_2.change_3d": float(grids[2][j]),
+            "L1_count": int(results["L1_count"][k, i, j]),
+            "L2_count": int(count[k, i, j]),
+            f"L2_hit_rate_{horizon}": round(float(hit[k, i, j]), 3),
+            f"L2_mean_{horizon}": round(float(mean[k, i, j]), 3)
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay price triggers over stored history and sweep thresholds.")
+    parser.add_argument("--l1", default="-2:-5:0.5", help="level_1.change_1d grid, start:stop:step or list")
+    parser.add_argument("--l2-1d", default="-4:-8:0.5", help="level_2.change_1d grid")
+    parser.add_argument("--l2-3d", default="-6:-12:1", help="level_2.change_3d grid")
+    parser.add_argument("--horizons", type=int, nargs="+", default=DEFAULT_HORIZONS, help="forward-return horizons (days)")
+    parser.add_argument("--rank-horizon", type=int, default=5, help="horizon used to rank combinations")
+    parser.add_argument("--min-triggers", type=int, default=10, help="minimum L2 events for a combination to rank")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="processes for the sweep (default: all cores)")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+    if args.rank_horizon not in args.horizons:
+        args.horizons.append(args.rank_horizon)
+
+    config = price.get_config()
+    store = price.get_store()
+    if store is None:
+        parser.error("price_store is disabled in config.yaml; the backtest replays the local price store")
+
+    history = load_history(list(config.get('assets', {}).keys()), store)
+    if not history:
+        parser.error("No stored history yet; run sentinel.main once with price_store enabled")
+    logging.info(f"Replaying {sum(len(c) for c in history.values())} bars across {len(history)} symbols...")
+
+    current = replay_config(history, config.get('triggers', {}), config.get('assets', {}), args.horizons)
+
+    grids = (parse_grid(args.l1), parse_grid(args.l2_1d), parse_grid(args.l2_3d))
+    results = sweep(history, *grids, horizons=args.horizons, workers=args.workers)
+    best = best_combinations(results, grids, args.rank_horizon, args.min_triggers, args.top)
+
+    print(f"\nCurrent config over {results['days']} symbol-days:")
+    for level, entry in current.items():
+        stats = "  ".join(
+            f"{h}d: mean {entry[f'mean_{h}']}% hit {entry[f'hit_rate_{h}']}" for h in args.horizons
+        )
+        print(f"  {level}: {entry['count']} triggers  {stats}")
+
+    combos = len(grids[0]) * len(grids[1]) * len(grids[2])
+    print(f"\nTop combinations of {combos} (ranked by L2 {args.rank_horizon}d hit rate, >= {args.min_triggers} L2 events):")
+    for row in best:
+        print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"current": current, "best": best, "days": results["days"]}, f, indent=2)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,123 @@
+"""
+Micro-benchmark of LINE Flex Message rendering.
+
+Renders bursts of synthetic alerts two ways and reports the cost per alert:
+building the push payload as nested dicts and serializing it with json.dumps
+(what requests does with json=), and rendering the request body from the
+precompiled templates in sentinel.flex. Single pushes and carousels of up to
+12 bubbles are measured in both languages. Also checks that both paths produce
+the same JSON.
+
+    venv/bin/python -m sentinel.bench_flex --alerts 100 1000 10000
+"""
+import argparse
+import json
+import time
+from . import notifier
+
+LANGS = ["en", "zh-TW"]
+
+def sample_report(i: int) -> dict:
+    """
+    A synthetic alert; the variations cover every optional part of a bubble.
+    """
+    news = [
+        {
+            "title": f'Metal {i} slides {n + 1}% as "risk-off" mood spreads / 金屬價格下跌',
+            "source": ["Reuters", "Bloomberg", "Kitco"][n],
+            "published_at": "2024-08-05T09:30:00",
+            "link": f"https://example.com/news/{i}/{n}?a=1&b=2"
+        }
+        for n in range(3 if i % 11 else 0)
+    ]
+    price_data = {"symbol": f"SYN{i:05d}", "current_price": round(10 + i * 0.37, 2),
+                  "change_1d": -3.5 - i % 5, "change_3d": -6.25 - i % 4}
+    if i % 5 == 0:
+        price_data.update(change_5m=-2.6, change_60m=-4.1, bar_time="2024-08-05T09:31")
+    if i % 13 == 0:
+        price_data.update(correlation=0.82, members=[
+            {"symbol": f"SYN{i:05d}A", "current_price": 21.5, "change_1d": -4.2, "change_3d": -6.0, "level": "L1"},
+            {"symbol": f"SYN{i:05d}B", "current_price": 48.0, "change_1d": -2.9, "change_3d": -5.1, "level": None}
+        ])
+    return {
+        "asset": f"Synthetic {i}",
+        "trigger_level": "L2" if i % 3 == 0 else "L1",
+        "news_type": ["emotional", "structural", "unclear"][i % 3],
+        "direction": "bearish",
+        "confidence": "medium",
+        "key_driver": f"Sell-off driven by headline {i}\nwith a line break and a tab\t",
+        "recommended_action": "Do NOT buy against trend" if i % 2 else "Potential contrarian opportunity (consider DCA)",
+        "news_used": news,
+        "price_data": price_data,
+        "provisional": i % 7 == 0
+    }
+
+def dict_path(batches: list, lang: str) -> list:
+    return [json.dumps(notifier.build_push_payload(batch, "U-bench", lang)).encode("utf-8") for batch in batches]
+
+def template_path(batches: list, lang: str) -> list:
+    return [notifier.build_push_body(batch, "U-bench", lang) for batch in batches]
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def check(batches: list, lang: str) -> int:
+    """
+    Number of pushes where the template body differs from the dict payload.
+    """
+    return sum(
+        json.loads(body) != notifier.build_push_payload(batch, "U-bench", lang)
+        for batch, body in zip(batches, template_path(batches, lang))
+    )
+
+def measure(alerts: int, carousel: int, lang: str, repeat: int) -> dict:
+    reports = [sample_report(i) for i in range(alerts)]
+    batches = [reports[i:i + carousel] for i in range(0, alerts, carousel)]
+    # Compile outside the timing, as a long-running process would have
+    template_path(batches[:1], lang)
+
+    dict_s = best_of(lambda: dict_path(batches, lang), repeat)
+    template_s = best_of(lambda: template_path(batches, lang), repeat)
+    return {
+        "alerts": alerts,
+        "carousel": carousel,
+        "lang": lang,
+        "dict_us": round(dict_s / alerts * 1e6, 2),
+        "template_us": round(template_s / alerts * 1e6, 2),
+        "speedup": round(dict_s / template_s, 2),
+        "mismatches": check(batches, lang)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, nargs="+", default=[100, 1000, 10000], help="alert burst sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions (best is reported)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = [
+        measure(alerts, carousel, lang, args.repeat)
+        for alerts in args.alerts
+        for carousel in (1, notifier.MAX_CAROUSEL_BUBBLES)
+        for lang in LANGS
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'alerts':>7}{'per push':>10}{'lang':>7}{'dict+dumps us':>15}{'template us':>13}{'speedup':>9}")
+        for r in results:
+            print(f"{r['alerts']:>7}{r['carousel']:>10}{r['lang']:>7}{r['dict_us']:>15.2f}"
+                  f"{r['template_us']:>13.2f}{r['speedup']:>8.2f}x")
+
+    mismatched = [r for r in results if r["mismatches"]]
+    if mismatched:
+        raise SystemExit(f"Template output differs from the dict payload in {sum(r['mismatches'] for r in mismatched)} push(es)")
+
+if __name__ == "__main__":
+    main()
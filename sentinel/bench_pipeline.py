@@ -0,0 +1,209 @@
+"""
+End-to-end pipeline benchmark on offline stand-ins.
+
+Runs sentinel.main.run over synthetic watchlists with every external
+service (prices, news, LLM, LINE) replaced by a fake from sentinel.fakes with
+configurable latency and failure injection. Each watchlist size runs in a fresh
+interpreter with empty caches. The benchmark reports wall time, throughput,
+per-stage timings and peak memory, and compares them against a stored baseline.
+
+    venv/bin/python -m sentinel.bench_pipeline --sizes 10 100 1000 10000
+    venv/bin/python -m sentinel.bench_pipeline --save-baseline
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "bench_baseline.json")
+DEFAULT_SIZES = [10, 100, 1000]
+
+STAGES = ["prices", "news", "llm", "line"]
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (VmHWM), or None."""
+    try:
+        with open("/proc/self/status") as f:
+            return round(next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024, 1)
+    except (OSError, StopIteration):
+        try:
+            import resource
+            rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return round((rss_kb // 1024 if sys.platform == "darwin" else rss_kb) / 1024, 1)
+        except ImportError:
+            return None
+
+def bench_config(base: dict, size: int, workdir: str, options: dict) -> dict:
+    """
+    config.yaml with a synthetic watchlist, state under workdir and every
+    service routed to its fake.
+    """
+    config = copy.deepcopy(base)
+    config['assets'] = {
+        f"SYN{i:05d}": {"name": f"Synthetic {i}", "query": f"synthetic commodity {i}"}
+        for i in range(size)
+    }
+    # Sectors of 10 consecutive symbols, so grouping is measured at scale too
+    config['groups'] = dict(config.get('groups') or {}, sets={
+        f"sector{k}": {"name": f"Synthetic sector {k}", "members": list(config['assets'])[k * 10:(k + 1) * 10]}
+        for k in range(size // 10)
+    })
+    shared = {
+        "backend": "fake",
+        "latency_scale": options['latency_scale'],
+        "failure_rate": options['failure_rate'],
+        "seed": options['seed']
+    }
+    config['providers'] = {service: dict(shared) for service in STAGES}
+    config['providers']['prices']['drop_rate'] = options['drop_rate']
+    # The stand-ins have no API quota: keep the guards in the path but
+    # without the rate limits sized for the real services
+    config['resilience'] = dict(config.get('resilience') or {}, **{
+        service: dict((config.get('resilience') or {}).get(service) or {}, rate_per_second=None)
+        for service in STAGES
+    })
+
+    config.setdefault('price_store', {})['path'] = os.path.join(workdir, "prices")
+    config.setdefault('news', {}).setdefault('feed_cache', {})['path'] = os.path.join(workdir, "feed_cache.sqlite")
+    config.setdefault('llm_cache', {})['path'] = os.path.join(workdir, "llm_cache.sqlite")
+    config.setdefault('alerts', {})['path'] = os.path.join(workdir, "alert_state.json")
+    config.setdefault('journal', {})['path'] = os.path.join(workdir, "run_journal.jsonl")
+    queue = config.setdefault('notifications', {}).setdefault('queue', {})
+    queue.update(path=os.path.join(workdir, "outbox.sqlite"), linger_seconds=0)
+    config.setdefault('metrics', {})['run_report'] = os.path.join(workdir, "last_run.json")
+    return config
+
+def run_child(size: int, options: dict) -> dict:
+    """
+    One pipeline run in this process. Prints nothing; returns the measurements.
+    """
+    import logging
+    os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "bench-token")
+    os.environ.setdefault("LINE_USER_ID", "bench-user")
+    from . import main, providers, metrics
+    from .config import load_config
+
+    # Per-asset INFO logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config = bench_config(load_config(), size, workdir, options)
+
+        start = time.perf_counter()
+        report = main.run(config=config)
+        wall = time.perf_counter() - start
+
+        stages = {service: providers.get(service).stats() for service in STAGES}
+    return {
+        "size": size,
+        "wall_s": round(wall, 3),
+        "assets_per_s": round(size / wall, 1),
+        "peak_mb": peak_rss_mb(),
+        "stages": stages,
+        # Wall time of each pipeline phase, from the run report
+        "phases": {phase: report['stages'][phase]['total_s'] for phase in metrics.PHASES if phase in report['stages']}
+    }
+
+def measure(size: int, runs: int, options: dict) -> dict:
+    """
+    Median of `runs` fresh-interpreter runs for one watchlist size.
+    """
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cwd:
+            # cwd: main's log file must not land in the repo
+            out = subprocess.run(
+                [sys.executable, "-m", "sentinel.bench_pipeline", "--child", str(size), "--options", json.dumps(options)],
+                cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True, check=True
+            ).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    samples.sort(key=lambda s: s["wall_s"])
+    result = samples[len(samples) // 2]
+    result["peak_mb"] = statistics.median(s["peak_mb"] for s in samples) if result["peak_mb"] is not None else None
+    return result
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions against the baseline: wall time or peak memory more than
+    `tolerance` (fraction) above the stored value for the same size.
+    """
+    stored = {entry["size"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        base = stored.get(r["size"])
+        if base is None:
+            continue
+        for metric in ("wall_s", "peak_mb"):
+            if r.get(metric) is not None and base.get(metric) and r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{r['size']} assets: {metric} {r[metric]} vs baseline {base[metric]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="watchlist sizes to run")
+    parser.add_argument("--runs", type=int, default=1, help="fresh runs per size (median is reported)")
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="multiplier on the fakes' realistic latencies (1 = real-world)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls that fail, per service")
+    parser.add_argument("--drop-rate", type=float, default=0.05, help="share of assets that fire a trigger")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing (fraction)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_child(args.child, json.loads(args.options))))
+        return
+
+    options = {
+        "latency_scale": args.latency_scale,
+        "failure_rate": args.failure_rate,
+        "drop_rate": args.drop_rate,
+        "seed": args.seed
+    }
+    results = [measure(size, args.runs, options) for size in args.sizes]
+
+    if args.json:
+        print(json.dumps({"options": options, "results": results}, indent=2))
+    else:
+        print(f"{'assets':>7}{'wall s':>9}{'assets/s':>10}{'peak MB':>9}  "
+              + "".join(f"{stage + ' calls/busy/span s':>30}" for stage in STAGES))
+        for r in results:
+            cells = "".join(
+                f"{'{calls}/{busy_s:.2f}/{span_s:.2f}'.format(**r['stages'][stage]):>30}" for stage in STAGES
+            )
+            peak = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else "n/a"
+            print(f"{r['size']:>7}{r['wall_s']:>9.2f}{r['assets_per_s']:>10.1f}{peak:>9}  {cells}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("options") != options:
+        print("\nBaseline was recorded with different options; not compared.")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nFAIL: slower than baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("\nWithin baseline.")
+
+if __name__ == "__main__":
+    main()
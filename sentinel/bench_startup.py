@@ -0,0 +1,102 @@
+"""
+Startup-time benchmark for the sentinel entry points.
+
+Imports each entry point in a fresh interpreter and reports the median
+wall-clock time and peak memory, next to an "eager" baseline that imports
+the full dependency stack up front (the way the package used to start).
+Fails if an entry point imports a heavy dependency at import time.
+
+    venv/bin/python -m sentinel.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Only loaded once their stage actually runs
+HEAVY_MODULES = ["yfinance", "pandas", "openai", "feedparser", "requests", "dotenv"]
+
+ENTRY_POINTS = ["sentinel.main", "sentinel.daemon", "sentinel.intraday", "sentinel.demo_force"]
+
+CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+rss_kb = None
+try:
+    # VmHWM starts fresh at exec; ru_maxrss would include the parent's peak on Linux
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            rss_kb //= 1024
+    except ImportError:
+        pass
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"import_seconds": elapsed, "max_rss_kb": rss_kb, "heavy": heavy}}))
+"""
+
+def measure(modules: list, runs: int) -> dict:
+    """
+    Median import time, total process time and peak RSS over `runs` fresh interpreters.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = CHILD.format(modules=modules, heavy=HEAVY_MODULES)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        total = time.perf_counter() - start
+        sample = json.loads(out.strip().splitlines()[-1])
+        sample["process_seconds"] = total
+        samples.append(sample)
+
+    rss = [s["max_rss_kb"] for s in samples if s["max_rss_kb"] is not None]
+    return {
+        "import_ms": round(statistics.median(s["import_seconds"] for s in samples) * 1000, 1),
+        "process_ms": round(statistics.median(s["process_seconds"] for s in samples) * 1000, 1),
+        "max_rss_mb": round(statistics.median(rss) / 1024, 1) if rss else None,
+        "heavy": samples[-1]["heavy"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the eager-import baseline")
+    args = parser.parse_args()
+
+    results = {}
+    if not args.no_baseline:
+        available = []
+        for name in HEAVY_MODULES:
+            try:
+                __import__(name)
+                available.append(name)
+            except ImportError:
+                pass
+        results["eager baseline"] = measure(available + ["sentinel.main"], args.runs)
+    for entry in ENTRY_POINTS:
+        results[entry] = measure([entry], args.runs)
+
+    print(f"{'entry point':<22}{'import ms':>11}{'process ms':>12}{'peak MB':>10}  heavy imports")
+    for name, r in results.items():
+        rss = f"{r['max_rss_mb']:.1f}" if r['max_rss_mb'] is not None else "n/a"
+        print(f"{name:<22}{r['import_ms']:>11.1f}{r['process_ms']:>12.1f}{rss:>10}  {', '.join(r['heavy']) or '-'}")
+
+    leaked = {name: r["heavy"] for name, r in results.items() if name != "eager baseline" and r["heavy"]}
+    if leaked:
+        print(f"\nFAIL: heavy dependencies imported at startup: {leaked}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+class PersistentCache:
+    """
+    Small SQLite-backed key/value cache with TTL and size-bounded LRU eviction.
+    Values must be JSON-serializable. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, max_entries: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str, max_age: float = None):
+        """
+        Returns the cached value, or None if missing or older than the TTL
+        (or max_age, when given).
+        """
+        ttl = self.ttl if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (ttl is not None and now - row[1] > ttl):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict(self, now: float):
+        # Expired entries first, then least recently used beyond max_entries
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM cache WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def items(self, prefix: str = "", max_age: float = None) -> list:
+        """
+        (key, value, created_at) of every entry whose key starts with prefix,
+        oldest first, ignoring the TTL (but not max_age, when given). Does not
+        count as hits.
+        """
+        oldest = time.time() - max_age if max_age is not None else float("-inf")
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, created_at FROM cache WHERE substr(key, 1, ?) = ? AND created_at >= ?"
+                " ORDER BY created_at",
+                (len(prefix), prefix, oldest)
+            ).fetchall()
+        return [(key, json.loads(value), created_at) for key, value, created_at in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self)
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def open_cache(cache_config: dict, default_path: str):
+    """
+    Builds a PersistentCache from a config section with 'enabled', 'path',
+    'ttl_hours' and 'max_entries'. Returns None when disabled.
+    """
+    cache_config = cache_config or {}
+    if not cache_config.get('enabled'):
+        return None
+    root = os.path.dirname(os.path.dirname(__file__))
+    path = os.path.join(root, cache_config.get('path', default_path))
+    try:
+        return PersistentCache(
+            path,
+            ttl=float(cache_config.get('ttl_hours', 24)) * 3600,
+            max_entries=int(cache_config.get('max_entries', 1000))
+        )
+    except Exception as e:
+        logging.error(f"Could not open cache at {path}: {e}")
+        return None
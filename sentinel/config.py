@@ -0,0 +1,50 @@
+import os
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
+
+_env_loaded = False
+
+def load_env():
+    """
+    Loads .env into the environment once per process.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def load_config(path: str = CONFIG_PATH) -> dict:
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+def config_mtime(path: str = CONFIG_PATH) -> float:
+    """Modification time of the config file, or 0 if it is missing."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+class ConfigWatcher:
+    """
+    Reloads config.yaml when its modification time changes.
+    An invalid file is ignored and the previous config kept.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.mtime = config_mtime(path)
+        self.config = load_config(path)
+
+    def poll(self) -> bool:
+        """Returns True if a new config was loaded."""
+        mtime = config_mtime(self.path)
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            self.config = load_config(self.path)
+        except Exception:
+            return False
+        return True
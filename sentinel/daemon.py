@@ -0,0 +1,154 @@
+import heapq
+import logging
+import signal
+import threading
+import time
+from . import main, metrics
+from .config import ConfigWatcher, load_env
+
+# Defaults used when config.yaml has no 'daemon' section
+DEFAULT_POLL_MINUTES = 60
+DEFAULT_CONFIG_CHECK_SECONDS = 30
+# Assets due within this window are pulled into the same run
+COALESCE_SECONDS = 1.0
+
+def poll_seconds(info: dict, daemon_config: dict) -> float:
+    """
+    Polling interval of one asset: its own 'poll_minutes' or the daemon default.
+    """
+    minutes = (info or {}).get('poll_minutes', daemon_config.get('poll_minutes', DEFAULT_POLL_MINUTES))
+    return max(1.0, float(minutes) * 60)
+
+def linked_assets(assets: dict, groups_config: dict) -> dict:
+    """
+    {ticker: every asset that must be checked in the same run}: the members
+    of its groups, and transitively of groups sharing a member with them,
+    since a group is only evaluated when all its members are in the run.
+    """
+    linked = {ticker: {ticker} for ticker in assets}
+    for spec in ((groups_config or {}).get('sets') or {}).values():
+        members = [ticker for ticker in (spec or {}).get('members') or [] if ticker in assets]
+        merged = set().union(*(linked[ticker] for ticker in members)) if members else set()
+        for ticker in merged:
+            linked[ticker] = merged
+    return linked
+
+class Scheduler:
+    """
+    Min-heap of (due time, ticker). Each asset is re-queued after it runs,
+    using its own polling interval. Members of a group are checked together,
+    at the shortest interval among them.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.intervals = {}
+        self.linked = {}
+
+    def sync(self, assets: dict, daemon_config: dict, now: float, groups_config: dict = None):
+        """
+        Brings the schedule in line with the configured assets and groups.
+        New assets are due immediately; existing ones keep their next due time.
+        """
+        scheduled = {ticker for _, ticker in self.heap}
+        self.linked = linked_assets(assets, groups_config)
+        intervals = {ticker: poll_seconds(info, daemon_config) for ticker, info in assets.items()}
+        self.intervals = {ticker: min(intervals[t] for t in self.linked[ticker]) for ticker in intervals}
+        self.heap = [(due, ticker) for due, ticker in self.heap if ticker in self.intervals]
+        for ticker in self.intervals:
+            if ticker not in scheduled:
+                self.heap.append((now, ticker))
+        heapq.heapify(self.heap)
+
+    def pop_due(self, now: float) -> list:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, ticker = heapq.heappop(self.heap)
+            due.append(ticker)
+        # Group members that are not due yet run now as well
+        mates = {t for ticker in due for t in self.linked.get(ticker, ())} - set(due)
+        if mates:
+            self.heap = [(at, ticker) for at, ticker in self.heap if ticker not in mates]
+            heapq.heapify(self.heap)
+            due.extend(sorted(mates))
+        return due
+
+    def reschedule(self, tickers: list, now: float):
+        for ticker in tickers:
+            heapq.heappush(self.heap, (now + self.intervals[ticker], ticker))
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+def serve(stop: threading.Event = None):
+    """
+    Runs the sentinel as a resident process. Clients, HTTP sessions and caches
+    stay warm between checks, config.yaml is reloaded when it changes, and
+    SIGINT/SIGTERM finish the current check before exiting.
+    """
+    stop = stop or threading.Event()
+
+    def shutdown(signum, frame):
+        logging.info(f"Received signal {signum}, shutting down after the current check...")
+        stop.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+    load_env()
+    watcher = ConfigWatcher()
+    config = watcher.config
+    daemon_config = config.get('daemon') or {}
+    caches = main.open_caches(config)
+
+    # Prometheus scrape endpoint; the port is read once at startup
+    metrics_config = config.get('metrics') or {}
+    metrics_server = None
+    if metrics_config.get('port'):
+        try:
+            metrics_server = metrics.serve_metrics(int(metrics_config['port']), metrics_config.get('host', '127.0.0.1'))
+        except OSError as e:
+            logging.error(f"Could not start metrics endpoint: {e}")
+
+    scheduler = Scheduler()
+    scheduler.sync(config.get('assets', {}), daemon_config, time.monotonic(), config.get('groups'))
+    logging.info(f"Sentinel daemon started with {len(scheduler.intervals)} assets.")
+
+    try:
+        while not stop.is_set():
+            # 1. Pick up config edits without a restart
+            if watcher.poll():
+                previous, config = config, watcher.config
+                daemon_config = config.get('daemon') or {}
+                if main.cache_settings(config) != main.cache_settings(previous):
+                    # New paths or settings for caches, alert state, outbox or journal
+                    main.close_caches(caches)
+                    caches = main.open_caches(config)
+                    logging.info("Cache, alert, queue or journal settings changed; reopened.")
+                scheduler.sync(config.get('assets', {}), daemon_config, time.monotonic(), config.get('groups'))
+                logging.info("config.yaml changed; configuration reloaded.")
+
+            # 2. Check every asset that is due, together in one run
+            due = scheduler.pop_due(time.monotonic() + COALESCE_SECONDS)
+            if due:
+                try:
+                    main.run(config=config, tickers=due, caches=caches)
+                except Exception as e:
+                    logging.error(f"Scheduled run failed: {e}")
+                    metrics.incr("run_failures_total")
+                scheduler.reschedule(due, time.monotonic())
+
+            # 3. Sleep until the next asset is due (or the next config check)
+            check_every = float(daemon_config.get('config_check_seconds', DEFAULT_CONFIG_CHECK_SECONDS))
+            next_due = scheduler.next_due()
+            wait = check_every if next_due is None else min(check_every, next_due - time.monotonic())
+            stop.wait(max(0.0, wait))
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        main.close_caches(caches)
+        logging.info("Sentinel daemon stopped.")
+
+if __name__ == "__main__":
+    serve()
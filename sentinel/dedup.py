@@ -0,0 +1,85 @@
+import re
+import zlib
+import numpy as np
+
+# Hashed character 3-gram space; collisions are rare at headline length
+SHINGLE_DIM = 4096
+SHINGLE_SIZE = 3
+
+# Rows compared per block, bounds memory at (block x n) floats
+BLOCK_SIZE = 512
+
+# Dice scores run on a different scale than difflib's ratio; calibrated on
+# the labelled headline pairs in eval_dedup
+DEFAULT_THRESHOLD = 0.64
+
+def normalize(title: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+
+def shingle_matrix(titles: list) -> np.ndarray:
+    """
+    Binary (titles x SHINGLE_DIM) matrix of hashed character 3-grams.
+    """
+    matrix = np.zeros((len(titles), SHINGLE_DIM), dtype=np.float32)
+    for i, title in enumerate(titles):
+        text = f" {normalize(title)} "
+        grams = {text[j:j + SHINGLE_SIZE] for j in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+        cols = [zlib.crc32(g.encode("utf-8")) % SHINGLE_DIM for g in grams]
+        matrix[i, cols] = 1.0
+    return matrix
+
+def similarity_matrix(titles: list) -> np.ndarray:
+    """
+    Pairwise Dice similarity of the titles' 3-gram sets, 2|A∩B| / (|A| + |B|).
+    Like difflib's ratio it is 1.0 for identical and 0.0 for unrelated titles,
+    but the values in between differ, so thresholds do not carry over.
+    """
+    shingles = shingle_matrix(titles)
+    sizes = shingles.sum(axis=1)
+    n = len(titles)
+    sims = np.empty((n, n), dtype=np.float32)
+    for start in range(0, n, BLOCK_SIZE):
+        block = shingles[start:start + BLOCK_SIZE]
+        overlap = block @ shingles.T
+        totals = sizes[start:start + BLOCK_SIZE, None] + sizes[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims[start:start + BLOCK_SIZE] = np.where(totals > 0, 2 * overlap / totals, 0.0)
+    return sims
+
+def cluster_titles(titles: list, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Greedy near-duplicate clustering in input order: a title joins the first
+    earlier representative it is more than `threshold` similar to, otherwise
+    it starts a new cluster. Returns one list of member indices per cluster,
+    representative first.
+    """
+    if not titles:
+        return []
+
+    sims = similarity_matrix(titles)
+    representatives = []
+    clusters = []
+    for i in range(len(titles)):
+        if representatives:
+            matches = np.nonzero(sims[i, representatives] > threshold)[0]
+            if len(matches):
+                clusters[matches[0]].append(i)
+                continue
+        representatives.append(i)
+        clusters.append([i])
+    return clusters
+
+def cluster_items(items: list, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Collapses near-duplicate news items. Returns the cluster representatives
+    (copies) with a 'cluster_size' field, largest clusters first; ties keep
+    the original order.
+    """
+    clusters = cluster_titles([item['title'] for item in items], threshold)
+    representatives = []
+    for members in clusters:
+        rep = dict(items[members[0]])
+        rep['cluster_size'] = len(members)
+        representatives.append(rep)
+    representatives.sort(key=lambda r: -r['cluster_size'])
+    return representatives
@@ -1,8 +1,7 @@
 import logging
 import time
-import os
-import yaml
 from . import price, news, ai_classifier, notifier
+from .config import load_config, load_env
 
 # Setup Logging
 logging.basicConfig(
@@ -13,11 +12,6 @@ logging.basicConfig(
     ]
 )
 
-def load_config():
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
-
 def mock_get_market_data(ticker):
     """Mocks a 6% crash"""
     return {
@@ -31,6 +25,7 @@ def run_demo():
     print("\n>>> STARTING DEMO MODE via sentinel.demo_force <<<")
     print(">>> Simulating a CRASH in Gold prices (-6.5%) to trigger AI Analysis <<<\n")
     
+    load_env()
     config = load_config()
     # For demo, just check Gold if present, or first asset
     assets = config.get('assets', {})
@@ -0,0 +1,170 @@
+"""
+Calibration of the headline near-duplicate threshold.
+
+Scores a hand-labelled set of headline pairs (the same story from different
+outlets, or different stories on the same topic) with dedup's 3-gram Dice
+similarity and reports how many of them the threshold decides right, next
+to difflib's ratio at 0.6 (the clustering used before dedup.py). It then
+clusters a fixed headline set and fails when the merges differ from the
+expected ones. A sweep over the threshold helps pick the config value.
+
+    venv/bin/python -m sentinel.eval_dedup
+    venv/bin/python -m sentinel.eval_dedup --sweep
+"""
+import argparse
+import json
+import sys
+from difflib import SequenceMatcher
+from .config import load_config
+from . import dedup
+
+# (headline, headline, same story)
+LABELLED_PAIRS = [
+    ("Gold prices slide as dollar strengthens", "Gold price slides as the dollar strengthens", True),
+    ("Gold slides as investors rush for the exits", "Gold slides as investors rush for exits - Reuters", True),
+    ("Oil tumbles as supply glut fears grow", "Oil prices tumble on growing supply glut fears", True),
+    ("Silver drops on weaker demand outlook from China", "Silver falls on weaker Chinese demand outlook", True),
+    ("Copper hits three-month low as China data disappoints", "Copper falls to 3-month low after disappointing China data", True),
+    ("Fed holds rates steady, signals two cuts this year", "Fed keeps rates unchanged and signals two cuts in 2024", True),
+    ("Gold hits record high above $2,500 an ounce", "Gold hits record high above $2,500/oz", True),
+    ("OPEC+ agrees to extend output cuts into next year", "OPEC+ agrees to extend oil output cuts into next year", True),
+    ("Crude oil falls 3% after surprise build in US inventories", "Crude falls 3% on surprise build in U.S. inventories", True),
+    ("Wheat futures jump after Russia halts grain deal", "Wheat futures jump as Russia halts Black Sea grain deal", True),
+    ("Natural gas prices plunge on mild weather forecasts", "Natural gas plunges on mild weather forecasts", True),
+    ("Analysts see gold selloff as overdone", "Analysts say gold sell-off is overdone", True),
+    ("Funds cut positions in silver ahead of Fed decision", "Funds cut silver positions ahead of Fed decision", True),
+    ("Platinum slumps as auto demand weakens", "Platinum slumps on weakening auto demand", True),
+    ("Gold falls after stronger dollar weighs on commodities", "Gold falls as a stronger dollar weighs on commodities - MarketWatch", True),
+    ("Iron ore slides as Chinese steel output cut", "Iron ore slides on Chinese steel output cuts", True),
+    ("Traders brace for more volatility in oil", "Traders brace for more oil volatility", True),
+    ("Gold hit by profit-taking after rally", "Gold hit by profit taking after strong rally", True),
+    ("Brent crude drops below $80 for first time since June", "Brent drops below $80 a barrel for the first time since June", True),
+    ("Silver surges 5% as industrial demand picks up", "Silver surges 5% on pickup in industrial demand", True),
+    ("Gold steadies near record as traders await Powell speech", "Gold steadies near record high as traders await Powell - Reuters", True),
+    ("Oil set for weekly loss on demand worries", "Oil heads for weekly loss on demand concerns", True),
+    ("Cocoa prices soar to record on West Africa supply woes", "Cocoa soars to record high on West African supply woes", True),
+    ("Gold gains as weak US data boosts rate-cut bets", "Gold rises as weak U.S. data bolsters rate cut bets", True),
+    ("Aluminium jumps after US sanctions on Russian metal", "Aluminum jumps after U.S. sanctions Russian metal", True),
+    ("Gold prices slide as dollar strengthens", "Gold prices rise as dollar weakens", False),
+    ("Gold slides as investors rush for the exits", "Gold rallies as investors seek safe haven", False),
+    ("Oil tumbles as supply glut fears grow", "Oil climbs as Middle East tensions flare", False),
+    ("Silver drops on weaker demand outlook from China", "Silver ETF holdings rise for third week", False),
+    ("Copper hits three-month low as China data disappoints", "Copper miners cut guidance on lower grades", False),
+    ("Fed holds rates steady, signals two cuts this year", "Fed minutes show officials split on cuts", False),
+    ("Gold hits record high above $2,500 an ounce", "Central banks bought record gold in first half", False),
+    ("OPEC+ agrees to extend output cuts into next year", "OPEC+ meeting postponed amid disagreement", False),
+    ("Crude oil falls 3% after surprise build in US inventories", "US crude inventories fall more than expected", False),
+    ("Wheat futures jump after Russia halts grain deal", "Corn futures slip on favourable US weather", False),
+    ("Natural gas prices plunge on mild weather forecasts", "Natural gas storage build smaller than expected", False),
+    ("Analysts see gold selloff as overdone", "Analysts raise gold price forecasts for next year", False),
+    ("Gold price today: gold falls on strong jobs data", "Gold price today: gold rises on weak jobs data", False),
+    ("Silver price forecast: bulls eye $30", "Silver price forecast: bears target $25", False),
+    ("Oil prices fall as US dollar strengthens", "Gold prices fall as US dollar strengthens", False),
+    ("Gold falls 1% as Treasury yields rise", "Silver falls 2% as Treasury yields rise", False),
+    ("Platinum slumps as auto demand weakens", "Palladium rebounds on supply worries", False),
+    ("Iron ore slides as Chinese steel output cut", "Iron ore climbs on China stimulus hopes", False),
+    ("Brent crude drops below $80 for first time since June", "Brent crude rises above $85 for first time since April", False),
+    ("Stock market today: Dow falls as oil slides", "Stock market today: Nasdaq rises as chip stocks rally", False),
+    ("Gold steadies near record as traders await Powell speech", "Gold eases from record as Powell speech looms", False),
+    ("Oil set for weekly loss on demand worries", "Oil set for weekly gain on supply disruptions", False),
+    ("Cocoa prices soar to record on West Africa supply woes", "Coffee prices soar on Brazil frost damage", False),
+    ("Gold gains as weak US data boosts rate-cut bets", "Gold loses ground as strong US data trims rate-cut bets", False),
+    ("Aluminium jumps after US sanctions on Russian metal", "Nickel slides as Indonesian supply floods market", False),
+]
+
+# One feed's worth of gold headlines, grouped by story. Fed to cluster_titles
+# first headlines first, so every story's representative comes before its duplicates.
+EXPECTED_CLUSTERS = [
+    ["Gold slides as investors rush for the exits", "Gold slides as investors rush for exits - Reuters"],
+    ["Gold prices slide as dollar strengthens", "Gold price slides as the dollar strengthens"],
+    ["Gold prices rise as dollar weakens"],
+    ["Analysts see gold selloff as overdone", "Analysts say gold sell-off is overdone"],
+    ["Analysts raise gold price forecasts for next year"],
+    ["Gold hit by profit-taking after rally", "Gold hit by profit taking after strong rally"],
+    ["Gold gains as weak US data boosts rate-cut bets", "Gold rises as weak U.S. data bolsters rate cut bets"],
+    ["Gold loses ground as strong US data trims rate-cut bets"],
+    ["Central banks bought record gold in first half"],
+    ["Gold hits record high above $2,500 an ounce", "Gold hits record high above $2,500/oz"],
+    ["Gold steadies near record as traders await Powell speech",
+     "Gold steadies near record high as traders await Powell - Reuters"],
+    ["Gold eases from record as Powell speech looms"]
+]
+
+# difflib's ratio and threshold before dedup.py, for comparison
+DIFFLIB_THRESHOLD = 0.6
+
+def score_pairs(pairs: list) -> list:
+    """(same story, Dice similarity, difflib ratio) per pair."""
+    return [
+        (same, float(dedup.similarity_matrix([a, b])[0, 1]), SequenceMatcher(None, a.lower(), b.lower()).ratio())
+        for a, b, same in pairs
+    ]
+
+def evaluate(scores: list, threshold: float, column: int = 1) -> dict:
+    """
+    Pairs decided right at the threshold, pairs merged that are different
+    stories and pairs of one story left apart.
+    """
+    merged = [row[column] > threshold for row in scores]
+    return {
+        "threshold": threshold,
+        "correct": sum(m == row[0] for m, row in zip(merged, scores)),
+        "wrong_merges": sum(m and not row[0] for m, row in zip(merged, scores)),
+        "missed": sum(not m and row[0] for m, row in zip(merged, scores))
+    }
+
+def check_clusters(threshold: float) -> list:
+    """
+    The clusters of EXPECTED_CLUSTERS that cluster_titles gets wrong, as
+    lists of titles; empty when the merges match.
+    """
+    titles = [story[0] for story in EXPECTED_CLUSTERS]
+    titles += [title for story in EXPECTED_CLUSTERS for title in story[1:]]
+    got = sorted(sorted(titles[i] for i in members) for members in dedup.cluster_titles(titles, threshold))
+    expected = sorted(sorted(story) for story in EXPECTED_CLUSTERS)
+    return [cluster for cluster in got if cluster not in expected]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, help="Dice threshold (default: news.similarity_threshold)")
+    parser.add_argument("--sweep", action="store_true", help="also sweep the threshold")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    news_config = load_config().get('news') or {}
+    threshold = args.threshold if args.threshold is not None else float(
+        news_config.get('similarity_threshold', dedup.DEFAULT_THRESHOLD)
+    )
+
+    scores = score_pairs(LABELLED_PAIRS)
+    report = {
+        "pairs": len(scores),
+        "same_story": sum(row[0] for row in scores),
+        "dice": evaluate(scores, threshold),
+        "difflib": evaluate(scores, DIFFLIB_THRESHOLD, column=2),
+        "cluster_mismatches": check_clusters(threshold)
+    }
+    if args.sweep:
+        report["sweep"] = [evaluate(scores, t / 100) for t in range(50, 81, 2)]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Labelled pairs: {report['pairs']} ({report['same_story']} same story)")
+        for name, label in (("dice", "3-gram Dice"), ("difflib", "difflib ratio")):
+            row = report[name]
+            print(f"{label:<14} > {row['threshold']:g}: {row['correct']}/{report['pairs']} right, "
+                  f"{row['wrong_merges']} wrong merges, {row['missed']} missed")
+        if args.sweep:
+            print(f"\n{'threshold':>9}{'right':>7}{'wrong merges':>14}{'missed':>8}")
+            for row in report['sweep']:
+                print(f"{row['threshold']:>9g}{row['correct']:>7}{row['wrong_merges']:>14}{row['missed']:>8}")
+
+    if report['cluster_mismatches']:
+        print("\nFAIL: unexpected clusters:\n  " + "\n  ".join(" | ".join(c) for c in report['cluster_mismatches']))
+        sys.exit(1)
+    if not args.json:
+        print("\nExpected merges reproduced.")
+
+if __name__ == "__main__":
+    main()
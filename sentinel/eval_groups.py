@@ -0,0 +1,99 @@
+"""
+Check of the group correlations against a direct computation.
+
+Builds fixed random-walk closes for a few groups, knocks out bars the way
+exchange holidays and failed downloads do, and compares
+GroupEngine.correlations with the mean of np.corrcoef over the days on
+which every member has a return. Fails when they differ, or when a member
+with a missing bar is dropped from its group.
+
+    venv/bin/python -m sentinel.eval_groups
+"""
+import argparse
+import json
+import sys
+import numpy as np
+from .groups import GroupEngine
+
+WINDOW = 20
+BARS = 40
+
+SETS = {
+    "metals": {"members": ["GOLD", "SILVER", "PLATINUM"]},
+    "energy": {"members": ["BRENT", "WTI"]},
+    "asia": {"members": ["NIKKEI", "HANGSENG", "KOSPI"]},
+}
+
+# (case, {symbol: bars counted from the end set to NaN})
+CASES = [
+    ("no gaps", {}),
+    ("one missing bar", {"SILVER": [5]}),
+    ("holidays on different days", {"NIKKEI": [3, 11], "HANGSENG": [7], "KOSPI": [15]}),
+    ("missing latest bar", {"WTI": [1]}),
+    ("member without history", {"PLATINUM": list(range(1, BARS + 1))}),
+]
+
+def make_closes(symbols: list, seed: int = 7) -> np.ndarray:
+    """Random walks sharing one factor per group, so members correlate."""
+    rng = np.random.default_rng(seed)
+    closes = np.empty((len(symbols), BARS))
+    for members in (spec["members"] for spec in SETS.values()):
+        factor = rng.normal(0, 0.01, BARS)
+        for ticker in members:
+            returns = factor + rng.normal(0, 0.006, BARS)
+            closes[symbols.index(ticker)] = 100 * np.exp(np.cumsum(returns))
+    return closes
+
+def reference(closes: np.ndarray, window: int) -> float:
+    """Mean pairwise np.corrcoef over the days every present member has a return."""
+    returns = np.diff(np.log(closes[:, -(window + 1):]), axis=1)
+    finite = np.isfinite(returns)
+    returns = returns[finite.sum(axis=1) >= max(2, returns.shape[1] // 2)]
+    days = np.isfinite(returns).all(axis=0)
+    if len(returns) < 2 or days.sum() < 2:
+        return float("nan")
+    matrix = np.corrcoef(returns[:, days])
+    n = len(returns)
+    return float((matrix.sum() - n) / (n * (n - 1)))
+
+def run_cases() -> list:
+    """One row per case and group: (case, group, engine value, reference value)."""
+    symbols = [ticker for spec in SETS.values() for ticker in spec["members"]]
+    assets = {ticker: {"query": ticker} for ticker in symbols}
+    engine = GroupEngine({"sets": SETS, "correlation_window": WINDOW}, {}, assets)
+
+    rows = []
+    for case, gaps in CASES:
+        closes = make_closes(symbols)
+        for ticker, bars in gaps.items():
+            closes[symbols.index(ticker), [-b for b in bars]] = np.nan
+        got = engine.correlation_by_group(symbols, closes)
+        for name, spec in SETS.items():
+            member_rows = [symbols.index(ticker) for ticker in spec["members"]]
+            rows.append((case, name, float(got[f"group:{name}"]), reference(closes[member_rows], WINDOW)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    rows = run_cases()
+    mismatches = [row for row in rows if not np.isclose(row[2], row[3], equal_nan=True)]
+
+    if args.json:
+        print(json.dumps([dict(zip(("case", "group", "correlation", "reference"), row)) for row in rows], indent=2))
+    else:
+        print(f"{'case':<28}{'group':<8}{'correlation':>12}{'reference':>11}")
+        for case, name, got, expected in rows:
+            print(f"{case:<28}{name:<8}{got:>12.4f}{expected:>11.4f}")
+
+    if mismatches:
+        print("\nFAIL: correlations differ from the reference:\n  "
+              + "\n  ".join(f"{case} / {name}: {got:.4f} != {expected:.4f}" for case, name, got, expected in mismatches))
+        sys.exit(1)
+    if not args.json:
+        print("\nCorrelations match the reference.")
+
+if __name__ == "__main__":
+    main()
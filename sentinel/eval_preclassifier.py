@@ -0,0 +1,127 @@
+"""
+Agreement of the local pre-classifier with past LLM answers.
+
+Replays the lexicon pre-classifier over every classification in the LLM
+cache. The cache keeps each answer with the headlines it was given and
+their cluster sizes, which the lexicon weighs as coverage. It reports
+coverage, i.e. how often the lexicon is confident enough to skip the LLM,
+and how often it then agrees with the LLM's news_type and direction. A sweep over the thresholds helps pick the config values.
+
+    venv/bin/python -m sentinel.eval_preclassifier
+    venv/bin/python -m sentinel.eval_preclassifier --sweep
+"""
+import argparse
+import json
+import os
+from collections import Counter
+from .cache import PersistentCache
+from .config import load_config
+from . import preclassifier
+
+NEWS_TYPES = ["emotional", "structural", "unclear"]
+
+def load_cases(cache: PersistentCache) -> list:
+    """
+    (trigger_level, headline items, LLM result) for each cached classification.
+    """
+    cases = []
+    for key, value, _ in cache.items("risk|"):
+        result = value.get('result') or {}
+        headlines = value.get('headlines') or []
+        if not headlines or result.get('classified_by') or result.get('news_type') not in NEWS_TYPES:
+            continue
+        trigger_level = key.split("|")[2]
+        # Entries written before cluster sizes were cached hold bare titles
+        items = [h if isinstance(h, dict) else {"title": h} for h in headlines]
+        cases.append((trigger_level, items, result))
+    return cases
+
+def evaluate(cases: list, min_score: float, min_ratio: float, min_share: float) -> dict:
+    """
+    Coverage, news_type / direction agreement and the confusion counts
+    (LLM news_type -> lexicon decision, 'llm' when it defers).
+    """
+    confusion = Counter()
+    decided = agreed = direction_agreed = 0
+    for trigger_level, items, result in cases:
+        scores = preclassifier.score_headlines(items)
+        decision = preclassifier.decide(scores, min_score, min_ratio, min_share)
+        confusion[(result['news_type'], decision or "llm")] += 1
+        if decision is None:
+            continue
+        decided += 1
+        if decision == result['news_type']:
+            agreed += 1
+            local = preclassifier.preclassify("", trigger_level, items, settings={
+                "min_score": min_score, "min_ratio": min_ratio, "min_share": min_share
+            })
+            direction_agreed += local['direction'] == result.get('direction')
+
+    return {
+        "cases": len(cases),
+        "coverage": round(decided / len(cases), 3) if cases else 0.0,
+        "agreement": round(agreed / decided, 3) if decided else None,
+        "direction_agreement": round(direction_agreed / agreed, 3) if agreed else None,
+        "confusion": {f"{llm}->{local}": n for (llm, local), n in sorted(confusion.items())}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cache", help="LLM cache file (default: llm_cache.path from config.yaml)")
+    parser.add_argument("--min-score", type=float)
+    parser.add_argument("--min-ratio", type=float)
+    parser.add_argument("--min-share", type=float)
+    parser.add_argument("--sweep", action="store_true", help="also sweep min_score x min_ratio")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    config = load_config()
+    settings = config.get('preclassifier') or {}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = args.cache or os.path.join(root, (config.get('llm_cache') or {}).get('path', 'data/llm_cache.sqlite'))
+    if not os.path.exists(path):
+        parser.error(f"no LLM cache at {path}")
+
+    cache = PersistentCache(path, ttl=None, max_entries=0)
+    try:
+        cases = load_cases(cache)
+    finally:
+        cache.close()
+
+    min_score = args.min_score if args.min_score is not None else float(settings.get('min_score', preclassifier.DEFAULT_MIN_SCORE))
+    min_ratio = args.min_ratio if args.min_ratio is not None else float(settings.get('min_ratio', preclassifier.DEFAULT_MIN_RATIO))
+    min_share = args.min_share if args.min_share is not None else float(settings.get('min_share', preclassifier.DEFAULT_MIN_SHARE))
+
+    report = {"settings": {"min_score": min_score, "min_ratio": min_ratio, "min_share": min_share}}
+    report.update(evaluate(cases, min_score, min_ratio, min_share))
+    if args.sweep:
+        report["sweep"] = [
+            dict(min_score=score, min_ratio=ratio, **{
+                k: v for k, v in evaluate(cases, score, ratio, min_share).items() if k != "confusion"
+            })
+            for score in (3, 4, 6, 8, 12)
+            for ratio in (1.5, 2, 3, 5)
+        ]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Cached LLM classifications: {report['cases']}")
+    print(f"Settings: min_score={min_score:g} min_ratio={min_ratio:g} min_share={min_share:g}")
+    print(f"Coverage (LLM skipped):     {report['coverage']:.1%}")
+    if report['agreement'] is not None:
+        print(f"news_type agreement:        {report['agreement']:.1%}")
+    if report['direction_agreement'] is not None:
+        print(f"direction agreement:        {report['direction_agreement']:.1%}")
+    print("\nLLM -> lexicon")
+    for pair, n in report['confusion'].items():
+        print(f"  {pair:<26}{n:>6}")
+    if args.sweep:
+        print(f"\n{'min_score':>9}{'min_ratio':>10}{'coverage':>10}{'agreement':>11}")
+        for row in report['sweep']:
+            agreement = f"{row['agreement']:.1%}" if row['agreement'] is not None else "-"
+            print(f"{row['min_score']:>9g}{row['min_ratio']:>10g}{row['coverage']:>10.1%}{agreement:>11}")
+
+if __name__ == "__main__":
+    main()
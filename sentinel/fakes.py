@@ -0,0 +1,399 @@
+"""
+Offline stand-ins for the external services (yfinance, Google News, OpenAI,
+LINE) with configurable latency and failure injection.
+
+They return deterministic synthetic data, so the whole pipeline can run
+without network access. Installed through sentinel.providers (the
+'providers' config section); used by the pipeline benchmark.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import date
+from types import SimpleNamespace
+import numpy as np
+from .store import to_day
+
+class FakeServiceError(Exception):
+    """
+    An injected failure of a fake service; a throttled call carries
+    status_code 429 and a Retry-After header like the real APIs' errors.
+    """
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = {"Retry-After": f"{retry_after:g}"} if retry_after is not None else {}
+
+class FakeService:
+    """
+    Base for the stand-ins: simulates latency (a fixed part plus a part per
+    item in the request, with random jitter) and fails a share of the calls.
+    throttle_rate answers a share of the calls with a 429 error instead.
+    Keeps call statistics for benchmarks.
+    """
+
+    def __init__(self, latency_ms: float = 0, per_item_ms: float = 0, jitter_ms: float = 0,
+                 failure_rate: float = 0.0, latency_scale: float = 1.0, seed: int = 0,
+                 throttle_rate: float = 0.0, throttle_retry_after: float = 1):
+        self.latency_ms = float(latency_ms)
+        self.per_item_ms = float(per_item_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.failure_rate = float(failure_rate)
+        self.latency_scale = float(latency_scale)
+        self.seed = int(seed)
+        self.throttle_rate = float(throttle_rate)
+        self.throttle_retry_after = float(throttle_retry_after)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def _serve(self, items: int, produce, scale: float = 1.0):
+        """
+        Waits the simulated latency (times `scale`), then returns produce()
+        or raises an injected FakeServiceError.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            delay = self.latency_ms + self.per_item_ms * items + self._rng.uniform(0, self.jitter_ms)
+            failed = self._rng.random() < self.failure_rate
+            throttled = bool(self.throttle_rate) and not failed and self._rng.random() < self.throttle_rate
+        try:
+            if throttled:
+                # Rejected up front, as a rate limiter would
+                raise FakeServiceError(f"{type(self).__name__} rate limit", 429, self.throttle_retry_after)
+            time.sleep(delay * scale * self.latency_scale / 1000)
+            if failed:
+                raise FakeServiceError(f"injected {type(self).__name__} failure")
+            return produce()
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.calls += 1
+                self.items += items
+                self.failures += failed or throttled
+                self.busy_seconds += end - start
+                self.first_start = start if self.first_start is None else min(self.first_start, start)
+                self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def stats(self) -> dict:
+        """
+        Calls, items, injected failures, summed call time and the span from the
+        first call's start to the last call's end (all in seconds).
+        """
+        with self._lock:
+            span = 0.0 if self.first_start is None else self.last_end - self.first_start
+            return {
+                "calls": self.calls,
+                "items": self.items,
+                "failures": self.failures,
+                "busy_s": round(self.busy_seconds, 4),
+                "span_s": round(span, 4)
+            }
+
+def _symbol_seed(symbol: str, seed: int) -> int:
+    return zlib.crc32(symbol.encode("utf-8")) ^ seed
+
+class FakePrices(FakeService):
+    """
+    Stand-in for the batched yfinance download (price.download_closes).
+    Each symbol follows a deterministic synthetic path, so repeated or
+    incremental downloads agree. A share of the symbols (drop_rate) falls
+    between drop_min_pct and drop_max_pct on the latest bar, which fires
+    the triggers; missing_rate symbols come back without data.
+    """
+
+    def __init__(self, drop_rate: float = 0.05, drop_min_pct: float = 3.5, drop_max_pct: float = 9.0,
+                 missing_rate: float = 0.0, volatility_pct: float = 0.5, **kwargs):
+        kwargs.setdefault('latency_ms', 400)
+        kwargs.setdefault('per_item_ms', 0.5)
+        super().__init__(**kwargs)
+        self.drop_rate = drop_rate
+        self.drop_min_pct = drop_min_pct
+        self.drop_max_pct = drop_max_pct
+        self.missing_rate = missing_rate
+        self.volatility_pct = volatility_pct
+
+    def closes(self, symbols: list, days: np.ndarray) -> np.ndarray:
+        """
+        (symbols x days) closes; symbols picked by missing_rate are all NaN.
+        """
+        seeds = np.array([_symbol_seed(s, self.seed) for s in symbols], dtype=np.uint64)
+        unit = (seeds % 10007) / 10007.0
+        phase = (seeds % 6283) / 1000.0
+        base = 10 + 490 * unit
+
+        d = days.astype(np.float64)[None, :]
+        # Slow cycles plus hashed day-to-day noise: a pure function of (symbol, day)
+        noise = ((days.astype(np.uint64)[None, :] * np.uint64(2654435761) + seeds[:, None]) % np.uint64(1 << 20))
+        noise = noise / float(1 << 20) - 0.5
+        log_path = (0.08 * np.sin(d / 37.0 + phase[:, None])
+                    + 0.03 * np.sin(d / 9.0 + 2 * phase[:, None])
+                    + self.volatility_pct / 100 * noise)
+        closes = base[:, None] * np.exp(log_path)
+
+        if len(days):
+            # Latest business day drops for the selected symbols
+            drop = (seeds % np.uint64(100003)) / 100003.0 < self.drop_rate
+            size = self.drop_min_pct + (self.drop_max_pct - self.drop_min_pct) * ((seeds >> np.uint64(7)) % 1000) / 1000.0
+            latest = days == _last_business_day()
+            closes[:, latest] *= np.where(drop, 1 - size / 100, 1.0)[:, None]
+
+        missing = (seeds >> np.uint64(3)) % np.uint64(100003) / 100003.0 < self.missing_rate
+        closes[missing] = np.nan
+        return closes
+
+    def __call__(self, tickers: list, start: str, threads=True, auto_adjust=True) -> tuple:
+        def produce():
+            days = _business_days(to_day(date.fromisoformat(str(start))), _last_business_day())
+            return days, self.closes(list(tickers), days)
+        return self._serve(len(tickers), produce)
+
+def _business_days(first: int, last: int) -> np.ndarray:
+    days = np.arange(first, last + 1, dtype=np.int64)
+    # 1970-01-01 was a Thursday; Monday = 0
+    return days[(days + 3) % 7 < 5]
+
+def _last_business_day() -> int:
+    today = to_day(date.today())
+    while (today + 3) % 7 >= 5:
+        today -= 1
+    return today
+
+OUTLETS = ["Reuters", "Bloomberg", "CNBC", "MarketWatch", "Financial Times", "WSJ", "Barron's", "Kitco"]
+
+STORY_TEMPLATES = [
+    "{topic} slides as investors rush for the exits",
+    "{topic} falls after stronger dollar weighs on commodities",
+    "Analysts see {topic} selloff as overdone",
+    "{topic} drops on weaker demand outlook from China",
+    "Funds cut positions in {topic} ahead of Fed decision",
+    "{topic} tumbles as supply glut fears grow",
+    "Traders brace for more volatility in {topic}",
+    "{topic} hit by profit-taking after rally"
+]
+
+class FakeNews(FakeService):
+    """
+    Stand-in for one Google News RSS feed (news.fetch_feed_items).
+    Returns items_per_feed items for a query: stories_per_feed stories, each
+    run by several outlets with slightly different headlines, so clustering
+    has near-duplicates to merge.
+    """
+
+    def __init__(self, items_per_feed: int = 40, stories_per_feed: int = 8, **kwargs):
+        kwargs.setdefault('latency_ms', 300)
+        kwargs.setdefault('jitter_ms', 200)
+        super().__init__(**kwargs)
+        self.items_per_feed = items_per_feed
+        self.stories_per_feed = stories_per_feed
+
+    def feed_items(self, query: str, max_items: int) -> list:
+        rng = random.Random(_symbol_seed(query, self.seed))
+        stories = rng.sample(STORY_TEMPLATES, min(self.stories_per_feed, len(STORY_TEMPLATES)))
+        feed_id = zlib.crc32(query.encode("utf-8"))
+        items = []
+        for i in range(min(self.items_per_feed, max_items)):
+            outlet = OUTLETS[i % len(OUTLETS)]
+            title = stories[i % len(stories)].format(topic=query.title())
+            if i >= len(stories):
+                # Later copies of a story are re-worded a little
+                title = title.replace(" as ", " while ") if i % 2 else f"{title}, traders say"
+            items.append({
+                "title": f"{title} - {outlet}",
+                "source": outlet,
+                "published_at": f"Mon, 0{1 + i % 9} Jun 2026 {8 + i % 12:02d}:00:00 GMT",
+                "summary": "",
+                "link": f"https://news.example.com/{feed_id:08x}/{i}"
+            })
+        return items
+
+    def __call__(self, query: str, max_items: int) -> list:
+        return self._serve(1, lambda: self.feed_items(query, max_items))
+
+class FakeLLM(FakeService):
+    """
+    Stand-in for the OpenAI client (ai_classifier.get_client): answers
+    chat.completions.create with a schema-valid classification for every
+    ASSET block in the prompt. latency_ms is the time to the first token;
+    generating the answer takes per_item_ms per asset, like output tokens do.
+    With stream=True the answer arrives in chunks spread over that time.
+    model_speed scales the latency per model (smaller models answer faster).
+    """
+
+    # Characters per streamed chunk (a few tokens)
+    STREAM_CHUNK_CHARS = 12
+
+    def __init__(self, model_speed: dict = None, **kwargs):
+        kwargs.setdefault('latency_ms', 700)
+        kwargs.setdefault('per_item_ms', 3000)
+        kwargs.setdefault('jitter_ms', 300)
+        super().__init__(**kwargs)
+        self.model_speed = {"gpt-4o-mini": 0.35} if model_speed is None else model_speed
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @staticmethod
+    def classify(asset: str, trigger_level: str, news: list, also_in: list = ()) -> dict:
+        """
+        news: (published_at, title, source) tuples from the prompt; also_in:
+        languages of the 'Also In' line, answered with 'translations'.
+        """
+        titles = [title for _, title, _ in news]
+        pick = zlib.crc32(f"{asset}|{'|'.join(titles)}".encode("utf-8"))
+        news_type = ["emotional", "structural", "unclear"][pick % 3]
+        direction = "bearish" if news_type == "structural" else ["bearish", "neutral"][pick % 2]
+        result = {
+            "asset": asset,
+            "trigger_level": trigger_level,
+            "news_type": news_type,
+            "direction": direction,
+            "confidence": ["low", "medium", "high"][(pick >> 3) % 3],
+            "key_driver": f"Synthetic driver for {asset}",
+            "recommended_action": "Wait and monitor",
+            # Supporting detail makes up most of a real answer
+            "supporting_points": [
+                f"'{title}' points to positioning and sentiment rather than a lasting change in supply or demand."
+                for title in titles[:3]
+            ],
+            "news_used": [
+                {"title": title, "source": source, "published_at": published}
+                for published, title, source in news[:3]
+            ]
+        }
+        if also_in:
+            result["translations"] = {
+                lang: {
+                    "key_driver": f"[{lang}] {result['key_driver']}",
+                    "recommended_action": f"[{lang}] {result['recommended_action']}",
+                    "supporting_points": [f"[{lang}] {point}" for point in result["supporting_points"]]
+                }
+                for lang in also_in
+            }
+        return result
+
+    def _stream(self, content: str, items: int, usage, scale: float):
+        pieces = [content[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(content), self.STREAM_CHUNK_CHARS)]
+        delay = self.per_item_ms * items * scale * self.latency_scale / 1000 / max(1, len(pieces))
+        start = time.perf_counter()
+        try:
+            for piece in pieces:
+                time.sleep(delay)
+                delta = SimpleNamespace(content=piece)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            if usage is not None:
+                yield SimpleNamespace(choices=[], usage=usage)
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.items += items
+                self.busy_seconds += end - start
+                self.last_end = max(self.last_end or end, end)
+
+    def create(self, model=None, messages=None, response_format=None, temperature=None,
+               stream=False, stream_options=None, **kwargs):
+        prompt = messages[-1]['content']
+        # One block per asset: 'Asset:' line, 'Trigger Level:' line and '- [date] title (source)' lines
+        blocks = re.split(r"^\s*Asset: ", prompt, flags=re.M)[1:]
+        also_in = re.search(r"^\s*Also In: (.+)$", prompt, flags=re.M)
+        also_in = [lang.strip() for lang in also_in.group(1).split(",")] if also_in else []
+        results = []
+        for block in blocks:
+            asset = block.splitlines()[0].strip()
+            level = re.search(r"Trigger Level: (\S+)", block)
+            news = re.findall(r"^\s*- \[([^\]]*)\] (.+) \(([^()]*)\)(?: \[reported by \d+ outlets\])?$", block, flags=re.M)
+            results.append(self.classify(asset, level.group(1) if level else "L1", news, also_in))
+
+        body = {"results": results} if "BATCH" in prompt else (results[0] if results else {})
+        content = json.dumps(body, ensure_ascii=False)
+        # Roughly 4 characters per token
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(m['content']) for m in messages) // 4,
+            completion_tokens=len(content) // 4
+        )
+
+        scale = self.model_speed.get(model, 1.0)
+        if stream:
+            # Time to first token (and injected failures) up front, then the chunks
+            self._serve(0, lambda: None, scale)
+            include_usage = (stream_options or {}).get('include_usage')
+            return self._stream(content, len(results), usage if include_usage else None, scale)
+
+        message = SimpleNamespace(content=content)
+        response = SimpleNamespace(choices=[SimpleNamespace(message=message)], model=model, usage=usage)
+        return self._serve(len(results), lambda: response, scale)
+
+class FakeResponse:
+    """The parts of requests.Response the notifier looks at."""
+
+    def __init__(self, status_code: int, headers: dict = None, text: str = ""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+class FakeLine(FakeService):
+    """
+    Stand-in for the LINE push and multicast endpoints (notifier.push_message).
+    rate_limit_rate answers 429 with Retry-After, server_error_rate answers
+    500; failure_rate raises like a network error. Counts delivered bubbles.
+    """
+
+    def __init__(self, rate_limit_rate: float = 0.0, server_error_rate: float = 0.0,
+                 retry_after: float = 1, **kwargs):
+        kwargs.setdefault('latency_ms', 200)
+        kwargs.setdefault('jitter_ms', 100)
+        super().__init__(**kwargs)
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after = retry_after
+        self.delivered = 0
+
+    def __call__(self, payload, channel_token: str):
+        if isinstance(payload, bytes):
+            # A pre-rendered body, as the real endpoint would receive it
+            payload = json.loads(payload)
+        contents = payload['messages'][0]['contents']
+        bubbles = len(contents['contents']) if contents.get('type') == 'carousel' else 1
+        # A multicast delivers every bubble to each recipient
+        if isinstance(payload['to'], list):
+            bubbles *= len(payload['to'])
+
+        def produce():
+            with self._lock:
+                roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                return FakeResponse(429, {"Retry-After": str(self.retry_after)}, "rate limited")
+            if roll < self.rate_limit_rate + self.server_error_rate:
+                return FakeResponse(500, text="injected server error")
+            with self._lock:
+                self.delivered += bubbles
+            return FakeResponse(200, text="{}")
+
+        return self._serve(bubbles, produce)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["delivered"] = self.delivered
+        return stats
+
+FAKES = {
+    "prices": FakePrices,
+    "news": FakeNews,
+    "llm": FakeLLM,
+    "line": FakeLine
+}
+
+def build(service: str, spec: dict) -> FakeService:
+    """
+    Creates the stand-in for a service from its 'providers' config entry
+    (every key except 'backend' is passed to the constructor).
+    """
+    options = {key: value for key, value in (spec or {}).items() if key != 'backend'}
+    return FAKES[service](**options)
@@ -0,0 +1,324 @@
+import json
+import re
+import threading
+from json.encoder import encode_basestring
+from .triggers import minute_changes
+
+# Localization Labels
+LABELS = {
+    "en": {
+        "risk": "RISK ALERT",
+        "price": "Current Price",
+        "type": "Market Type",
+        "driver": "Key Driver",
+        "rec": "Action",
+        "news": "Top News",
+        "prelim": "PRELIMINARY",
+        "stale": "CACHED",
+        "age": "{age} old"
+    },
+    "zh-TW": {
+        "risk": "風險警報",
+        "price": "當前價格",
+        "type": "市場類型",
+        "driver": "主要原因",
+        "rec": "建議行動",
+        "news": "焦點新聞",
+        "prelim": "初步",
+        "stale": "快取",
+        "age": "{age}前"
+    }
+}
+
+# Colors
+COLOR_HEADER = "#D32F2F"  # Red for Alert
+COLOR_LINK = "#0066cc"    # Blue to indicate link
+
+MAX_NEWS = 3
+# Fallback URL if 'link' is missing, though news.py provides it
+DEFAULT_NEWS_URL = "https://news.google.com"
+
+# Dynamic texts of a bubble, in the order they appear
+SLOTS = ("header", "price", "type", "driver", "rec")
+
+# Classification texts that come in every subscriber language
+TRANSLATED_FIELDS = ("key_driver", "recommended_action", "supporting_points")
+
+def labels_for(lang: str) -> dict:
+    return LABELS.get(lang, LABELS["en"])
+
+def localized(report: dict, lang: str) -> dict:
+    """
+    The report with its texts in `lang` when the classification has a
+    translation for it (see ai_classifier.analyze_risk), else unchanged.
+    """
+    translation = (report.get('translations') or {}).get(lang)
+    if not translation:
+        return report
+    return dict(report, **{field: translation[field] for field in TRANSLATED_FIELDS if translation.get(field)})
+
+def format_age(seconds: float) -> str:
+    # Minutes under an hour, hours under two days, else days
+    if seconds < 3600:
+        return f"{max(1, round(seconds / 60))}m"
+    if seconds < 48 * 3600:
+        return f"{round(seconds / 3600)}h"
+    return f"{round(seconds / 86400)}d"
+
+def slot_values(report: dict, labels: dict) -> dict:
+    """
+    The per-alert texts of a bubble: {slot: text}.
+    """
+    price_data = report.get('price_data', {})
+    risk = labels['risk']
+    if report.get('provisional'):
+        # Sent before the supporting points and news links were ready
+        risk = f"{labels['prelim']} {risk}"
+    elif report.get('stale'):
+        # Last known classification, served while the LLM was unavailable
+        risk = f"{labels['stale']} {risk}"
+        if report.get('stale_seconds') is not None:
+            risk += f" · {labels['age'].format(age=format_age(report['stale_seconds']))}"
+
+    price_change = f"1D: {price_data.get('change_1d')}% | 3D: {price_data.get('change_3d')}%"
+    for n, change in minute_changes(price_data)[-1:]:
+        # Intraday alert: the longest minute window
+        price_change += f" | {n}m: {change}%"
+    price = f"{price_data.get('current_price')} ({price_change})"
+    members = " · ".join(f"{m['symbol']} {m['change_1d']}%" for m in price_data.get('members') or [])
+    if members:
+        # Grouped alert: the members' own 1D moves under the index
+        price += f"\n{members}"
+
+    return {
+        "header": f"{report.get('asset', 'Unknown')} {risk} ({report.get('trigger_level', '')})",
+        "price": price,
+        "type": f"{labels['type']}: {report.get('news_type', '').upper()}",
+        "driver": report.get('key_driver', ''),
+        "rec": report.get('recommended_action', '')
+    }
+
+def news_links(report: dict) -> list:
+    """[(text, url)] of the news shown on a bubble (top 3)."""
+    return [
+        (f"• {news.get('title', '')} ({news.get('source', '')})", news.get('link', DEFAULT_NEWS_URL))
+        for news in (report.get('news_used') or [])[:MAX_NEWS]
+    ]
+
+def news_header(labels: dict) -> dict:
+    return {
+        "type": "text",
+        "text": labels['news'],
+        "weight": "bold",
+        "size": "sm",
+        "margin": "lg",
+        "color": "#555555"
+    }
+
+def news_item(text: str, url: str) -> dict:
+    return {
+        "type": "text",
+        "text": text,
+        "size": "xs",
+        "color": COLOR_LINK,
+        "wrap": True,
+        "margin": "sm",
+        "action": {
+            "type": "uri",
+            "label": "Read",
+            "uri": url
+        }
+    }
+
+def bubble(labels: dict, texts: dict, news_components: list) -> dict:
+    """
+    The alert bubble layout, filled with the given texts and news components.
+    """
+    return {
+        "type": "bubble",
+        "header": {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                {
+                    "type": "text",
+                    "text": texts['header'],
+                    "weight": "bold",
+                    "color": "#FFFFFF",
+                    "size": "lg"
+                }
+            ],
+            "backgroundColor": COLOR_HEADER
+        },
+        "body": {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                # Price Section
+                {
+                    "type": "box",
+                    "layout": "vertical",
+                    "margin": "md",
+                    "contents": [
+                        {
+                            "type": "text",
+                            "text": labels['price'],
+                            "size": "xs",
+                            "color": "#aaaaaa"
+                        },
+                        {
+                            "type": "text",
+                            "text": texts['price'],
+                            "weight": "bold",
+                            "size": "md",
+                            "wrap": True
+                        }
+                    ]
+                },
+                {
+                    "type": "separator",
+                    "margin": "lg"
+                },
+                # Type & Driver
+                {
+                    "type": "box",
+                    "layout": "vertical",
+                    "margin": "lg",
+                    "contents": [
+                        {
+                            "type": "text",
+                            "text": texts['type'],
+                            "size": "sm",
+                            "weight": "bold",
+                            "color": "#333333"
+                        },
+                        {
+                            "type": "text",
+                            "text": texts['driver'],
+                            "size": "xs",
+                            "color": "#666666",
+                            "wrap": True,
+                            "margin": "xs"
+                        }
+                    ]
+                },
+                # Recommendation (Highlighted)
+                {
+                    "type": "box",
+                    "layout": "vertical",
+                    "margin": "lg",
+                    "backgroundColor": "#F5F5F5",
+                    "cornerRadius": "md",
+                    "paddingAll": "md",
+                    "contents": [
+                        {
+                            "type": "text",
+                            "text": labels['rec'],
+                            "size": "xs",
+                            "color": "#aaaaaa"
+                        },
+                        {
+                            "type": "text",
+                            "text": texts['rec'],
+                            "size": "sm",
+                            "weight": "bold",
+                            "color": "#009688",
+                            "wrap": True
+                        }
+                    ]
+                },
+                # News Section
+                *news_components
+            ]
+        }
+    }
+
+def bubble_dict(report: dict, lang: str) -> dict:
+    """
+    One alert as a Flex bubble dict, built from scratch.
+    """
+    labels = labels_for(lang)
+    report = localized(report, lang)
+    links = news_links(report)
+    news_components = [news_header(labels)] + [news_item(text, url) for text, url in links] if links else []
+    return bubble(labels, slot_values(report, labels), news_components)
+
+def _marker(name: str) -> str:
+    return f"\x00{name}\x00"
+
+# A serialized marker string, with the array comma in front of it if any
+_MARKER = re.compile(r'(,?)"\\u0000(\w+)\\u0000"')
+
+def _encode(value) -> str:
+    return encode_basestring(value) if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+class BubbleTemplate:
+    """
+    The bubble layout of one language, serialized once with marker strings in
+    the dynamic slots. The JSON between the slots is kept as ready-made text,
+    so rendering an alert only escapes its own texts and joins the pieces.
+    Renders the same JSON as json.dumps(bubble_dict(report, lang)).
+    """
+
+    def __init__(self, lang: str):
+        self.lang = lang
+        self.labels = labels_for(lang)
+        skeleton = bubble(self.labels, {name: _marker(name) for name in SLOTS}, [_marker("news")])
+        pieces = _MARKER.split(_dumps(skeleton))
+        # static, (comma, slot, static)*
+        self.head = pieces[0]
+        self.parts = [(pieces[i], pieces[i + 1], pieces[i + 2]) for i in range(1, len(pieces), 3)]
+
+        self.news_header = _dumps(news_header(self.labels))
+        item = _dumps(news_item(_marker("text"), _marker("uri")))
+        before_text, _, _, before_uri, _, _, after_uri = _MARKER.split(item)
+        # The markers sit in dict values, so no comma was captured
+        self.item_parts = (before_text, before_uri, after_uri)
+
+    def _news(self, report: dict) -> str:
+        links = news_links(report)
+        if not links:
+            return ""
+        before_text, before_uri, after_uri = self.item_parts
+        return ",".join([self.news_header] + [
+            f"{before_text}{_encode(text)}{before_uri}{_encode(url)}{after_uri}" for text, url in links
+        ])
+
+    def render(self, report: dict) -> str:
+        """JSON text of one alert bubble."""
+        report = localized(report, self.lang)
+        values = slot_values(report, self.labels)
+        out = [self.head]
+        for comma, slot, static in self.parts:
+            text = self._news(report) if slot == "news" else _encode(values[slot])
+            if text:
+                out.append(comma)
+                out.append(text)
+            out.append(static)
+        return "".join(out)
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+def get_template(lang: str) -> BubbleTemplate:
+    """The compiled template of a language (compiled on first use)."""
+    template = _templates.get(lang)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(lang)
+            if template is None:
+                template = _templates[lang] = BubbleTemplate(lang)
+    return template
+
+def render_bubble(report: dict, lang: str) -> str:
+    return get_template(lang).render(report)
+
+def render_carousel(reports: list, lang: str) -> str:
+    """
+    JSON text of one carousel with a bubble per report, rendered in one pass.
+    """
+    template = get_template(lang)
+    return '{"type":"carousel","contents":[' + ",".join(template.render(report) for report in reports) + "]}"
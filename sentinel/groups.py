@@ -0,0 +1,291 @@
+import logging
+from dataclasses import dataclass
+import numpy as np
+from .alert_state import LEVEL_RANK
+from .triggers import TriggerEngine, pct_change
+
+# Defaults used when the 'groups' config section leaves them out
+DEFAULT_CORRELATION_WINDOW = 20
+DEFAULT_MIN_CORRELATION = 0.5
+DEFAULT_MIN_MEMBERS = 2
+
+# Group keys share the ticker namespace (alert state, outbox, subscribers)
+GROUP_PREFIX = "group:"
+
+@dataclass
+class Group:
+    """
+    A set of assets that tend to move together (e.g. precious metals).
+    The group index is the weighted average of the members' closes.
+    """
+    key: str
+    name: str
+    query: str
+    members: list
+    weights: np.ndarray
+    triggers: dict
+
+def parse_groups(sets: dict, assets: dict) -> list:
+    """
+    Groups from the 'groups.sets' config section. Members that are not
+    configured assets are ignored; a group needs at least two members.
+    """
+    groups = []
+    for name, spec in (sets or {}).items():
+        spec = spec or {}
+        members = spec.get('members') or []
+        weights = members if isinstance(members, dict) else {}
+        known = [ticker for ticker in members if ticker in assets]
+        unknown = [ticker for ticker in members if ticker not in assets]
+        if unknown:
+            logging.warning(f"Group {name!r} lists unknown assets {', '.join(unknown)}; ignored.")
+        if len(known) < 2:
+            logging.warning(f"Group {name!r} has fewer than two known members; ignored.")
+            continue
+        groups.append(Group(
+            key=f"{GROUP_PREFIX}{name}",
+            name=spec.get('name', name),
+            query=spec.get('query') or " OR ".join(assets[ticker]['query'] for ticker in known),
+            members=known,
+            weights=np.array([float(weights.get(ticker) or 1.0) for ticker in known]),
+            triggers=spec.get('triggers') or {}
+        ))
+    return groups
+
+def decide(index_level: str, member_levels: list, correlation: float,
+           min_correlation: float, min_members: int) -> str:
+    """
+    Level of a grouped alert, or None. The members must have moved together
+    (average pairwise correlation at least min_correlation). Then the group
+    fires if at least min_members members fired on their own, or if only the
+    group index reached a level (a broad move with no single member past
+    its threshold). One member alone stays an individual alert.
+    """
+    if not correlation >= min_correlation:
+        return None
+    if len(member_levels) >= min_members or (not member_levels and index_level):
+        return max([index_level, *member_levels], key=lambda level: LEVEL_RANK.get(level, 0))
+    return None
+
+def describe(market_data: dict, correlation: float, members: list) -> dict:
+    """
+    Group market data: the index's moves plus the correlation and the
+    members' own market data dicts (each with its 'level', if it fired).
+    """
+    return dict(market_data, correlation=round(float(correlation), 2), members=members)
+
+class GroupEngine:
+    """
+    Evaluates every configured group over a whole PriceMatrix at once.
+
+    Member rows are gathered once per universe into one flat index array, so
+    group indexes and correlations are segment sums over it (np.add.reduceat):
+    the cost grows with the number of memberships, never with the number of
+    member pairs. The index is checked against the usual trigger levels
+    (global thresholds, or the group's own 'triggers' block).
+    """
+
+    def __init__(self, groups_config: dict, triggers: dict, assets: dict):
+        groups_config = groups_config or {}
+        self.groups = parse_groups(groups_config.get('sets'), assets or {})
+        self.window = int(groups_config.get('correlation_window', DEFAULT_CORRELATION_WINDOW))
+        self.min_correlation = float(groups_config.get('min_correlation', DEFAULT_MIN_CORRELATION))
+        self.min_members = int(groups_config.get('min_members', DEFAULT_MIN_MEMBERS))
+        # Group thresholds are per-asset overrides keyed by the group key
+        self.engine = TriggerEngine(triggers, {g.key: {'triggers': g.triggers} for g in self.groups})
+        self._compiled_for = None
+        self._compiled = None
+
+    @property
+    def lookback(self) -> int:
+        """Closes needed for the index windows and the correlation window."""
+        if not self.groups:
+            return 0
+        return max(self.engine.lookback, self.window + 1)
+
+    def assets(self) -> dict:
+        """The groups as trigger-config assets: {key: {'name', 'query', 'triggers'}}."""
+        return {g.key: {"name": g.name, "query": g.query, "triggers": g.triggers} for g in self.groups}
+
+    def _compile(self, symbols: tuple) -> tuple:
+        # (groups, member rows, segment starts, weights) for the groups whose
+        # members are all in the universe
+        if self._compiled_for == symbols:
+            return self._compiled
+
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        groups = [g for g in self.groups if all(ticker in index for ticker in g.members)]
+        for g in self.groups:
+            missing = [ticker for ticker in g.members if ticker not in index]
+            if missing and len(missing) < len(g.members):
+                logging.warning(f"Group {g.key} is not evaluated in this run: {', '.join(missing)} not included.")
+        rows = np.array([index[ticker] for g in groups for ticker in g.members], dtype=np.intp)
+        starts = np.cumsum([0] + [len(g.members) for g in groups[:-1]]).astype(np.intp)
+        weights = np.concatenate([g.weights for g in groups]) if groups else np.zeros(0)
+
+        self._compiled_for = symbols
+        self._compiled = (groups, rows, starts, weights)
+        return self._compiled
+
+    @staticmethod
+    def index_closes(closes: np.ndarray, rows: np.ndarray, starts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        (groups x bars) weighted average closes; NaN where a member has no bar.
+        """
+        weighted = np.add.reduceat(closes[rows] * weights[:, None], starts, axis=0)
+        return weighted / np.add.reduceat(weights, starts)[:, None]
+
+    def correlations(self, closes: np.ndarray, rows: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """
+        Average pairwise correlation of the members' daily log returns over the
+        correlation window, per group. Only the days on which every member
+        has a return count, so members on different exchange calendars are
+        compared on the same days. With standardized returns z over those T
+        days, the correlations of all ordered member pairs add up to
+        |sum of z|^2 / T - n, so no member x member matrix is built.
+        Members with returns on fewer than half the window are left out; NaN
+        for groups with fewer than two usable members or common days.
+        """
+        block = closes[rows][:, -(self.window + 1):]
+        if block.shape[1] < 3:
+            return np.full(len(starts), np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(np.log(block), axis=1)
+        finite = np.isfinite(returns)
+        present = finite.sum(axis=1) >= max(2, returns.shape[1] // 2)
+        # Days on which every present member of the group has a return
+        common = np.logical_and.reduceat(finite | ~present[:, None], starts, axis=0)
+        group_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(rows))))
+        days = common[group_of]
+        count = days.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            kept = np.where(days, returns, 0.0)
+            mean = kept.sum(axis=1) / count
+            std = np.sqrt(np.where(days, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1) / count)
+            usable = present & (count >= 2) & (std > 0)
+            z = np.where(usable[:, None] & days, (kept - mean[:, None]) / std[:, None], 0.0)
+
+        n = np.add.reduceat(usable.astype(float), starts)
+        total = np.add.reduceat(z, starts, axis=0)
+        length = common.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = ((total ** 2).sum(axis=1) / length - n) / (n * (n - 1))
+        correlation[(n < 2) | (length < 2)] = np.nan
+        return correlation
+
+    def correlation_by_group(self, symbols: list, closes: np.ndarray) -> dict:
+        """{group key: average pairwise correlation} over a closes matrix."""
+        groups, rows, starts, _ = self._compile(tuple(symbols))
+        if not groups:
+            return {}
+        return dict(zip((g.key for g in groups), self.correlations(np.asarray(closes, dtype=float), rows, starts)))
+
+    def evaluate(self, symbols: list, closes: np.ndarray, fired: dict) -> list:
+        """
+        One pass over all groups. fired is {symbol: level} of the individual
+        triggers. Returns one dict per evaluable group: 'group', 'level' (None
+        when it does not fire), 'members' (the fired members it folds),
+        'correlation' and the index 'closes'. A member fired in several groups
+        is folded into the first one (config order).
+        """
+        groups, rows, starts, weights = self._compile(tuple(symbols))
+        if not groups:
+            return []
+
+        closes = np.asarray(closes, dtype=float)
+        index = self.index_closes(closes, rows, starts, weights)
+        levels, _ = self.engine.evaluate([g.key for g in groups], index)
+        correlation = self.correlations(closes, rows, starts)
+
+        results = []
+        claimed = set()
+        for i, group in enumerate(groups):
+            member_levels = {ticker: fired[ticker] for ticker in group.members if fired.get(ticker)}
+            level = decide(levels[i], list(member_levels.values()), correlation[i],
+                           self.min_correlation, self.min_members)
+            folded = [ticker for ticker in member_levels if ticker not in claimed]
+            if level and member_levels and not folded:
+                # An earlier group already took every fired member
+                level = None
+            if level:
+                claimed.update(folded)
+            results.append({
+                "group": group,
+                "level": level,
+                "members": folded if level else [],
+                "correlation": correlation[i],
+                "closes": index[i]
+            })
+        return results
+
+class GroupTracker:
+    """
+    Group indexes kept up to date bar by bar for intraday mode. A bar of one
+    symbol updates the running weighted sum of each group it belongs to, so
+    the cost per bar is the number of groups of that symbol, whatever the
+    size of the groups.
+    """
+
+    def __init__(self, groups: list):
+        self.groups = {g.key: g for g in groups}
+        self.memberships = {}
+        for g in groups:
+            for ticker, weight in zip(g.members, g.weights):
+                self.memberships.setdefault(ticker, []).append((g.key, float(weight)))
+        self.totals = {g.key: float(g.weights.sum()) for g in groups}
+        self.sums = dict.fromkeys(self.groups, 0.0)
+        self.missing = {g.key: len(g.members) for g in groups}
+        self.last = {}
+
+    def groups_of(self, symbol: str) -> list:
+        return [key for key, _ in self.memberships.get(symbol, ())]
+
+    def on_bar(self, symbol: str, close: float) -> list:
+        """
+        Feeds a member's latest close. Returns [(group key, index value)] for
+        its groups once every member of a group has a close.
+        """
+        memberships = self.memberships.get(symbol)
+        if not memberships:
+            return []
+        previous = self.last.get(symbol)
+        self.last[symbol] = close
+        updated = []
+        for key, weight in memberships:
+            if previous is None:
+                self.missing[key] -= 1
+                self.sums[key] += weight * close
+            else:
+                self.sums[key] += weight * (close - previous)
+            if not self.missing[key]:
+                updated.append((key, self.sums[key] / self.totals[key]))
+        return updated
+
+def reference_index(group: Group, references: dict) -> list:
+    """
+    The group index over the members' daily reference closes (aligned on the
+    most recent sessions), or [] if a member has none.
+    """
+    series = [references.get(ticker) for ticker in group.members]
+    if any(s is None or not len(s) for s in series):
+        return []
+    sessions = min(len(s) for s in series)
+    closes = np.array([np.asarray(s, dtype=float)[-sessions:] for s in series])
+    return list(GroupEngine.index_closes(closes, np.arange(len(series)), np.zeros(1, dtype=np.intp), group.weights)[0])
+
+def index_market_data(key: str, closes: np.ndarray) -> dict:
+    """
+    Market data dict of a group index row, in the shape of
+    PriceMatrix.market_data, or None without enough bars.
+    """
+    closes = np.asarray(closes, dtype=float)[None, :]
+    if closes.shape[1] < 4 or np.isnan(closes[0, -4:]).any():
+        return None
+    return {
+        "symbol": key,
+        "current_price": round(float(closes[0, -1]), 2),
+        "change_1d": float(pct_change(closes, 1)[0]),
+        "change_3d": float(pct_change(closes, 3)[0])
+    }
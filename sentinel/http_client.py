@@ -0,0 +1,29 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Keep-alive pool shared by every stage thread
+POOL_SIZE = 32
+USER_AGENT = "CommodityRiskSentinel/1.0"
+
+_session = None
+_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide pooled HTTP session (created on first use).
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "User-Agent": USER_AGENT,
+                    "Accept-Encoding": "gzip, deflate"
+                })
+                _session = session
+    return _session
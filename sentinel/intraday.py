@@ -0,0 +1,584 @@
+"""
+Intraday streaming mode.
+
+Consumes minute bars from a pluggable feed and evaluates the triggers on
+every bar instead of once per cron tick. Each symbol keeps its recent closes
+in a fixed-size ring buffer, so a bar costs one push and one lookup per
+configured window. Assets that fire go through the usual news -> AI -> notify
+path in the background while the feed keeps streaming.
+
+    venv/bin/python -m sentinel.intraday
+    venv/bin/python -m sentinel.intraday --replay data/replay/2024-08-05.csv --speed 60
+"""
+import argparse
+import csv
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from . import main, price, providers, metrics, subscribers, resilience
+from .alert_state import LEVEL_RANK
+from .config import load_config, load_env
+from .groups import GroupEngine, GroupTracker, decide, describe, reference_index
+from .store import to_day
+from .triggers import LEVELS, MINUTE_KEY, TriggerEngine, merge_triggers, parse_windows
+from .notify_queue import DEFAULT_DRAIN_TIMEOUT
+
+# Defaults used when config.yaml has no 'intraday' section
+DEFAULT_FEED = {"type": "yahoo", "poll_seconds": 60}
+DEFAULT_MAX_DISPATCH = 4
+# Daily windows always reported with an intraday alert (1D / 3D)
+REPORTED_SESSIONS = (1, 3)
+# A pause between bars at least this long starts a new session
+SESSION_GAP_SECONDS = 4 * 3600
+
+def session_date(ts: float) -> date:
+    """
+    Trading date of a bar. Taken in UTC, where the US, European and Asian
+    sessions each fall on a single date; the host's date can change
+    mid-session.
+    """
+    return datetime.fromtimestamp(ts, timezone.utc).date()
+
+class RingBuffer:
+    """
+    The last `size` closes of one symbol in a fixed circular list.
+    push, replace and ago are O(1) and never allocate.
+    """
+    __slots__ = ("values", "size", "head", "count")
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+        self.size = size
+        self.head = -1
+        self.count = 0
+
+    def push(self, value: float):
+        self.head = (self.head + 1) % self.size
+        self.values[self.head] = value
+        if self.count < self.size:
+            self.count += 1
+
+    def replace(self, value: float):
+        """Overwrites the newest value (a bar that is still forming)."""
+        self.values[self.head] = value
+
+    def ago(self, n: int):
+        """The value n bars before the newest one, or None if not buffered yet."""
+        if n >= self.count:
+            return None
+        return self.values[(self.head - n) % self.size]
+
+    def __len__(self):
+        return self.count
+
+class SymbolState:
+    __slots__ = ("bars", "rules", "reference", "first", "last_ts", "level")
+
+    def __init__(self, rules: list, reference: list):
+        longest = max((n for _, minute, _ in rules for n, _ in minute), default=1)
+        self.bars = RingBuffer(longest + 1)
+        self.rules = rules
+        self.reference = reference
+        self.first = None
+        self.last_ts = None
+        self.level = None
+
+def _change(close: float, past: float) -> float:
+    # Same precision as the daily market data dicts
+    return round((close - past) / past * 100, 2)
+
+class IntradayEngine:
+    """
+    Incremental trigger evaluation on a stream of bars.
+
+    Minute thresholds ('change_<N>m': N bars back) and the daily ones
+    ('change_<N>d': against the close N sessions ago) come from the same
+    'triggers' config and per-asset overrides as the daily run. A level fires
+    on the bar where it is first reached, and again only after an escalation
+    or once the symbol has gone calm in between.
+    """
+
+    def __init__(self, triggers: dict, assets: dict = None):
+        self.triggers = triggers or {}
+        self.assets = assets or {}
+        self.states = {}
+        self.references = {}
+
+    def rules_for(self, symbol: str) -> list:
+        """
+        [(level label, [(bars, threshold)], [(sessions, threshold)])], most severe first.
+        """
+        override = (self.assets.get(symbol) or {}).get('triggers')
+        triggers = merge_triggers(self.triggers, override) if override else self.triggers
+        rules = []
+        for name, label in LEVELS:
+            minute = sorted(parse_windows(triggers.get(name), MINUTE_KEY).items())
+            daily = sorted(parse_windows(triggers.get(name)).items())
+            if minute or daily:
+                rules.append((label, minute, daily))
+        return rules
+
+    def set_reference(self, symbol: str, closes):
+        """
+        Completed daily closes of a symbol (oldest -> newest) for the daily windows.
+        """
+        self.references[symbol] = [float(c) for c in closes]
+        if symbol in self.states:
+            self.states[symbol].reference = self.references[symbol]
+
+    def new_session(self):
+        """
+        Forgets the bars, levels and daily references of the previous
+        session; set_reference is called again for the new one.
+        """
+        self.states = {}
+        self.references = {}
+
+    def _state(self, symbol: str) -> SymbolState:
+        state = self.states[symbol] = SymbolState(self.rules_for(symbol), self.references.get(symbol, []))
+        return state
+
+    def level(self, symbol: str) -> str:
+        """Level the symbol is currently at (None when calm or unseen)."""
+        state = self.states.get(symbol)
+        return state.level if state else None
+
+    def on_bar(self, symbol: str, ts: float, close: float) -> str:
+        """
+        Feeds one bar. Returns 'L2' or 'L1' when that level is newly reached, else None.
+        A bar with the same timestamp as the previous one updates it in place;
+        older bars are ignored.
+        """
+        state = self.states.get(symbol) or self._state(symbol)
+        if state.last_ts is not None and ts <= state.last_ts:
+            if ts < state.last_ts:
+                return None
+            state.bars.replace(close)
+        else:
+            state.bars.push(close)
+            state.last_ts = ts
+            if state.first is None:
+                state.first = close
+
+        level = None
+        for label, minute, daily in state.rules:
+            if self._breached(state, close, minute, daily):
+                level = label
+                break
+
+        if level is None:
+            state.level = None
+            return None
+        if LEVEL_RANK[level] > LEVEL_RANK[state.level]:
+            state.level = level
+            return level
+        return None
+
+    @staticmethod
+    def _breached(state: SymbolState, close: float, minute: list, daily: list) -> bool:
+        for n, threshold in minute:
+            past = state.bars.ago(n)
+            if past and _change(close, past) <= threshold:
+                return True
+        reference = state.reference
+        for n, threshold in daily:
+            if n <= len(reference) and _change(close, reference[-n]) <= threshold:
+                return True
+        return False
+
+    def market_data(self, symbol: str) -> dict:
+        """
+        Market data dict for the latest bar of a symbol, in the shape of
+        PriceMatrix.market_data plus the minute-window changes.
+        Without daily history the 1D/3D moves are measured from the first bar.
+        """
+        state = self.states[symbol]
+        close = state.bars.ago(0)
+        data = {"symbol": symbol, "current_price": round(close, 2)}
+
+        sessions = {n for _, _, daily in state.rules for n, _ in daily} | set(REPORTED_SESSIONS)
+        for n in sorted(sessions):
+            past = state.reference[-n] if n <= len(state.reference) else state.first
+            data[f"change_{n}d"] = _change(close, past)
+        for n in sorted({n for _, minute, _ in state.rules for n, _ in minute}):
+            past = state.bars.ago(n)
+            if past:
+                data[f"change_{n}m"] = _change(close, past)
+
+        data["bar_time"] = datetime.fromtimestamp(state.last_ts).isoformat(timespec="minutes")
+        return data
+
+def parse_timestamp(value: str) -> float:
+    """ISO 8601 or epoch seconds -> epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+class ReplayFeed:
+    """
+    Minute bars from a CSV file with 'timestamp,symbol,close' rows in time
+    order (timestamp as ISO 8601 or epoch seconds). speed paces the replay:
+    0 = as fast as possible, 1 = real time, 60 = one minute of bars per second.
+    """
+
+    def __init__(self, tickers: list = None, path: str = None, speed: float = 0.0, **_):
+        if not path:
+            raise ValueError("The replay feed needs a 'path'")
+        self.path = path
+        self.speed = float(speed)
+        # Day of the replayed session; the daily reference closes are taken before it
+        with open(path, newline='') as f:
+            first = next(csv.DictReader(f), None)
+        self.as_of = session_date(parse_timestamp(first['timestamp'])) if first else None
+
+    def bars(self, stop: threading.Event):
+        """
+        Yields (timestamp, symbol, close); None marks the end of a timestamp's bars.
+        """
+        previous = None
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                if stop.is_set():
+                    return
+                ts = parse_timestamp(row['timestamp'])
+                if previous is not None and ts != previous:
+                    yield None
+                    if self.speed > 0 and ts > previous and stop.wait((ts - previous) / self.speed):
+                        return
+                previous = ts
+                yield ts, row['symbol'], float(row['close'])
+        yield None
+
+class YahooFeed:
+    """
+    Polls today's 1-minute bars of the watchlist from Yahoo Finance every
+    poll_seconds. The newest bar is still forming, so it is sent again on the
+    next poll with its final close. Bars are sent in time order across the
+    tickers. The session so far, up to the start, comes from warmup().
+    """
+
+    def __init__(self, tickers: list, poll_seconds: float = 60, **_):
+        self.tickers = list(tickers)
+        self.poll_seconds = float(poll_seconds)
+        # ticker -> timestamp of the last bar sent
+        self.last = {}
+
+    def _poll(self):
+        try:
+            with metrics.timer("intraday_poll"):
+                hist = price.yahoo_download(self.tickers, period="1d", interval="1m", threads=True)
+        except Exception as e:
+            logging.error(f"Error polling intraday bars: {e}")
+            metrics.incr("api_errors_total", service="prices")
+            return
+
+        stamps = [ts.timestamp() for ts in hist.index]
+        closes = hist['Close'].reindex(columns=self.tickers).to_numpy(dtype=float)
+        for ts, row in zip(stamps, closes):
+            for ticker, close in zip(self.tickers, row):
+                if ts >= self.last.get(ticker, 0.0) and not math.isnan(close):
+                    self.last[ticker] = ts
+                    yield ts, ticker, float(close)
+
+    def warmup(self):
+        """
+        The bars of the session before the monitor started. They only fill
+        the rolling windows: a drawdown from hours ago is not a new alert.
+        """
+        yield from self._poll()
+
+    def bars(self, stop: threading.Event):
+        while not stop.is_set():
+            yield from self._poll()
+            yield None
+            stop.wait(self.poll_seconds)
+
+# Feed 'type' in the intraday config -> feed class
+FEEDS = {"replay": ReplayFeed, "yahoo": YahooFeed}
+
+def open_feed(feed_config: dict, tickers: list):
+    """
+    Builds the feed from the 'intraday.feed' config section.
+    """
+    spec = dict(feed_config or DEFAULT_FEED)
+    kind = spec.pop('type', 'yahoo')
+    if kind not in FEEDS:
+        raise ValueError(f"Unknown intraday feed '{kind}' (expected one of {', '.join(FEEDS)})")
+    if spec.get('path'):
+        spec['path'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), spec['path'])
+    return FEEDS[kind](tickers=tickers, **spec)
+
+def reference_closes(tickers: list, sessions: int, as_of: date) -> dict:
+    """
+    The last `sessions` daily closes before `as_of` per ticker, from one
+    batched download. Tickers without history are left out.
+    """
+    start = (as_of - timedelta(days=max(price.LOOKBACK_CALENDAR_DAYS, sessions * 2))).isoformat()
+    try:
+        days, raw = price.download_closes(tickers, start)
+    except Exception as e:
+        logging.error(f"Error fetching daily reference closes: {e}")
+        metrics.incr("api_errors_total", service="prices")
+        return {}
+
+    completed = days < to_day(as_of)
+    references = {}
+    for ticker, series in zip(tickers, raw):
+        valid = price.tail_valid(series[completed], sessions)
+        if len(valid):
+            references[ticker] = valid
+    return references
+
+def stream(config: dict = None, feed=None, stop: threading.Event = None) -> dict:
+    """
+    Monitors the watchlist bar by bar until the feed ends or stop is set.
+    Assets that fire in the same bar are analyzed together, in the background.
+    Returns {'bars', 'triggered', 'alerts'} counts.
+    """
+    stop = stop or threading.Event()
+    load_env()
+    if config is None:
+        config = load_config()
+    providers.configure(config.get('providers'))
+    resilience.configure(config.get('resilience'))
+    assets = config.get('assets', {})
+    registry = subscribers.load_registry(config)
+    if registry is not None:
+        assets = registry.watched(assets)
+    tickers = list(assets)
+    intraday_config = config.get('intraday') or {}
+    concurrency = config.get('concurrency') or {}
+    if feed is None:
+        feed = open_feed(intraday_config.get('feed'), tickers)
+
+    # Group indexes are streamed through the same engine as the assets
+    groups = GroupEngine(config.get('groups'), config.get('triggers'), assets)
+    tracker = GroupTracker(groups.groups)
+    engine = IntradayEngine(config.get('triggers'), dict(assets, **groups.assets()))
+
+    # 1. Daily closes for the change_<N>d windows, measured from every bar,
+    # and for the groups' correlation window
+    sessions = max(max(REPORTED_SESSIONS), TriggerEngine(config.get('triggers'), assets).lookback - 1,
+                   groups.lookback)
+    correlations = {}
+    group_levels = {}
+
+    def start_session(as_of: date):
+        # Daily references, correlations and group indexes of the session on as_of
+        nonlocal tracker, correlations
+        engine.new_session()
+        tracker = GroupTracker(groups.groups)
+        group_levels.clear()
+        references = reference_closes(tickers, sessions, as_of)
+        for ticker, closes in references.items():
+            engine.set_reference(ticker, closes)
+        missing = [ticker for ticker in tickers if ticker not in references]
+        if missing:
+            logging.warning(f"No daily history for {', '.join(missing)}; "
+                            f"their 1D/3D moves are measured from the first bar.")
+
+        # Correlations move slowly: measured once per session on the daily closes
+        correlations = {}
+        if groups.groups:
+            for group in groups.groups:
+                engine.set_reference(group.key, reference_index(group, references))
+            history = list(references)
+            matrix = np.full((len(history), sessions), np.nan)
+            for i, ticker in enumerate(history):
+                matrix[i, sessions - len(references[ticker]):] = references[ticker]
+            correlations = groups.correlation_by_group(history, matrix)
+
+    start_session(getattr(feed, 'as_of', None) or date.today())
+    last_ts = None
+
+    def next_session(ts: float):
+        # A long pause before this bar: the closes so far are history now
+        nonlocal last_ts
+        if last_ts is not None and ts - last_ts >= SESSION_GAP_SECONDS:
+            logging.info(f"New session on {session_date(ts)}; reloading the daily reference closes.")
+            start_session(session_date(ts))
+        last_ts = ts if last_ts is None else max(last_ts, ts)
+
+    caches = main.open_caches(config)
+    alert_state = caches.get('alert_state')
+    notify_queue = caches.get('notify_queue')
+    limits = main.build_stage_limits(concurrency)
+    workers = max(1, int(concurrency.get('max_workers', main.DEFAULT_MAX_WORKERS)))
+    asset_timeout = float(concurrency.get('asset_timeout', main.DEFAULT_ASSET_TIMEOUT))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset")
+    # The feed loop only hands fired assets over, so it never waits on news or the LLM
+    dispatcher = ThreadPoolExecutor(
+        max_workers=int(intraday_config.get('max_dispatch', DEFAULT_MAX_DISPATCH)), thread_name_prefix="dispatch"
+    )
+
+    counts = {"bars": 0, "triggered": 0, "alerts": 0}
+    counts_lock = threading.Lock()
+
+    def analyze(triggered: dict, received: float):
+        deadline = time.monotonic() + asset_timeout * math.ceil(len(triggered) / workers)
+        try:
+            ready = main.analyze_triggered(
+                triggered, config, executor, limits, deadline, registry=registry, **caches
+            )
+        except Exception as e:
+            logging.error(f"Intraday analysis failed for {', '.join(triggered)}: {e}")
+            return
+        elapsed = time.perf_counter() - received
+        metrics.observe("intraday_alert", elapsed)
+        logging.info(f"{len(ready)} intraday alert(s) ready {elapsed:.1f}s after the bar arrived.")
+        with counts_lock:
+            counts["alerts"] += len(ready)
+
+    pending = {}
+    received = None
+    unreported = 0
+    touched = set()
+
+    def fold_groups():
+        # Groups whose index moved in this bar; a correlated group that fires
+        # takes over the pending triggers of its members
+        nonlocal received
+        for key in touched:
+            group = tracker.groups[key]
+            correlation = correlations.get(key, np.nan)
+            member_levels = [engine.level(ticker) for ticker in group.members if engine.level(ticker)]
+            level = decide(engine.level(key), member_levels, correlation, groups.min_correlation, groups.min_members)
+            if level is None:
+                group_levels[key] = None
+                if alert_state is not None and engine.level(key) is None:
+                    alert_state.observe_quiet(key, engine.market_data(key)['current_price'])
+                continue
+            if LEVEL_RANK[level] <= LEVEL_RANK[group_levels.get(key)]:
+                continue
+            group_levels[key] = level
+
+            folded = [ticker for ticker in group.members if ticker in pending]
+            for ticker in folded:
+                del pending[ticker]
+                logging.info(f"{ticker} moved with its group; folded into {key}.")
+                metrics.incr("alerts_suppressed_total", reason="grouped")
+            members = [dict(engine.market_data(ticker), level=engine.level(ticker))
+                       for ticker in group.members if ticker in engine.states]
+            market_data = describe(engine.market_data(key), correlation, members)
+            logging.info(f"⚠️ INTRADAY GROUP TRIGGER: {level} for {key} ({', '.join(folded) or 'index'}, "
+                         f"correlation {market_data['correlation']})")
+            metrics.incr("group_triggers_total", level=level)
+            counts["triggered"] += 1
+            reason = None
+            if alert_state is not None:
+                proceed, reason = alert_state.check(key, level, market_data['current_price'])
+                if not proceed:
+                    logging.info(f"Already alerted {key} ({reason}); skipping.")
+                    metrics.incr("alerts_suppressed_total", reason=reason)
+                    continue
+            if registry is not None:
+                registry.add_group(key, [member['symbol'] for member in members])
+            pending[key] = {"info": {"name": group.name, "query": group.query}, "market_data": market_data,
+                            "trigger": level, "alert_reason": reason}
+            received = received or time.perf_counter()
+        touched.clear()
+    # Bars from before the start (e.g. earlier in the session) fill the ring
+    # buffers and group indexes without dispatching anything
+    warmup = getattr(feed, 'warmup', None)
+    if warmup is not None:
+        warm = 0
+        for ts, symbol, close in warmup():
+            if symbol not in assets:
+                continue
+            warm += 1
+            next_session(ts)
+            engine.on_bar(symbol, ts, close)
+            for key, value in tracker.on_bar(symbol, close):
+                engine.on_bar(key, ts, value)
+        logging.info(f"Warmed up the rolling windows with {warm} bars from earlier in the session.")
+    logging.info(f"Intraday monitoring started for {len(tickers)} assets.")
+    try:
+        for bar in feed.bars(stop):
+            if bar is None:
+                # End of a bar time: dispatch everything that fired in it together
+                fold_groups()
+                if pending:
+                    dispatcher.submit(analyze, pending, received)
+                    pending, received = {}, None
+                metrics.incr("intraday_bars_total", unreported)
+                unreported = 0
+                continue
+
+            ts, symbol, close = bar
+            if symbol not in assets:
+                continue
+            next_session(ts)
+            unreported += 1
+            counts["bars"] += 1
+            level = engine.on_bar(symbol, ts, close)
+            for key, value in tracker.on_bar(symbol, close):
+                engine.on_bar(key, ts, value)
+                touched.add(key)
+            if level is None:
+                if alert_state is not None and engine.level(symbol) is None:
+                    alert_state.observe_quiet(symbol, close)
+                continue
+
+            market_data = engine.market_data(symbol)
+            logging.info(f"⚠️ INTRADAY TRIGGER: {level} for {symbol} at {market_data['bar_time']}: {market_data}")
+            metrics.incr("triggers_total", level=level)
+            counts["triggered"] += 1
+            reason = None
+            if alert_state is not None:
+                proceed, reason = alert_state.check(symbol, level, market_data['current_price'])
+                if not proceed:
+                    logging.info(f"Already alerted {symbol} ({reason}); skipping.")
+                    metrics.incr("alerts_suppressed_total", reason=reason)
+                    continue
+            pending[symbol] = {"info": assets[symbol], "market_data": market_data, "trigger": level, "alert_reason": reason}
+            received = received or time.perf_counter()
+
+        fold_groups()
+        if pending:
+            dispatcher.submit(analyze, pending, received)
+    finally:
+        # Analyses already handed over are finished before shutting down
+        dispatcher.shutdown(wait=True)
+        executor.shutdown(wait=False)
+        if notify_queue is not None:
+            queue_config = (config.get('notifications') or {}).get('queue') or {}
+            notify_queue.drain(float(queue_config.get('drain_timeout', DEFAULT_DRAIN_TIMEOUT)))
+            notify_queue.close(timeout=0)
+        for name, cache in caches.items():
+            if name != 'notify_queue' and hasattr(cache, 'close'):
+                cache.close()
+        logging.info(f"Intraday monitoring stopped: {counts['bars']} bars, {counts['triggered']} triggers, "
+                     f"{counts['alerts']} alerts.")
+    return counts
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replay", help="replay minute bars from this CSV instead of the configured feed")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay speed: 0 = as fast as possible, 1 = real time, 60 = a minute per second")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        logging.info(f"Received signal {signum}, stopping the intraday feed...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    config = load_config()
+    feed = None
+    if args.replay:
+        feed = ReplayFeed(path=args.replay, speed=args.speed)
+    stream(config=config, feed=feed, stop=stop)
+
+if __name__ == "__main__":
+    run()
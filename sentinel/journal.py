@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from . import metrics
+
+DEFAULT_RESUME_MINUTES = 90
+DEFAULT_KEEP_RUNS = 200
+DEFAULT_RETENTION_DAYS = 14
+
+class RunJournal:
+    """
+    Append-only JSON-lines journal of the runs of sentinel.main.run.
+
+    A run writes a 'start' line, one 'stage' line per asset and stage as soon
+    as that stage's output exists (the news items, the classification, the
+    delivery result), and an 'end' line when it finishes. Each line is
+    flushed on its own, so a process killed mid-run leaves every completed
+    stage on disk.
+
+    If the newest run has no 'end' line and wrote its last line less than
+    resume_minutes ago, the next run takes it over: assets whose trigger
+    level is unchanged reuse their journaled outputs instead of fetching,
+    classifying or notifying again.
+
+    Compaction: a finished (or abandoned) run is rewritten to one 'summary'
+    line without the stage outputs, and only the last keep_runs summaries
+    younger than retention_days are kept.
+    """
+
+    def __init__(self, path: str, resume_minutes: float = DEFAULT_RESUME_MINUTES,
+                 keep_runs: int = DEFAULT_KEEP_RUNS, retention_days: float = DEFAULT_RETENTION_DAYS,
+                 fsync: bool = False):
+        self.path = path
+        self.resume_window = float(resume_minutes) * 60
+        self.keep_runs = int(keep_runs)
+        self.retention = float(retention_days) * 86400
+        self.fsync = fsync
+        self.run_id = None
+        self.resumed = False
+        # ticker -> {stage: {'trigger', 'at', 'data'}} of the current run
+        self.completed = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _read(self) -> list:
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            logging.error(f"Could not read run journal {self.path}: {e}")
+            return []
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # The line being written when the process died
+                continue
+        return entries
+
+    @staticmethod
+    def _summary(run: str, entries: list, status: str, finished_at: float = None) -> dict:
+        start = next((e for e in entries if e['event'] == 'start'), {})
+        stages = {}
+        for e in entries:
+            if e['event'] == 'stage':
+                stages[e['stage']] = stages.get(e['stage'], 0) + 1
+        return {
+            "event": "summary",
+            "run": run,
+            "status": status,
+            "started_at": start.get('at'),
+            "finished_at": finished_at,
+            "resumes": sum(1 for e in entries if e['event'] == 'resume'),
+            "stages": stages
+        }
+
+    def _rewrite(self, entries: list):
+        # Write-then-rename so a crash never leaves a half-written journal
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        os.replace(tmp, self.path)
+
+    def _compact(self, entries: list, now: float, keep: str = None) -> list:
+        """
+        Summaries of the finished runs within the retention policy, followed
+        by the full lines of run `keep` (the one being resumed), if any.
+        """
+        runs = {}
+        for e in entries:
+            runs.setdefault(e.get('run'), []).append(e)
+
+        summaries = []
+        for run, run_entries in runs.items():
+            if run == keep:
+                continue
+            summary = next((e for e in run_entries if e['event'] == 'summary'), None)
+            if summary is None:
+                end = next((e for e in run_entries if e['event'] == 'end'), None)
+                status = "complete" if end else "abandoned"
+                summary = self._summary(run, run_entries, status, end['at'] if end else None)
+            summaries.append(summary)
+
+        summaries = [s for s in summaries if now - (s.get('started_at') or now) <= self.retention]
+        if self.keep_runs:
+            summaries = summaries[-self.keep_runs:]
+        return summaries + runs.get(keep, [])
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def begin(self, now: float = None) -> str:
+        """
+        Starts a run, or resumes the newest one if it was cut short within
+        resume_minutes. Returns the run ID.
+        """
+        now = time.time() if now is None else now
+        # A run that raised in the daemon never reached finish()
+        self.close()
+        entries = self._read()
+
+        last = None
+        for e in entries:
+            if e['event'] == 'start':
+                last = e['run']
+            elif e.get('run') == last and e['event'] == 'end':
+                last = None
+        active = max((e['at'] for e in entries if last is not None and e.get('run') == last), default=None)
+
+        self.completed = {}
+        self.resumed = last is not None and now - active <= self.resume_window
+        if self.resumed:
+            self.run_id = last
+            for e in entries:
+                if e.get('run') == self.run_id and e['event'] == 'stage':
+                    self.completed.setdefault(e['ticker'], {})[e['stage']] = e
+            logging.info(f"Resuming run {self.run_id} interrupted {(now - active) / 60:.0f} min ago "
+                         f"({len(self.completed)} asset(s) with completed stages).")
+            metrics.incr("runs_resumed_total")
+        else:
+            if last is not None:
+                logging.info(f"Run {last} was interrupted too long ago to resume; starting over.")
+            self.run_id = uuid.uuid4().hex[:12]
+
+        # Also drops a torn last line, so appends start on a clean line
+        self._rewrite(self._compact(entries, now, keep=self.run_id if self.resumed else None))
+        self._file = open(self.path, 'a')
+        if self.resumed:
+            self._append({"event": "resume", "run": self.run_id, "at": now})
+        else:
+            self._append({"event": "start", "run": self.run_id, "at": now})
+        return self.run_id
+
+    def done(self, ticker: str, stage: str, trigger: str) -> dict:
+        """
+        The journaled output of a stage for an asset in the current run, as
+        {'data', 'at'}, or None if the stage still has to run (or ran for a
+        different trigger level).
+        """
+        entry = self.completed.get(ticker, {}).get(stage)
+        if entry is None or entry.get('trigger') != trigger:
+            return None
+        return entry
+
+    def record(self, ticker: str, stage: str, trigger: str, data=None):
+        """
+        Journals the output of a stage for an asset; returns data unchanged.
+        Does nothing outside a run (e.g. in intraday mode).
+        """
+        if self.run_id is None:
+            return data
+        entry = {"event": "stage", "run": self.run_id, "ticker": ticker, "stage": stage,
+                 "trigger": trigger, "at": time.time(), "data": data}
+        try:
+            self._append(entry)
+        except (OSError, TypeError, ValueError) as e:
+            logging.error(f"Could not journal {stage} of {ticker}: {e}")
+            return data
+        with self._lock:
+            self.completed.setdefault(ticker, {})[stage] = entry
+        return data
+
+    def finish(self, now: float = None):
+        """
+        Ends the current run and compacts it into its summary line.
+        """
+        if self.run_id is None:
+            return
+        now = time.time() if now is None else now
+        self._append({"event": "end", "run": self.run_id, "at": now})
+        with self._lock:
+            self._file.close()
+            self._file = None
+        try:
+            self._rewrite(self._compact(self._read(), now))
+        except OSError as e:
+            logging.error(f"Could not compact run journal {self.path}: {e}")
+        self.run_id = None
+        self.completed = {}
+
+    def runs(self) -> list:
+        """The run summaries kept in the journal (oldest first)."""
+        return [e for e in self._read() if e['event'] == 'summary']
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def open_journal(journal_config: dict):
+    """
+    Builds the RunJournal from the 'journal' config section, or None when disabled.
+    """
+    journal_config = journal_config or {}
+    if not journal_config.get('enabled'):
+        return None
+    root = os.path.dirname(os.path.dirname(__file__))
+    return RunJournal(
+        os.path.join(root, journal_config.get('path', 'data/run_journal.jsonl')),
+        resume_minutes=journal_config.get('resume_minutes', DEFAULT_RESUME_MINUTES),
+        keep_runs=journal_config.get('keep_runs', DEFAULT_KEEP_RUNS),
+        retention_days=journal_config.get('retention_days', DEFAULT_RETENTION_DAYS),
+        fsync=bool(journal_config.get('fsync', False))
+    )
@@ -1,69 +1,541 @@
 import logging
+import math
 import os
-import yaml
-from . import price, news, ai_classifier, notifier
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from . import price, news, ai_classifier, notifier, providers, metrics, subscribers, resilience
+from .config import load_config, load_env
+from .cache import open_cache
+from .alert_state import open_alert_state
+from .notify_queue import open_notify_queue, DEFAULT_DRAIN_TIMEOUT
+from .journal import open_journal
 
 # Setup Logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s',
     handlers=[
         logging.FileHandler("sentinel.log"),
         logging.StreamHandler()
     ]
 )
 
-def load_config():
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+# Defaults used when config.yaml has no 'concurrency' section
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_ASSET_TIMEOUT = 120
+DEFAULT_STAGE_LIMITS = {"price": 8, "news": 8, "llm": 4, "notify": 2}
+DEFAULT_MAX_BATCH_SIZE = 6
+DEFAULT_STREAM_LEVELS = ["L2"]
 
-def run():
+class AssetTimeout(Exception):
+    """Raised when an asset runs past its per-asset time budget."""
+
+def build_stage_limits(concurrency: dict) -> dict:
+    """
+    Creates one semaphore per pipeline stage from the 'concurrency.stages' config.
+    """
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    limits.update(concurrency.get('stages') or {})
+    return {stage: threading.BoundedSemaphore(max(1, int(n))) for stage, n in limits.items()}
+
+def run_stage(stage: str, limits: dict, deadline: float, fn, *args, **kwargs):
+    """
+    Runs fn inside the concurrency slot of the given stage.
+    Raises AssetTimeout if the asset's deadline passes before a slot frees up.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or not limits[stage].acquire(timeout=remaining):
+        raise AssetTimeout(f"timed out before '{stage}' stage")
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        limits[stage].release()
+
+def map_stage(executor, stage: str, limits: dict, deadline: float, fn, jobs: dict) -> dict:
+    """
+    Runs fn(key, job) for every job concurrently inside the stage's concurrency limit.
+    Failures and timeouts are logged per key and left out of the returned {key: result}.
+    """
+    futures = {executor.submit(run_stage, stage, limits, deadline, fn, key, job): key for key, job in jobs.items()}
+    results = {}
+
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except AssetTimeout as e:
+                logging.error(f"{key} ran out of time budget: {e}")
+            except Exception as e:
+                # Failure isolation: one broken asset must not abort the run
+                logging.error(f"{stage} stage failed for {key}: {e}")
+    except FuturesTimeout:
+        pending = [futures[f] for f in futures if not f.done()]
+        logging.error(f"{stage} stage timed out; still pending: {', '.join(pending)}")
+        # Queued jobs are cancelled; stuck ones are abandoned
+        for future in futures:
+            future.cancel()
+
+    return results
+
+def fetch_news(ticker: str, job: dict) -> list:
+    news_config = job.get('news_config') or {}
+    return news.get_recent_news(
+        job['info']['query'],
+        max_items=int(news_config.get('max_items', news.DEFAULT_MAX_ITEMS)),
+        max_unique=int(news_config.get('max_unique', news.DEFAULT_MAX_UNIQUE)),
+        similarity_threshold=float(news_config.get('similarity_threshold', news.DEFAULT_SIMILARITY)),
+        cache=job.get('feed_cache'),
+        max_stale_hours=float(news_config.get('max_stale_hours', news.DEFAULT_MAX_STALE_HOURS))
+    )
+
+def analyze_triggered(triggered: dict, config: dict, executor, limits: dict, deadline: float,
+                      llm_cache=None, feed_cache=None, alert_state=None, notify_queue=None,
+                      registry=None, journal=None) -> dict:
+    """
+    Runs the news -> AI -> notify stages for assets that fired a trigger.
+    triggered maps ticker -> {'info', 'market_data', 'trigger'} plus an optional
+    'alert_reason' from the alert-state check. With a SubscriberRegistry, each
+    asset is classified once in all its subscribers' languages and delivered
+    to each of them. With a RunJournal, each stage's output is journaled as it
+    completes, and stages a resumed run already completed are skipped.
+    Returns {ticker: analysis} for the assets that were classified.
+    """
+    llm_config = config.get('llm') or {}
+    price_bucket = float((config.get('llm_cache') or {}).get('price_bucket', ai_classifier.DEFAULT_PRICE_BUCKET))
+    max_stale_hours = float((config.get('llm_cache') or {}).get('max_stale_hours', ai_classifier.DEFAULT_MAX_STALE_HOURS))
+
+    def journaled(ticker, stage):
+        # Output of a stage the interrupted run already completed, or None
+        entry = journal.done(ticker, stage, triggered[ticker]['trigger']) if journal is not None else None
+        if entry is None:
+            return None
+        metrics.incr("stages_resumed_total", stage=stage)
+        return entry
+
+    def record(ticker, stage, data):
+        if journal is not None:
+            journal.record(ticker, stage, triggered[ticker]['trigger'], data)
+        return data
+
+    # 3. Fetch News
+    news_by_ticker = {}
+    news_jobs = {}
+    for ticker, job in triggered.items():
+        entry = journaled(ticker, "news")
+        if entry is not None:
+            news_by_ticker[ticker] = entry['data']
+        else:
+            news_jobs[ticker] = dict(job, news_config=config.get('news'), feed_cache=feed_cache)
+
+    def fetch_and_record(ticker, job):
+        items = fetch_news(ticker, job)
+        # No items may be a failed fetch; a resumed run tries again
+        return record(ticker, "news", items) if items else items
+
+    with metrics.timer("news"):
+        news_by_ticker.update(map_stage(executor, "news", limits, deadline, fetch_and_record, news_jobs))
+
+    # Same level, same headlines after the cooldown: nothing new to say
+    headline_hashes = {ticker: ai_classifier.headline_hash(items) for ticker, items in news_by_ticker.items()}
+    if alert_state is not None:
+        for ticker in list(news_by_ticker):
+            if not alert_state.headlines_changed(ticker, headline_hashes[ticker], triggered[ticker].get('alert_reason')):
+                logging.info(f"Headlines unchanged for {ticker}; skipping re-analysis.")
+                metrics.incr("alerts_suppressed_total", reason="headlines unchanged")
+                del news_by_ticker[ticker]
+
+    llm_requests = {
+        ticker: {
+            "asset": job['info']['name'],
+            "trigger_level": job['trigger'],
+            "price_data": job['market_data'],
+            "news_items": news_by_ticker[ticker],
+            "languages": registry.languages(ticker) if registry is not None else None
+        }
+        for ticker, job in triggered.items() if ticker in news_by_ticker
+    }
+    requested = list(llm_requests)
+
+    analyses = {}
+    for ticker in requested:
+        entry = journaled(ticker, "llm")
+        if entry is not None:
+            analyses[ticker] = entry['data']
+            del llm_requests[ticker]
+
+    # Clear-cut headline sets are classified locally and skip the LLM
+    preclassifier_config = config.get('preclassifier') or {}
+    if preclassifier_config.get('enabled'):
+        for ticker in list(llm_requests):
+            req = llm_requests[ticker]
+            result = ai_classifier.classify_locally(
+                req['asset'], req['trigger_level'], req['news_items'], preclassifier_config,
+                languages=req['languages']
+            )
+            if result:
+                logging.info(f"{ticker} classified locally as {result['news_type']}; skipping the LLM.")
+                analyses[ticker] = record(ticker, "llm", result)
+                del llm_requests[ticker]
+
+    # 4. AI Analysis - correlated sell-offs are classified together in one request;
+    # streamed levels get a provisional alert out as soon as their part of the answer arrives
+    llm_started = time.perf_counter()
+    stream_levels = set(llm_config.get('stream_levels', DEFAULT_STREAM_LEVELS)) if llm_config.get('stream') else set()
+    # A resumed run does not send the preliminary alert twice
+    streamed = {t for t, req in llm_requests.items()
+                if req['trigger_level'] in stream_levels and journaled(t, "provisional") is None}
+
+    # Batches never mix model tiers or language sets
+    routing = llm_config.get('routing')
+    size = max(1, int(llm_config.get('max_batch_size', DEFAULT_MAX_BATCH_SIZE)))
+
+    def batch(tickers):
+        by_tier = {}
+        for ticker in tickers:
+            req = llm_requests[ticker]
+            tier = ai_classifier.route(req['trigger_level'], routing)
+            by_tier.setdefault((tier, tuple(req['languages'] or ())), []).append(ticker)
+        chunks = {}
+        for tickers in by_tier.values():
+            if llm_config.get('batch', True) and len(tickers) > 1:
+                chunks.update({"+".join(tickers[i:i + size]): tickers[i:i + size] for i in range(0, len(tickers), size)})
+            else:
+                chunks.update({ticker: [ticker] for ticker in tickers})
+        return chunks
+
+    # While every request fits in the LLM slots at once, streamed assets go
+    # one by one so nothing waits on a batch; beyond that they are batched too
+    chunks = batch([t for t in llm_requests if t not in streamed])
+    llm_slots = int(((config.get('concurrency') or {}).get('stages') or {}).get('llm', DEFAULT_STAGE_LIMITS['llm']))
+    if len(chunks) + len(streamed) <= llm_slots:
+        chunks.update({ticker: [ticker] for ticker in llm_requests if ticker in streamed})
+    else:
+        chunks = batch(list(llm_requests))
+
+    def audience(ticker):
+        return registry.audience(ticker) if registry is not None else None
+
+    def send_provisional(ticker, report):
+        report['price_data'] = triggered[ticker]['market_data']
+        logging.info(f"Provisional result for {ticker}: {report['news_type']} - {report['recommended_action']}")
+        # Straight to LINE: the queue would hold it back to group a carousel
+        if notifier.send_line_notification(report, audience(ticker)):
+            metrics.incr("provisional_alerts_total")
+            record(ticker, "provisional", True)
+
+    # Preliminary alerts are pushed from their own thread, so LINE latency and
+    # failures never hold an LLM slot or count against the LLM guard
+    provisional_pushes = []
+    pusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="provisional") if streamed else None
+
+    def provisional_handler(ticker):
+        if ticker not in streamed:
+            return None
+        return lambda report: provisional_pushes.append(pusher.submit(
+            run_stage, "notify", limits, deadline, send_provisional, ticker, report
+        ))
+
+    def classify_chunk(key, chunk):
+        requests = [dict(llm_requests[t], on_provisional=provisional_handler(t)) for t in chunk]
+        if len(chunk) > 1:
+            results = dict(zip(chunk, ai_classifier.analyze_risk_batch(
+                requests, cache=llm_cache, price_bucket=price_bucket, routing=routing,
+                max_stale_hours=max_stale_hours
+            )))
+        else:
+            results = {chunk[0]: ai_classifier.analyze_risk(
+                **requests[0], cache=llm_cache, price_bucket=price_bucket, routing=routing,
+                max_stale_hours=max_stale_hours
+            )}
+        for ticker, result in results.items():
+            if result:
+                record(ticker, "llm", result)
+        return results
+
+    try:
+        for chunk_results in map_stage(executor, "llm", limits, deadline, classify_chunk, chunks).values():
+            analyses.update(chunk_results)
+    finally:
+        if pusher is not None:
+            # The full alerts go out after the preliminary ones
+            wait(provisional_pushes, timeout=max(0.0, deadline - time.monotonic()))
+            pusher.shutdown(wait=False)
+    metrics.observe("llm", time.perf_counter() - llm_started)
+
+    ready = {}
+    for ticker in requested:
+        analysis = analyses.get(ticker)
+        if not analysis:
+            logging.error(f"AI Analysis returned empty result for {ticker}.")
+            continue
+        analysis['price_data'] = triggered[ticker]['market_data']
+        logging.info(f"Analysis result for {ticker}: {analysis['news_type']} - {analysis['recommended_action']}")
+        ready[ticker] = analysis
+    metrics.incr("alerts_total", len(ready))
+
+    # 5. Notify - queued alerts are delivered in the background as one carousel
+    notify_started = time.perf_counter()
+    sent = {}
+    pending = {}
+    for ticker, analysis in ready.items():
+        entry = journaled(ticker, "notify")
+        if entry is not None:
+            sent[ticker] = entry['data']
+        else:
+            pending[ticker] = analysis
+
+    def notify(ticker, analysis):
+        if notify_queue is not None:
+            delivered = notify_queue.enqueue(analysis, audience(ticker))
+        else:
+            delivered = notifier.send_line_notification(analysis, audience(ticker))
+        # A failed delivery is retried by a resumed run
+        return record(ticker, "notify", delivered) if delivered is not False else delivered
+
+    if notify_queue is not None:
+        sent.update({ticker: notify(ticker, analysis) for ticker, analysis in pending.items()})
+    else:
+        sent.update(map_stage(executor, "notify", limits, deadline, notify, pending))
+    metrics.observe("notify", time.perf_counter() - notify_started)
+
+    if alert_state is not None:
+        for ticker, delivered in sent.items():
+            # False = delivery failed; retry on the next run instead of entering cooldown
+            if delivered is not False:
+                job = triggered[ticker]
+                alert_state.record_alert(
+                    ticker, job['trigger'], job['market_data']['current_price'], headline_hashes[ticker]
+                )
+
+    return ready
+
+def cache_settings(config: dict) -> list:
+    """
+    The config sections open_caches reads; the daemon reopens its caches
+    when any of them changes.
+    """
+    return [
+        config.get('llm_cache'),
+        (config.get('news') or {}).get('feed_cache'),
+        config.get('alerts'),
+        (config.get('notifications') or {}).get('queue'),
+        config.get('journal')
+    ]
+
+def close_caches(caches: dict):
+    for cache in caches.values():
+        if hasattr(cache, 'close'):
+            cache.close()
+
+def open_caches(config: dict) -> dict:
+    """
+    Opens the persistent caches and state configured in config.yaml (None when disabled).
+    """
+    return {
+        "llm_cache": open_cache(config.get('llm_cache'), 'data/llm_cache.sqlite'),
+        "feed_cache": open_cache((config.get('news') or {}).get('feed_cache'), 'data/feed_cache.sqlite'),
+        "alert_state": open_alert_state(config.get('alerts')),
+        "notify_queue": open_notify_queue((config.get('notifications') or {}).get('queue')),
+        "journal": open_journal(config.get('journal'))
+    }
+
+def run(config: dict = None, tickers: list = None, caches: dict = None):
+    """
+    One monitoring pass. By default it loads config.yaml and checks every asset;
+    the daemon passes its live config, the tickers that are due and its warm caches.
+    Returns the run report (stage timings and counters of this run).
+    """
     logging.info("Starting Commodity Risk Sentinel run...")
-    
-    config = load_config()
+    started_at = time.time()
+    run_started = time.perf_counter()
+    before = metrics.snapshot()
+    load_env()
+
+    if config is None:
+        config = load_config()
+    # Thresholds, groups and the price store follow the config of this run
+    price.apply_config(config)
     assets = config.get('assets', {})
-    
+    # Offline stand-ins for external services, if configured
+    providers.configure(config.get('providers'))
+    resilience.configure(config.get('resilience'))
+    if tickers is not None:
+        assets = {ticker: assets[ticker] for ticker in tickers if ticker in assets}
+    # Only what someone subscribes to is fetched and analyzed
+    registry = subscribers.load_registry(config)
+    if registry is not None:
+        assets = registry.watched(assets)
+        logging.info(f"{len(assets)} asset(s) watched by {registry.recipient_count()} subscriber(s).")
+    concurrency = config.get('concurrency') or {}
+
+    max_workers = int(concurrency.get('max_workers', DEFAULT_MAX_WORKERS))
+    asset_timeout = float(concurrency.get('asset_timeout', DEFAULT_ASSET_TIMEOUT))
+    limits = build_stage_limits(concurrency)
+    if not assets:
+        # Nothing to check: no caches, queue or journal are opened
+        logging.info("No assets configured.")
+        return metrics.run_report(
+            before, metrics.snapshot(),
+            started_at=time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started_at)),
+            duration_s=round(time.perf_counter() - run_started, 3),
+            assets=0,
+            triggered=0,
+            alerts=0,
+            services=resilience.status()
+        )
+
+    owns_caches = caches is None
+    if owns_caches:
+        caches = open_caches(config)
+    llm_cache = caches.get('llm_cache')
+    feed_cache = caches.get('feed_cache')
+    alert_state = caches.get('alert_state')
+    notify_queue = caches.get('notify_queue')
+    journal = caches.get('journal')
+
+    # Picks up an interrupted run where it stopped
+    if journal is not None:
+        journal.begin()
+
+    # 1. Get Price Data for the whole watchlist in one batched request
+    price_threads = int((concurrency.get('stages') or {}).get('price', DEFAULT_STAGE_LIMITS['price']))
+    lookback = max(price.LOOKBACK_BARS, price.get_triggers().lookback, price.get_groups().lookback)
+    with metrics.timer("price"):
+        matrix = price.get_market_data_bulk(
+            list(assets.keys()), lookback=lookback, threads=price_threads, store=price.get_store()
+        )
+
+    # 2. Check Triggers for every asset in one vectorized pass, then fold
+    # correlated members of a group into one grouped trigger
+    with metrics.timer("triggers"):
+        fired = price.check_triggers_matrix(matrix)
+        groups = price.check_group_triggers(matrix, fired)
+    folded = {ticker: group['key'] for group in groups for ticker in group['members']}
+
+    triggered = {}
     for ticker, info in assets.items():
         logging.info(f"Checking {info['name']} ({ticker})...")
-        
-        # 1. Get Price Data
-        market_data = price.get_market_data(ticker)
+        market_data = matrix.market_data(ticker)
         if not market_data:
             continue
-            
-        logging.info(f"Data: {market_data}")
 
-        # 2. Check Triggers
-        trigger = price.check_triggers(market_data)
-        
+        logging.info(f"Data: {market_data}")
+        trigger = fired.get(ticker)
         if not trigger:
             logging.info(f"No trigger for {ticker}. Market normal.")
+            if alert_state is not None:
+                alert_state.observe_quiet(ticker, market_data['current_price'])
             continue
-            
+
         logging.info(f"⚠️ TRIGGER FIRED: {trigger} for {ticker}")
+        metrics.incr("triggers_total", level=trigger)
+        if ticker in folded:
+            logging.info(f"{ticker} moved with its group; folded into {folded[ticker]}.")
+            metrics.incr("alerts_suppressed_total", reason="grouped")
+            continue
+        reason = None
+        if alert_state is not None:
+            proceed, reason = alert_state.check(ticker, trigger, market_data['current_price'])
+            if not proceed:
+                logging.info(f"Already alerted {ticker} ({reason}); skipping.")
+                metrics.incr("alerts_suppressed_total", reason=reason)
+                continue
+        triggered[ticker] = {"info": info, "market_data": market_data, "trigger": trigger, "alert_reason": reason}
 
-        # 3. Fetch News
-        news_items = news.get_recent_news(info['query'])
-        
-        # 4. AI Analysis
-        analysis = ai_classifier.analyze_risk(
-            asset=info['name'],
-            trigger_level=trigger,
-            price_data=market_data,
-            news_items=news_items
-        )
-        
-        if analysis:
-            analysis['price_data'] = market_data
-            
-            # 5. Notify
-            logging.info(f"Analysis result: {analysis['news_type']} - {analysis['recommended_action']}")
-            notifier.send_line_notification(analysis)
-        else:
-            logging.error("AI Analysis returned empty result.")
+    for group in groups:
+        key, market_data, trigger = group['key'], group['market_data'], group['level']
+        if not trigger:
+            if alert_state is not None:
+                alert_state.observe_quiet(key, market_data['current_price'])
+            continue
+        logging.info(f"⚠️ GROUP TRIGGER FIRED: {trigger} for {key} ({', '.join(group['members']) or 'index'}, "
+                     f"correlation {market_data['correlation']})")
+        metrics.incr("group_triggers_total", level=trigger)
+        reason = None
+        if alert_state is not None:
+            proceed, reason = alert_state.check(key, trigger, market_data['current_price'])
+            if not proceed:
+                logging.info(f"Already alerted {key} ({reason}); skipping.")
+                metrics.incr("alerts_suppressed_total", reason=reason)
+                continue
+        if registry is not None:
+            registry.add_group(key, [member['symbol'] for member in market_data['members']])
+        triggered[key] = {"info": group['info'], "market_data": market_data, "trigger": trigger, "alert_reason": reason}
+
+    ready = {}
+    if triggered:
+        # Assets beyond max_workers queue up, so the budget grows with the
+        # number of "waves" of assets that have to share the workers.
+        workers = max(1, min(max_workers, len(triggered)))
+        deadline = time.monotonic() + asset_timeout * math.ceil(len(triggered) / workers)
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset")
+        try:
+            ready = analyze_triggered(
+                triggered, config, executor, limits, deadline, llm_cache, feed_cache, alert_state, notify_queue,
+                registry=registry, journal=journal
+            )
+        finally:
+            # Don't block on stuck workers
+            executor.shutdown(wait=False)
+
+    if llm_cache is not None:
+        logging.info(f"LLM cache stats: {llm_cache.stats()}")
+
+    if notify_queue is not None and owns_caches:
+        # A one-shot run waits (bounded) for delivery; the daemon keeps its queue running
+        queue_config = (config.get('notifications') or {}).get('queue') or {}
+        with metrics.timer("notify_drain"):
+            notify_queue.drain(float(queue_config.get('drain_timeout', DEFAULT_DRAIN_TIMEOUT)))
+        left = notify_queue.pending_count()
+        if left:
+            logging.info(f"{left} notification(s) still queued; they will be retried next run.")
+        failed = notify_queue.failed_count()
+        if failed:
+            logging.warning(f"{failed} notification(s) failed for good and are kept in the outbox for inspection.")
+        notify_queue.close(timeout=0)
+
+    if journal is not None:
+        journal.finish()
+    if owns_caches:
+        # The queue is already drained; this closes the databases
+        close_caches({name: cache for name, cache in caches.items() if name != 'notify_queue'})
+
+    duration = time.perf_counter() - run_started
+    metrics.observe("run", duration)
+    metrics.incr("runs_total")
+    metrics.incr("assets_checked_total", len(assets))
+    report = metrics.run_report(
+        before, metrics.snapshot(),
+        started_at=time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started_at)),
+        duration_s=round(duration, 3),
+        assets=len(assets),
+        triggered=len(triggered),
+        alerts=len(ready),
+        services=resilience.status()
+    )
+    degraded = {service: s for service, s in report['services'].items() if s['circuit'] != "closed"}
+    if degraded:
+        logging.warning(f"Degraded services at the end of the run: {degraded}")
+    phases = ", ".join(
+        f"{phase} {report['stages'][phase]['total_s']:.2f}s" for phase in metrics.PHASES if phase in report['stages']
+    )
+    logging.info(f"Run took {duration:.2f}s ({phases}).")
+
+    # Cron mode: leave a machine-readable summary of this run
+    report_path = (config.get('metrics') or {}).get('run_report')
+    if owns_caches and report_path:
+        root = os.path.dirname(os.path.dirname(__file__))
+        try:
+            metrics.write_report(report, os.path.join(root, report_path))
+        except OSError as e:
+            logging.error(f"Could not write run report: {e}")
 
     logging.info("Run complete.")
+    return report
 
 if __name__ == "__main__":
     run()
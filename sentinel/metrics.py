@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# Latency histogram buckets in seconds (upper bounds; +Inf is implicit)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Wall time of the pipeline phases of one run; they add up to roughly the run time
+PHASES = ["price", "triggers", "news", "llm", "notify", "notify_drain"]
+
+PREFIX = "sentinel"
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Registry:
+    """
+    Process-wide stage latencies and event counters. Thread-safe; the
+    cumulative values back the Prometheus endpoint, and snapshots taken
+    around a run give the per-run report.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Records the duration of the with-block under `stage`, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        {'stages': {stage: {'count', 'sum'}}, 'counters': {'name{labels}': value}}
+        """
+        with self._lock:
+            return {
+                "stages": {stage: {"count": h.count, "sum": h.sum} for stage, h in self.histograms.items()},
+                "counters": {f"{name}{_label_text(labels)}": value for (name, labels), value in self.counters.items()}
+            }
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            if self.histograms:
+                metric = f"{PREFIX}_stage_seconds"
+                lines += [f"# HELP {metric} Duration of pipeline stages and external calls.",
+                          f"# TYPE {metric} histogram"]
+                for stage, h in sorted(self.histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                metric = f"{PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"{metric}{_label_text(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def observe(stage: str, seconds: float):
+    REGISTRY.observe(stage, seconds)
+
+def timer(stage: str):
+    return REGISTRY.timer(stage)
+
+def incr(name: str, value: float = 1, **labels):
+    REGISTRY.incr(name, value, **labels)
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+def render() -> str:
+    return REGISTRY.render()
+
+def run_report(before: dict, after: dict, **summary) -> dict:
+    """
+    Per-run report: what changed between two snapshots, plus summary fields.
+    Stage entries give the number of timed calls, total and mean seconds.
+    """
+    stages = {}
+    for stage, now in after["stages"].items():
+        was = before["stages"].get(stage, {"count": 0, "sum": 0.0})
+        count = now["count"] - was["count"]
+        if count:
+            total = now["sum"] - was["sum"]
+            stages[stage] = {"count": count, "total_s": round(total, 3), "mean_s": round(total / count, 3)}
+
+    counters = {
+        key: round(value - before["counters"].get(key, 0), 6)
+        for key, value in after["counters"].items()
+        if value != before["counters"].get(key, 0)
+    }
+
+    phases = {phase: stages[phase]["total_s"] for phase in PHASES if phase in stages}
+    report = dict(summary)
+    report.update({
+        "stages": stages,
+        "counters": counters,
+        "slowest_phase": max(phases, key=phases.get) if phases else None
+    })
+    return report
+
+def write_report(report: dict, path: str):
+    # Write-then-rename so a reader never sees a half-written report
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def serve_metrics(port: int, host: str = "127.0.0.1"):
+    """
+    Serves the registry at http://host:port/metrics from a background thread.
+    Returns the server (call shutdown() to stop it).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the log
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{server.server_port}/metrics")
+    return server
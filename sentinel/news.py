@@ -1,53 +1,149 @@
-import feedparser
+import time
 import urllib.parse
 import logging
-from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
+from .dedup import cluster_items, DEFAULT_THRESHOLD
+from . import providers, metrics, resilience
 
-def similar(a, b):
-    return SequenceMatcher(None, a, b).ratio()
+# Raw items read from each feed, and clusters handed to the classifier
+DEFAULT_MAX_ITEMS = 200
+DEFAULT_MAX_UNIQUE = 8
+DEFAULT_SIMILARITY = DEFAULT_THRESHOLD
+# Oldest cached feed served (marked 'stale') when the live fetch fails
+DEFAULT_MAX_STALE_HOURS = 12
 
-def get_recent_news(query: str, max_items: int = 15) -> list:
+FEED_TIMEOUT = 15
+MAX_PARALLEL_FEEDS = 8
+
+def build_rss_url(query: str) -> str:
+    encoded_query = urllib.parse.quote(query)
+    return f"https://news.google.com/rss/search?q={encoded_query}&hl=en-US&gl=US&ceid=US:en"
+
+def _parse_items(content, max_items: int) -> list:
+    import feedparser
+    feed = feedparser.parse(content)
+    raw_items = []
+
+    for entry in feed.entries[:max_items]:
+        item = {
+            "title": entry.title,
+            "source": entry.source.title if hasattr(entry, 'source') else "Unknown",
+            "published_at": entry.get('published', ''),
+            "summary": entry.summary if hasattr(entry, 'summary') else "",
+            "link": entry.link
+        }
+        raw_items.append(item)
+    return raw_items
+
+def fetch_feed_items(query: str, max_items: int = DEFAULT_MAX_ITEMS, cache=None,
+                     max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> list:
+    """
+    Fetches and parses one Google News RSS feed over the shared keep-alive session.
+    With a cache, the request is conditional (ETag / Last-Modified): an
+    unchanged feed costs one 304 round-trip and no parsing. If the fetch
+    fails, a cached feed confirmed within max_stale_hours is served instead,
+    its items marked 'stale' with their age in 'stale_seconds'.
+    """
+    backend = providers.get("news")
+    if backend is not None:
+        with metrics.timer("news_fetch"):
+            return resilience.call("news", backend, query, max_items)
+
+    url = build_rss_url(query)
+    cache_key = f"feed|{url}"
+    cached = cache.get(cache_key) if cache is not None else None
+
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('modified'):
+            headers['If-Modified-Since'] = cached['modified']
+
+    logging.info(f"Fetching news for query: {query}")
+    # requests/feedparser are only imported once news is actually needed
+    from .http_client import get_session
+    try:
+        with metrics.timer("news_fetch"):
+            response = resilience.call("news", get_session().get, url, headers=headers, timeout=FEED_TIMEOUT)
+        if response.status_code == 304 and cached:
+            logging.info(f"News feed unchanged for query: {query}")
+            metrics.incr("cache_requests_total", cache="feed", result="hit")
+            # Confirmed current: the fallback age counts from now
+            cache.set(cache_key, dict(cached, fetched_at=time.time()))
+            return cached['items'][:max_items]
+        response.raise_for_status()
+    except Exception as e:
+        # Entries cached before fetched_at was recorded have no known age
+        age = time.time() - cached['fetched_at'] if cached and cached.get('fetched_at') else None
+        if age is not None and age <= float(max_stale_hours) * 3600:
+            logging.warning(f"News fetch failed for {query} ({e}); using the cached feed from {age / 3600:.1f}h ago")
+            metrics.incr("api_errors_total", service="news")
+            return [dict(item, stale=True, stale_seconds=round(age)) for item in cached['items'][:max_items]]
+        if cached:
+            logging.warning(f"News fetch failed for {query}; the cached feed is too old to use.")
+        raise
+
+    if cache is not None:
+        metrics.incr("cache_requests_total", cache="feed", result="miss")
+    with metrics.timer("news_parse"):
+        raw_items = _parse_items(response.content, max_items)
+
+    if cache is not None:
+        cache.set(cache_key, {
+            "etag": response.headers.get('ETag'),
+            "modified": response.headers.get('Last-Modified'),
+            "fetched_at": time.time(),
+            "items": raw_items
+        })
+    return raw_items
+
+def fetch_feeds(queries: list, max_items: int = DEFAULT_MAX_ITEMS, cache=None,
+                max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> list:
+    """
+    Fetches several feeds in parallel. Returns one item list per query, in order;
+    a failed feed yields an empty list.
     """
-    Fetches news from Google News RSS.
-    Applies de-duplication to filter out very similar headlines.
+    def fetch(query):
+        try:
+            return fetch_feed_items(query, max_items, cache, max_stale_hours)
+        except Exception as e:
+            logging.error(f"Error fetching news for {query}: {e}")
+            metrics.incr("api_errors_total", service="news")
+            return []
+
+    if len(queries) == 1:
+        return [fetch(queries[0])]
+    with ThreadPoolExecutor(max_workers=min(len(queries), MAX_PARALLEL_FEEDS)) as executor:
+        return list(executor.map(fetch, queries))
+
+def get_recent_news(query, max_items: int = DEFAULT_MAX_ITEMS, max_unique: int = DEFAULT_MAX_UNIQUE,
+                    similarity_threshold: float = DEFAULT_SIMILARITY, cache=None,
+                    max_stale_hours: float = DEFAULT_MAX_STALE_HOURS) -> list:
+    """
+    Fetches news from Google News RSS for one query or a list of queries.
+    Near-duplicate headlines are clustered; each returned item is a cluster
+    representative with a 'cluster_size' (how many outlets ran the story).
     """
+    queries = [query] if isinstance(query, str) else list(query)
     try:
-        logging.info(f"Fetching news for query: {query}")
-        encoded_query = urllib.parse.quote(query)
-        rss_url = f"https://news.google.com/rss/search?q={encoded_query}&hl=en-US&gl=US&ceid=US:en"
-        
-        feed = feedparser.parse(rss_url)
+        # 1. Parse Raw Items from every feed, dropping exact repeats across feeds
         raw_items = []
-        
-        # 1. Parse Raw Items
-        for entry in feed.entries[:max_items]:
-            item = {
-                "title": entry.title,
-                "source": entry.source.title if hasattr(entry, 'source') else "Unknown",
-                "published_at": entry.get('published', ''),
-                "summary": entry.summary if hasattr(entry, 'summary') else "",
-                "link": entry.link
-            }
-            raw_items.append(item)
-            
+        seen_links = set()
+        for feed_items in fetch_feeds(queries, max_items, cache, max_stale_hours):
+            for item in feed_items:
+                if item['link'] in seen_links:
+                    continue
+                seen_links.add(item['link'])
+                raw_items.append(item)
+
         # 2. De-duplication / Clustering
-        # We reject an item if it is > 60% similar to any item already accepted
-        unique_items = []
-        
-        for item in raw_items:
-            is_duplicate = False
-            for unique in unique_items:
-                # Compare Titles
-                similarity = similar(item['title'].lower(), unique['title'].lower())
-                if similarity > 0.6:  # 60% similarity threshold
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_items.append(item)
-                
-        # Return top N unique items (e.g. top 8) to avoid overwhelming context
-        return unique_items[:8]
+        # An item joins a cluster if it is > similarity_threshold similar to its representative
+        with metrics.timer("dedup"):
+            unique_items = cluster_items(raw_items, similarity_threshold)
+
+        # Return top N clusters (e.g. top 8) to avoid overwhelming context
+        return unique_items[:max_unique]
 
     except Exception as e:
         logging.error(f"Error fetching news for {query}: {e}")
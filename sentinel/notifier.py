@@ -1,215 +1,186 @@
 import os
-import requests
 import logging
 import json
-from dotenv import load_dotenv
-
-load_dotenv()
+from .config import load_env
+from . import providers, metrics, flex, resilience
 
 def create_flex_message(report: dict, lang: str):
     """
     Creates a LINE Flex Message JSON object.
     """
-    # Localization Labels
-    if lang == "zh-TW":
-        lbl_risk = "風險警報"
-        lbl_price = "當前價格"
-        lbl_type = "市場類型"
-        lbl_driver = "主要原因"
-        lbl_rec = "建議行動"
-        lbl_news = "焦點新聞"
-    else:
-        lbl_risk = "RISK ALERT"
-        lbl_price = "Current Price"
-        lbl_type = "Market Type"
-        lbl_driver = "Key Driver"
-        lbl_rec = "Action"
-        lbl_news = "Top News"
-
-    # Colors
-    color_header = "#D32F2F" # Red for Alert
-    color_bg = "#FFFFFF"
-    
-    asset = report.get('asset', 'Unknown')
-    trigger = report.get('trigger_level', '')
-    price = str(report.get('price_data', {}).get('current_price'))
-    chg1 = report.get('price_data', {}).get('change_1d')
-    chg3 = report.get('price_data', {}).get('change_3d')
-    news_type = report.get('news_type', '').upper()
-    driver = report.get('key_driver', '')
-    rec = report.get('recommended_action', '')
-    
-    # Format Price Change String
-    price_change_str = f"1D: {chg1}% | 3D: {chg3}%"
-    
-    # News Section - Show up to 3 items
-    news_components = []
-    if report.get('news_used'):
-        news_components.append({
-            "type": "text",
-            "text": lbl_news,
-            "weight": "bold",
-            "size": "sm",
-            "margin": "lg",
-            "color": "#555555"
-        })
-        
-        # Limit to top 3 news items
-        for news in report['news_used'][:3]:
-            # Fallback URL if 'link' is missing, though news.py provides it
-            url = news.get('link', 'https://news.google.com')
-            source = news.get('source', '')
-            
-            news_components.append({
-                "type": "text",
-                "text": f"• {news['title']} ({source})",
-                "size": "xs",
-                "color": "#0066cc", # Blue to indicate link
-                "wrap": True,
-                "margin": "sm",
-                "action": {
-                    "type": "uri",
-                    "label": "Read",
-                    "uri": url
-                }
-            })
-
-    flex_json = {
-        "type": "bubble",
-        "header": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {
-                    "type": "text",
-                    "text": f"{asset} {lbl_risk} ({trigger})",
-                    "weight": "bold",
-                    "color": "#FFFFFF",
-                    "size": "lg"
-                }
-            ],
-            "backgroundColor": color_header
-        },
-        "body": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                # Price Section
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "margin": "md",
-                    "contents": [
-                        {
-                            "type": "text",
-                            "text": lbl_price,
-                            "size": "xs",
-                            "color": "#aaaaaa"
-                        },
-                        {
-                            "type": "text",
-                            "text": f"{price} ({price_change_str})",
-                            "weight": "bold",
-                            "size": "md"
-                        }
-                    ]
-                },
-                {
-                    "type": "separator",
-                    "margin": "lg"
-                },
-                # Type & Driver
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "margin": "lg",
-                    "contents": [
-                        {
-                            "type": "text",
-                            "text": f"{lbl_type}: {news_type}",
-                            "size": "sm",
-                            "weight": "bold",
-                            "color": "#333333"
-                        },
-                        {
-                            "type": "text",
-                            "text": driver,
-                            "size": "xs",
-                            "color": "#666666",
-                            "wrap": True,
-                            "margin": "xs"
-                        }
-                    ]
-                },
-                # Recommendation (Highlighted)
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "margin": "lg",
-                    "backgroundColor": "#F5F5F5",
-                    "cornerRadius": "md",
-                    "paddingAll": "md",
-                    "contents": [
-                        {
-                            "type": "text",
-                            "text": lbl_rec,
-                            "size": "xs",
-                            "color": "#aaaaaa"
-                        },
-                        {
-                            "type": "text",
-                            "text": rec,
-                            "size": "sm",
-                            "weight": "bold",
-                            "color": "#009688",
-                            "wrap": True
-                        }
-                    ]
-                },
-                # News Section
-                *news_components
-            ]
-        }
-    }
-    return flex_json
+    return flex.bubble_dict(report, lang)
+
+LINE_PUSH_URL = "https://api.line.me/v2/bot/message/push"
+LINE_MULTICAST_URL = "https://api.line.me/v2/bot/message/multicast"
 
-def send_line_notification(report: dict):
+# LINE allows at most 12 bubbles per carousel
+MAX_CAROUSEL_BUBBLES = 12
+
+# LINE accepts at most 500 user IDs per multicast
+MAX_MULTICAST_RECIPIENTS = 500
+
+PUSH_TIMEOUT = 15
+
+def get_channel_token():
     """
-    Sends a formatted Flex Message to LINE.
+    Returns the channel access token, or None if it is not configured.
     """
+    load_env()
     channel_token = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
+    if not channel_token or channel_token.startswith("your_"):
+        return None
+    return channel_token
+
+def get_credentials():
+    """
+    Returns (channel_token, user_id), or (None, None) if they are not configured.
+    """
+    channel_token = get_channel_token()
     user_id = os.getenv("LINE_USER_ID")
-    lang = os.getenv("LANGUAGE", "en")
-    
-    if not channel_token or channel_token.startswith("your_") or not user_id or user_id.startswith("your_"):
-        logging.warning("LINE Messaging API Credentials not set. Notification skipped.")
-        return
-
-    api_url = "https://api.line.me/v2/bot/message/push"
-    
-    flex_content = create_flex_message(report, lang)
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {channel_token}"
+    if not channel_token or not user_id or user_id.startswith("your_"):
+        return None, None
+    return channel_token, user_id
+
+def default_audience() -> dict:
+    """
+    {language: [user IDs]} without a subscriber registry: LINE_USER_ID in
+    LANGUAGE, or {} if not configured.
+    """
+    _, user_id = get_credentials()
+    return {os.getenv("LANGUAGE", "en"): [user_id]} if user_id else {}
+
+def create_carousel_message(reports: list, lang: str) -> dict:
+    """
+    Creates one LINE Flex carousel with a bubble per report.
+    """
+    return {
+        "type": "carousel",
+        "contents": [create_flex_message(report, lang) for report in reports[:MAX_CAROUSEL_BUBBLES]]
     }
-    
-    payload = {
-        "to": user_id,
+
+def alt_text(reports: list) -> str:
+    if len(reports) == 1:
+        text = f"🚨 {reports[0].get('asset')} Risk Alert"
+    else:
+        text = f"🚨 Risk Alert: {', '.join(str(r.get('asset')) for r in reports[:MAX_CAROUSEL_BUBBLES])}"
+    # LINE limits altText to 400 characters
+    return text[:400]
+
+def build_push_payload(reports: list, to, lang: str) -> dict:
+    """
+    Push payload for one or more reports: a single bubble, or a carousel for several.
+    `to` is a user ID, or a list of user IDs for a multicast.
+    """
+    if len(reports) == 1:
+        contents = create_flex_message(reports[0], lang)
+    else:
+        contents = create_carousel_message(reports, lang)
+
+    return {
+        "to": to,
         "messages": [
             {
                 "type": "flex",
-                "altText": f"🚨 {report.get('asset')} Risk Alert",
-                "contents": flex_content
+                "altText": alt_text(reports),
+                "contents": contents
             }
         ]
     }
 
+def render_message(reports: list, lang: str) -> str:
+    """
+    JSON text of the flex message for one or more reports, from the
+    precompiled templates. It does not depend on the recipients.
+    """
+    if len(reports) == 1:
+        contents = flex.render_bubble(reports[0], lang)
+    else:
+        contents = flex.render_carousel(reports[:MAX_CAROUSEL_BUBBLES], lang)
+    return f'{{"type":"flex","altText":{json.dumps(alt_text(reports), ensure_ascii=False)},"contents":{contents}}}'
+
+def build_push_body(reports: list, to, lang: str, message: str = None) -> bytes:
+    """
+    The same push as build_push_payload, rendered straight to the JSON request
+    body. A message from render_message can be passed in to reuse it.
+    """
+    message = message or render_message(reports, lang)
+    return f'{{"to":{json.dumps(to)},"messages":[{message}]}}'.encode("utf-8")
+
+def push_message(payload, channel_token: str, multicast: bool = False):
+    """
+    POSTs a push payload (a dict, or a body from build_push_body) over the
+    shared keep-alive session, to the multicast endpoint when `multicast`.
+    Returns the response.
+    """
+    backend = providers.get("line")
     try:
-        response = requests.post(api_url, headers=headers, json=payload)
-        if response.status_code == 200:
-            logging.info("LINE Notification sent successfully (Flex Message).")
-        else:
-            logging.error(f"Failed to send LINE notification: {response.status_code} {response.text}")
-    except Exception as e:
-        logging.error(f"Error sending notification: {e}")
+        with metrics.timer("line_push"):
+            if backend is not None:
+                response = resilience.call("line", backend, payload, channel_token)
+            else:
+                from .http_client import get_session
+                headers = {
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {channel_token}"
+                }
+                # Pre-rendered bodies go out as they are
+                body = {"data": payload} if isinstance(payload, bytes) else {"json": payload}
+                url = LINE_MULTICAST_URL if multicast else LINE_PUSH_URL
+                response = resilience.call(
+                    "line", get_session().post, url, headers=headers, timeout=PUSH_TIMEOUT, **body
+                )
+    except Exception:
+        metrics.incr("api_errors_total", service="line", status="network")
+        raise
+    if response.status_code != 200:
+        metrics.incr("api_errors_total", service="line", status=response.status_code)
+    return response
+
+def deliver(reports: list, recipients: list, lang: str, channel_token: str) -> list:
+    """
+    Sends the reports to every recipient in `lang`: a push for a single user,
+    multicasts of up to MAX_MULTICAST_RECIPIENTS users otherwise. The message
+    is rendered once for all of them.
+    Returns [(recipients, response)]; response is None after a network error.
+    """
+    message = render_message(reports, lang)
+    sent = []
+    for i in range(0, len(recipients), MAX_MULTICAST_RECIPIENTS):
+        chunk = recipients[i:i + MAX_MULTICAST_RECIPIENTS]
+        multicast = len(chunk) > 1
+        body = build_push_body(reports, chunk if multicast else chunk[0], lang, message)
+        try:
+            response = push_message(body, channel_token, multicast=multicast)
+        except Exception as e:
+            logging.error(f"Error sending notification: {e}")
+            response = None
+        sent.append((chunk, response))
+    return sent
+
+def send_line_notification(report: dict, audience: dict = None):
+    """
+    Sends a formatted Flex Message to LINE, to `audience` ({language: [user IDs]},
+    see subscribers) or by default to LINE_USER_ID.
+    Returns True if delivered, False if delivery failed, None if skipped (no credentials).
+    """
+    channel_token = get_channel_token()
+    audience = default_audience() if audience is None else audience
+
+    if not channel_token or not audience:
+        logging.warning("LINE Messaging API Credentials not set. Notification skipped.")
+        return None
+
+    delivered = True
+    for lang, recipients in audience.items():
+        for chunk, response in deliver([report], recipients, lang, channel_token):
+            if response is None:
+                delivered = False
+            elif response.status_code == 200:
+                metrics.incr("notifications_sent_total", len(chunk))
+            else:
+                logging.error(f"Failed to send LINE notification: {response.status_code} {response.text}")
+                delivered = False
+
+    if delivered:
+        logging.info("LINE Notification sent successfully (Flex Message).")
+    return delivered
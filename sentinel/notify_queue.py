@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from . import notifier, metrics
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BACKOFF_SECONDS = 5
+DEFAULT_MAX_BACKOFF_SECONDS = 600
+DEFAULT_LINGER_SECONDS = 2
+DEFAULT_DRAIN_TIMEOUT = 60
+# Failed alerts are kept this long for inspection, then deleted
+DEFAULT_FAILED_RETENTION_HOURS = 72
+
+# Longest the worker sleeps between checks for due messages
+IDLE_POLL_SECONDS = 60
+
+class NotificationQueue:
+    """
+    Durable outbox for LINE alerts, stored in SQLite so queued alerts survive a
+    restart. A background worker coalesces due alerts into one carousel push
+    (up to 12 bubbles), retries failures with exponential backoff and pauses
+    the whole queue when LINE answers 429. Alerts that fail for good are
+    kept for failed_retention_hours, then deleted.
+
+    Each row holds one report for one language and its recipients, so alerts
+    for the same audience share a carousel, which is multicast to all of them.
+    """
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+                 linger_seconds: float = DEFAULT_LINGER_SECONDS,
+                 failed_retention_hours: float = DEFAULT_FAILED_RETENTION_HOURS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.linger_seconds = linger_seconds
+        self.failed_retention_hours = failed_retention_hours
+        self.batch_size = notifier.MAX_CAROUSEL_BUBBLES
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " report TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " recipients TEXT,"
+            " lang TEXT,"
+            " failed_at REAL)"
+        )
+        # Outboxes from before subscribers lack the audience columns; their
+        # rows keep NULL and go to LINE_USER_ID. Failed rows from before
+        # failed_at are aged from created_at.
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        for column, kind in (("recipients", "TEXT"), ("lang", "TEXT"), ("failed_at", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+        self._db.commit()
+
+    # -- producer side ---------------------------------------------------
+
+    def enqueue(self, report: dict, audience: dict = None):
+        """
+        Queues a report for delivery to `audience` ({language: [user IDs]}, see
+        subscribers), by default LINE_USER_ID. Returns True, or None (and
+        queues nothing) when LINE credentials are not configured: skipped,
+        as with notifier.send_line_notification, not failed.
+        """
+        channel_token = notifier.get_channel_token()
+        audience = notifier.default_audience() if audience is None else audience
+        if not channel_token or not audience:
+            logging.warning("LINE Messaging API Credentials not set. Notification skipped.")
+            return None
+
+        now = time.time()
+        body = json.dumps(report, ensure_ascii=False)
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO outbox (report, created_at, next_attempt_at, recipients, lang) VALUES (?, ?, ?, ?, ?)",
+                [(body, now, now, json.dumps(recipients), lang) for lang, recipients in audience.items()]
+            )
+            self._db.commit()
+        self._wake.set()
+        return True
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def failed_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'failed'").fetchone()[0]
+
+    def purge_failed(self, now: float = None) -> int:
+        """Deletes failed alerts older than failed_retention_hours. Returns how many."""
+        cutoff = (now or time.time()) - self.failed_retention_hours * 3600
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM outbox WHERE status = 'failed' AND COALESCE(failed_at, created_at) < ?", (cutoff,)
+            ).rowcount
+            self._db.commit()
+        if deleted:
+            logging.info(f"Deleted {deleted} failed notification(s) older than {self.failed_retention_hours:g}h.")
+        return deleted
+
+    # -- delivery --------------------------------------------------------
+
+    def _due(self, now: float) -> list:
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, report, attempts, recipients, lang FROM outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, self.batch_size)
+            ).fetchall()
+
+    def _next_attempt_at(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    def _delete(self, ids: list):
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def _retry_later(self, rows: list, now: float):
+        with self._lock:
+            for row_id, _, attempts, *_ in rows:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logging.error(f"Giving up on queued notification {row_id} after {attempts} attempts.")
+                    self._db.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, failed_at = ? WHERE id = ?",
+                        (attempts, now, row_id)
+                    )
+                    metrics.incr("notifications_failed_total")
+                    continue
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+                self._db.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, now + delay, row_id)
+                )
+            self._db.commit()
+
+    def _pause(self, until: float):
+        # 429 applies to the channel, not to a message: hold back everything
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET next_attempt_at = MAX(next_attempt_at, ?) WHERE status = 'pending'", (until,)
+            )
+            self._db.commit()
+
+    def _fail(self, rows: list, now: float):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET status = 'failed', failed_at = ? WHERE id = ?", [(now, r[0]) for r in rows]
+            )
+            self._db.commit()
+        metrics.incr("notifications_failed_total", len(rows))
+
+    def _set_audience(self, rows: list, lang: str, recipients: list):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET recipients = ?, lang = ? WHERE id = ?",
+                [(json.dumps(recipients), lang, r[0]) for r in rows]
+            )
+            self._db.commit()
+
+    def _audiences(self, rows: list) -> list:
+        """
+        [(lang, recipients, rows)]: due rows grouped by identical audience,
+        in queue order. Rows without an audience go to LINE_USER_ID.
+        """
+        groups = {}
+        default = None
+        for row in rows:
+            recipients, lang = row[3], row[4]
+            if recipients is None:
+                if default is None:
+                    default = next(iter(notifier.default_audience().items()), (None, []))
+                lang, recipients = default
+            else:
+                recipients = json.loads(recipients)
+            groups.setdefault((lang, tuple(recipients)), []).append(row)
+        return [(lang, list(recipients), group) for (lang, recipients), group in groups.items()]
+
+    def deliver_due(self) -> int:
+        """
+        Sends the due alerts as one carousel per audience. Returns the number
+        of alerts delivered to at least one recipient.
+        """
+        now = time.time()
+        rows = self._due(now)
+        if not rows:
+            return 0
+
+        channel_token = notifier.get_channel_token()
+        if not channel_token:
+            logging.warning("LINE Messaging API Credentials not set. Queued notifications kept.")
+            self._pause(now + IDLE_POLL_SECONDS)
+            return 0
+
+        delivered_rows = 0
+        paused_until = None
+        for lang, recipients, group in self._audiences(rows):
+            if not recipients:
+                logging.warning("No LINE recipient for queued notifications; kept.")
+                self._retry_later(group, now)
+                continue
+
+            reports = [json.loads(row[1]) for row in group]
+            delivered, retry = [], []
+            for chunk, response in notifier.deliver(reports, recipients, lang, channel_token):
+                if response is None:
+                    retry += chunk
+                elif response.status_code == 200:
+                    delivered += chunk
+                elif response.status_code == 429:
+                    try:
+                        retry_after = float(response.headers.get('Retry-After', self.backoff_seconds))
+                    except ValueError:
+                        retry_after = self.backoff_seconds
+                    paused_until = max(paused_until or 0, now + retry_after)
+                    retry += chunk
+                else:
+                    logging.error(f"Failed to send LINE notification: {response.status_code} {response.text}")
+                    # A 4xx other than 429 will not succeed on retry
+                    if response.status_code >= 500:
+                        retry += chunk
+
+            if delivered:
+                delivered_rows += len(group)
+                logging.info(f"LINE Notification sent successfully ({len(group)} alert(s) to "
+                             f"{len(delivered)} recipient(s) in {lang}).")
+                metrics.incr("notifications_sent_total", len(group) * len(delivered))
+            if retry:
+                self._set_audience(group, lang, retry)
+                if paused_until is None:
+                    self._retry_later(group, now)
+            elif delivered:
+                self._delete([row[0] for row in group])
+            else:
+                self._fail(group, now)
+
+        if paused_until is not None:
+            logging.warning(f"LINE rate limit hit; pausing notifications for {paused_until - now:.0f}s.")
+            self._pause(paused_until)
+        return delivered_rows
+
+    # -- worker ----------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            next_at = self._next_attempt_at()
+            if next_at is None:
+                timeout = IDLE_POLL_SECONDS
+            else:
+                timeout = min(IDLE_POLL_SECONDS, max(0.0, next_at - time.time()))
+
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            # Give the rest of the run's alerts a moment to join the same carousel
+            if self.linger_seconds:
+                self._stop.wait(self.linger_seconds)
+
+            try:
+                self.purge_failed()
+                while self.deliver_due():
+                    pass
+            except Exception as e:
+                logging.error(f"Notification worker error: {e}")
+
+    def start(self):
+        """Starts the background delivery worker (also resumes leftovers from earlier runs)."""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="notify-queue", daemon=True)
+            self._worker.start()
+            self._wake.set()
+
+    def drain(self, timeout: float = DEFAULT_DRAIN_TIMEOUT) -> bool:
+        """
+        Waits until everything deliverable within `timeout` has been sent.
+        Alerts still backing off stay queued for the next run. Returns True if
+        nothing is left pending.
+        """
+        deadline = time.time() + timeout
+        self._wake.set()
+        while time.time() < deadline:
+            next_at = self._next_attempt_at()
+            if next_at is None:
+                return True
+            if next_at > deadline:
+                break
+            self._wake.set()
+            time.sleep(0.1)
+        return self.pending_count() == 0
+
+    def close(self, timeout: float = DEFAULT_DRAIN_TIMEOUT):
+        """Drains within `timeout`, stops the worker and closes the database."""
+        if self._worker is not None:
+            self.drain(timeout)
+            self._stop.set()
+            self._wake.set()
+            self._worker.join(timeout=notifier.PUSH_TIMEOUT + 1)
+            self._worker = None
+        with self._lock:
+            self._db.close()
+
+def open_notify_queue(queue_config: dict):
+    """
+    Builds and starts the NotificationQueue from the 'notifications.queue'
+    config section, or returns None when disabled.
+    """
+    queue_config = queue_config or {}
+    if not queue_config.get('enabled'):
+        return None
+    root = os.path.dirname(os.path.dirname(__file__))
+    queue = NotificationQueue(
+        os.path.join(root, queue_config.get('path', 'data/outbox.sqlite')),
+        max_attempts=int(queue_config.get('max_attempts', DEFAULT_MAX_ATTEMPTS)),
+        backoff_seconds=float(queue_config.get('backoff_seconds', DEFAULT_BACKOFF_SECONDS)),
+        max_backoff_seconds=float(queue_config.get('max_backoff_seconds', DEFAULT_MAX_BACKOFF_SECONDS)),
+        linger_seconds=float(queue_config.get('linger_seconds', DEFAULT_LINGER_SECONDS)),
+        failed_retention_hours=float(queue_config.get('failed_retention_hours', DEFAULT_FAILED_RETENTION_HOURS))
+    )
+    queue.start()
+    return queue
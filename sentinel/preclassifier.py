@@ -0,0 +1,175 @@
+import re
+
+# Lexicon: (pattern, weight). A headline counts once per class, with the
+# weight of its strongest match.
+EMOTIONAL_PATTERNS = [
+    (r"\bpanic(?:ked|ky)?(?: selling)?\b", 3),
+    (r"\bprofit[- ]taking\b", 3),
+    (r"\bcapitulat\w*", 3),
+    (r"\bmargin calls?\b", 3),
+    (r"\b(?:forced )?liquidations?\b", 2),
+    (r"\bknee[- ]jerk\b", 3),
+    (r"\boverreact\w*", 3),
+    (r"\b(?:selloff|sell-off) (?:is |looks )?overdone\b|\boverdone\b", 3),
+    (r"\boversold\b", 2),
+    (r"\bjitters\b|\bjittery\b|\bnervous\w*", 2),
+    (r"\bfears?\b|\bfearful\b", 1),
+    (r"\brisk[- ]off\b", 2),
+    (r"\bflight to safety\b", 2),
+    (r"\brush(?:es)? for the exits?\b|\bstampede\b", 3),
+    (r"\bstop[- ]loss\w*", 2),
+    (r"\btechnical (?:selling|correction|breakdown)\b", 2),
+    (r"\bposition(?:ing)? squar\w*|\bcut (?:their )?positions\b|\bunwind\w*", 2),
+    (r"\bspeculat\w*", 1),
+    (r"\bshort[- ]term\b", 1),
+    (r"\bbargain[- ]hunt\w*|\bbuy the dip\b", 2),
+    (r"\bvolatil\w*", 1),
+]
+
+STRUCTURAL_PATTERNS = [
+    (r"\b(?:rate|interest[- ]rates?) hikes?\b|\bfed (?:hikes?|raises|tightens|tightening)\b|\bhawkish\b", 3),
+    (r"\b(?:rate|interest[- ]rates?) cuts?\b|\bdovish\b", 2),
+    (r"\btariffs?\b|\bsanctions?\b|\bexport (?:ban|curbs?|controls?)\b|\bembargo\b", 3),
+    (r"\bdemand (?:slump|slowdown|falls?|drops?|weak\w*|outlook)\b|\bweak(?:er|ening)? demand\b", 3),
+    (r"\bsupply glut\b|\bglut\b|\boversupply\b|\bsurplus\b", 3),
+    (r"\binventor(?:y|ies) (?:build|rise|rises|surge|jump)\w*|\bstockpiles? (?:rise|grow)\w*", 3),
+    (r"\b(?:output|production) (?:boost|increase|hike|cut|curbs?)\w*|\bopec\+?\b", 3),
+    (r"\brecession\b|\bslowdown\b|\bcontraction\b", 2),
+    (r"\b(?:strong(?:er)?|firm(?:er)?|rising) dollar\b|\bdollar (?:strength|rall\w*|jumps?|surges?)\b", 2),
+    (r"\bchina(?:'s|ese)? (?:demand|economy|slowdown|property|stimulus|imports?)\b", 2),
+    (r"\bstimulus\b|\bpolicy shift\b|\bregulat\w*", 2),
+    (r"\bpmi\b|\bgdp\b|\bcpi\b|\binflation data\b|\bjobs report\b|\bpayrolls\b", 2),
+    (r"\b(?:treasury |bond )?yields? (?:rise|rises|jump|jumps|climb|climbs|surge|surges)\b", 2),
+    (r"\bmine (?:closure|restart|strike)\b|\bstrike\w* at\b|\bsupply disruption\w*", 2),
+    (r"\bdefault\w*\b|\bbankrupt\w*", 2),
+]
+
+# Direction cues for structural news; price triggers are drops, so bearish is the default
+BULLISH_PATTERNS = [
+    r"\brate cuts?\b", r"\bdovish\b", r"\bstimulus\b", r"\bshortage\b", r"\bdeficit\b",
+    r"\bsupply disruption\w*", r"\boutput cuts?\b|\bproduction cuts?\b", r"\brebound\w*", r"\brally\b"
+]
+
+def _compile(patterns):
+    return [(re.compile(p, re.I), weight) for p, weight in patterns]
+
+_EMOTIONAL = _compile(EMOTIONAL_PATTERNS)
+_STRUCTURAL = _compile(STRUCTURAL_PATTERNS)
+_BULLISH = re.compile("|".join(BULLISH_PATTERNS), re.I)
+
+DEFAULT_MIN_SCORE = 6.0
+DEFAULT_MIN_RATIO = 3.0
+DEFAULT_MIN_SHARE = 0.4
+# A story's weight grows with its coverage, up to this many outlets
+MAX_COVERAGE = 5
+
+TEXTS = {
+    "en": {
+        "emotional": "Headlines are dominated by sentiment-driven selling ({terms})",
+        "structural": "Headlines point to fundamental drivers ({terms})",
+        "action": "Wait and monitor"
+    },
+    "zh-TW": {
+        "emotional": "新聞以情緒性賣壓為主（{terms}）",
+        "structural": "新聞指向基本面因素（{terms}）",
+        "action": "觀望為宜，持續監控"
+    }
+}
+
+def _best_match(title: str, lexicon: list) -> tuple:
+    # (weight, matched text) of the strongest pattern in the title
+    best = (0, None)
+    for pattern, weight in lexicon:
+        if weight > best[0]:
+            match = pattern.search(title)
+            if match:
+                best = (weight, match.group(0).lower())
+    return best
+
+def score_headlines(news_items: list) -> dict:
+    """
+    Coverage-weighted lexicon scores of a headline set:
+    {'emotional', 'structural', 'total', 'matches': {class: [(weight, term, item)]}}
+    """
+    scores = {"emotional": 0.0, "structural": 0.0, "total": 0.0}
+    matches = {"emotional": [], "structural": []}
+    for item in news_items:
+        coverage = min(int(item.get('cluster_size', 1) or 1), MAX_COVERAGE)
+        scores["total"] += coverage
+        title = item.get('title', '')
+        for news_type, lexicon in (("emotional", _EMOTIONAL), ("structural", _STRUCTURAL)):
+            weight, term = _best_match(title, lexicon)
+            if weight:
+                scores[news_type] += weight * coverage
+                matches[news_type].append((weight * coverage, term, item))
+    scores["matches"] = matches
+    return scores
+
+def decide(scores: dict, min_score: float = DEFAULT_MIN_SCORE, min_ratio: float = DEFAULT_MIN_RATIO,
+           min_share: float = DEFAULT_MIN_SHARE) -> str:
+    """
+    'emotional' or 'structural' when one class clearly dominates the
+    headlines, else None (not confident; ask the LLM).
+    """
+    winner, loser = ("emotional", "structural") if scores["emotional"] >= scores["structural"] else ("structural", "emotional")
+    if scores[winner] < min_score or scores[winner] < min_ratio * scores[loser]:
+        return None
+    # Share of the coverage that actually matched the winning class
+    matched = sum(min(int(item.get('cluster_size', 1) or 1), MAX_COVERAGE) for _, _, item in scores["matches"][winner])
+    if not scores["total"] or matched / scores["total"] < min_share:
+        return None
+    return winner
+
+def preclassify(asset: str, trigger_level: str, news_items: list, target_lang: str = "en",
+                settings: dict = None, extra_langs: tuple = ()) -> dict:
+    """
+    Classifies clear-cut headline sets locally. Returns a result in the LLM
+    output schema (before postprocess) with confidence 'high', or None when
+    the headlines are not clear enough. extra_langs get 'translations' of
+    the texts, as the LLM would write them.
+    """
+    settings = settings or {}
+    scores = score_headlines(news_items)
+    news_type = decide(
+        scores,
+        min_score=float(settings.get('min_score', DEFAULT_MIN_SCORE)),
+        min_ratio=float(settings.get('min_ratio', DEFAULT_MIN_RATIO)),
+        min_share=float(settings.get('min_share', DEFAULT_MIN_SHARE))
+    )
+    if news_type is None:
+        return None
+
+    matched = sorted(scores["matches"][news_type], key=lambda m: -m[0])
+    terms = []
+    for _, term, _ in matched:
+        if term not in terms:
+            terms.append(term)
+    titles = " ".join(item.get('title', '') for _, _, item in matched)
+    direction = "bullish" if news_type == "structural" and _BULLISH.search(titles) else "bearish"
+
+    def localized(lang):
+        texts = TEXTS.get(lang, TEXTS["en"])
+        return {
+            "key_driver": texts[news_type].format(terms=", ".join(terms[:3])),
+            "recommended_action": texts["action"]
+        }
+
+    result = {
+        "asset": asset,
+        "trigger_level": trigger_level,
+        "news_type": news_type,
+        "direction": direction,
+        "confidence": "high",
+        **localized(target_lang),
+        "supporting_points": [item.get('title', '') for _, _, item in matched[:3]],
+        "news_used": [
+            {"title": item.get('title', ''), "source": item.get('source', ''), "published_at": item.get('published_at', '')}
+            for _, _, item in matched[:3]
+        ],
+        "classified_by": "lexicon"
+    }
+    if extra_langs:
+        result["translations"] = {
+            lang: dict(localized(lang), supporting_points=result["supporting_points"]) for lang in extra_langs
+        }
+    return result
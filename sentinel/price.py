@@ -1,68 +1,296 @@
-import yfinance as yf
+import numpy as np
 import logging
-import yaml
 import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from .triggers import TriggerEngine
+from .groups import GroupEngine, describe, index_market_data
+from .store import PriceStore, to_day, from_day
+from .config import load_config
+from . import providers, metrics, resilience
 
-# Load Config
-def load_config():
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+# Config and thresholds are loaded on first use, not at import
+_CONFIG = None
+_TRIGGERS = None
+_GROUPS = None
 
-CONFIG = load_config()
+def get_config() -> dict:
+    global _CONFIG
+    if _CONFIG is None:
+        _CONFIG = load_config()
+    return _CONFIG
 
-def get_market_data(ticker_symbol: str) -> dict:
+def get_triggers() -> TriggerEngine:
+    global _TRIGGERS
+    if _TRIGGERS is None:
+        config = get_config()
+        _TRIGGERS = TriggerEngine(config.get('triggers', {}), config.get('assets', {}))
+    return _TRIGGERS
+
+def get_groups() -> GroupEngine:
+    global _GROUPS
+    if _GROUPS is None:
+        config = get_config()
+        _GROUPS = GroupEngine(config.get('groups'), config.get('triggers', {}), config.get('assets', {}))
+    return _GROUPS
+
+def apply_config(config: dict):
     """
-    Fetches market data for a given ticker.
-    Returns calculated changes or None if failed.
+    Switches thresholds and store settings to the given config (main.run
+    calls it with the config it runs on). The same config object again
+    keeps the compiled engines.
     """
-    try:
-        logging.info(f"Fetching price data for {ticker_symbol}...")
-        ticker = yf.Ticker(ticker_symbol)
-        # Fetch 1 month to ensure enough data points
-        hist = ticker.history(period="1mo")
-        
-        if len(hist) < 4:
-            logging.warning(f"Not enough data for {ticker_symbol}")
+    global _CONFIG, _TRIGGERS, _GROUPS, _STORE
+    if config is _CONFIG:
+        return
+    _CONFIG = config
+    _TRIGGERS = None
+    _GROUPS = None
+    _STORE = None
+
+# Closes the triggers need: today, 1 day ago and 3 days ago
+LOOKBACK_BARS = 4
+# Calendar days requested so LOOKBACK_BARS trading days survive weekends/holidays
+LOOKBACK_CALENDAR_DAYS = 10
+# History backfilled the first time a symbol enters the price store
+DEFAULT_INITIAL_DAYS = 400
+
+@dataclass
+class PriceMatrix:
+    """
+    Columnar closing prices for many symbols.
+    closes[i] holds the last bars of symbols[i], oldest -> newest,
+    left-padded with NaN when fewer bars were available.
+    """
+    symbols: list
+    closes: np.ndarray
+
+    def __post_init__(self):
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def row(self, symbol: str) -> np.ndarray:
+        i = self.index.get(symbol)
+        return None if i is None else self.closes[i]
+
+    def market_data(self, symbol: str) -> dict:
+        """
+        Returns the same dict as get_market_data for one symbol, or None.
+        """
+        row = self.row(symbol)
+        if row is None or len(row) < LOOKBACK_BARS or np.isnan(row[-LOOKBACK_BARS:]).any():
+            logging.warning(f"Not enough data for {symbol}")
             return None
-            
-        current_price = hist['Close'].iloc[-1]
-        price_1d_ago = hist['Close'].iloc[-2]
-        price_3d_ago = hist['Close'].iloc[-4]
-        
+
+        current_price = row[-1]
+        price_1d_ago = row[-2]
+        price_3d_ago = row[-4]
+
         change_1d = ((current_price - price_1d_ago) / price_1d_ago) * 100
         change_3d = ((current_price - price_3d_ago) / price_3d_ago) * 100
-        
+
         return {
-            "symbol": ticker_symbol,
-            "current_price": round(current_price, 2),
-            "change_1d": round(change_1d, 2),
-            "change_3d": round(change_3d, 2)
+            "symbol": symbol,
+            "current_price": round(float(current_price), 2),
+            "change_1d": round(float(change_1d), 2),
+            "change_3d": round(float(change_3d), 2)
         }
+
+class NoPriceData(Exception):
+    """
+    A price download came back empty or all-NaN, which is how yfinance
+    usually reports a failure or throttling.
+    """
+
+def yahoo_download(tickers: list, **kwargs):
+    """
+    yf.download through the prices guard. An empty or all-NaN result raises
+    NoPriceData inside the guard, so it counts as a failed call.
+    """
+    # yfinance pulls in pandas; only pay for it when prices are actually fetched
+    import yfinance as yf
+
+    def fetch():
+        hist = yf.download(tickers, progress=False, **kwargs)
+        if hist is None or hist.empty or hist['Close'].isna().to_numpy().all():
+            raise NoPriceData(f"Yahoo Finance returned no closes for {len(tickers)} tickers")
+        return hist
+    return resilience.call("prices", fetch)
+
+def download_closes(tickers: list, start: str, threads=True, auto_adjust=True) -> tuple:
+    """
+    Downloads daily closes for many tickers in one batched request.
+    Returns (days, closes): bar dates as day numbers and a (tickers x bars)
+    matrix with NaN where a ticker had no bar. Raises on network errors and
+    NoPriceData when no ticker had a bar.
+    """
+    backend = providers.get("prices")
+    if backend is not None:
+        def fetch():
+            days, closes = backend(tickers, start, threads=threads, auto_adjust=auto_adjust)
+            if not len(days) or np.isnan(closes).all():
+                raise NoPriceData(f"no closes for {len(tickers)} tickers")
+            return days, closes
+        with metrics.timer("price_download"):
+            return resilience.call("prices", fetch)
+
+    with metrics.timer("price_download"):
+        hist = yahoo_download(tickers, start=start, interval="1d", auto_adjust=auto_adjust, threads=threads)
+
+    days = np.array(hist.index.date, dtype='datetime64[D]').astype(np.int64)
+    # One column per ticker; missing tickers become NaN columns
+    closes = hist['Close'].reindex(columns=tickers).to_numpy(dtype=float).T
+    return days, closes
+
+def tail_valid(series: np.ndarray, lookback: int) -> np.ndarray:
+    # Holidays differ per exchange, so drop gaps before taking the tail
+    return series[~np.isnan(series)][-lookback:]
+
+def get_market_data_bulk(tickers: list, lookback: int = LOOKBACK_BARS, threads=True, store: PriceStore = None) -> PriceMatrix:
+    """
+    Fetches daily closes for all tickers in batched requests and keeps
+    only the last `lookback` bars per symbol.
+    With a PriceStore, only bars missing since the last run are downloaded.
+    Symbols that fail to download come back as all-NaN rows.
+    """
+    tickers = list(tickers)
+    closes = np.full((len(tickers), lookback), np.nan)
+    if not tickers:
+        return PriceMatrix(tickers, closes)
+
+    if store is not None:
+        return _get_market_data_stored(tickers, lookback, threads, store)
+
+    try:
+        logging.info(f"Fetching price data for {len(tickers)} tickers...")
+        start = (date.today() - timedelta(days=max(LOOKBACK_CALENDAR_DAYS, lookback * 2))).isoformat()
+        _, raw = download_closes(tickers, start, threads=threads)
+        for i, series in enumerate(raw):
+            valid = tail_valid(series, lookback)
+            if len(valid):
+                closes[i, lookback - len(valid):] = valid
     except Exception as e:
-        logging.error(f"Error fetching data for {ticker_symbol}: {e}")
+        logging.error(f"Error fetching batched price data: {e}")
+        metrics.incr("api_errors_total", service="prices")
+
+    return PriceMatrix(tickers, closes)
+
+def _get_market_data_stored(tickers: list, lookback: int, threads, store: PriceStore) -> PriceMatrix:
+    """
+    Incremental fetch through the local price store.
+    Completed bars (before today) are appended to the store; today's bar is
+    still moving, so it is only used in memory. Known tickers re-download
+    the last LOOKBACK_CALENDAR_DAYS, so a bar stored before its session
+    closed (the local date can run ahead of the exchange) and history moved
+    by a dividend adjustment are corrected in the store.
+    """
+    store_config = get_config().get('price_store', {})
+    today = to_day(date.today())
+    initial_start = today - int(store_config.get('initial_days', DEFAULT_INITIAL_DAYS))
+
+    # 1. Group tickers by the first day they are missing
+    new_tickers = []
+    known_tickers = []
+    for ticker in tickers:
+        (known_tickers if store.last_day(ticker) is not None else new_tickers).append(ticker)
+
+    groups = []
+    if new_tickers:
+        groups.append((new_tickers, initial_start))
+    if known_tickers:
+        groups.append((known_tickers, min(store.last_day(t) for t in known_tickers) - LOOKBACK_CALENDAR_DAYS))
+
+    # 2. Download only the missing bars
+    pending = {}
+    for group, start_day in groups:
+        try:
+            logging.info(f"Fetching price data for {len(group)} tickers since {from_day(start_day)}...")
+            # Adjusted like the storeless path; store.append rescales on a new dividend
+            days, raw = download_closes(group, str(from_day(start_day)), threads=threads)
+        except Exception as e:
+            logging.error(f"Error fetching batched price data: {e}. Serving stored history.")
+            metrics.incr("api_errors_total", service="prices")
+            continue
+
+        completed = days < today
+        for ticker, series in zip(group, raw):
+            written = store.append(ticker, days[completed], series[completed])
+            if written:
+                logging.debug(f"Stored {written} new bars for {ticker}")
+            live = series[~completed]
+            pending[ticker] = live[~np.isnan(live)]
+
+    # 3. Stored tail + today's live bar
+    closes = np.full((len(tickers), lookback), np.nan)
+    for i, ticker in enumerate(tickers):
+        live = pending.get(ticker)
+        history = store.window(ticker, lookback)
+        valid = np.concatenate([history, live])[-lookback:] if live is not None and len(live) else history
+        if len(valid):
+            closes[i, lookback - len(valid):] = valid
+
+    return PriceMatrix(tickers, closes)
+
+_STORE = None
+
+def get_store():
+    """
+    Returns the shared PriceStore if 'price_store.enabled' is set, else None.
+    """
+    global _STORE
+    store_config = get_config().get('price_store') or {}
+    if not store_config.get('enabled'):
         return None
+    if _STORE is None:
+        root = os.path.join(os.path.dirname(os.path.dirname(__file__)), store_config.get('path', 'data/prices'))
+        _STORE = PriceStore(root)
+    return _STORE
+
+def get_market_data(ticker_symbol: str) -> dict:
+    """
+    Fetches market data for a given ticker.
+    Returns calculated changes or None if failed.
+    """
+    return get_market_data_bulk([ticker_symbol], store=get_store()).market_data(ticker_symbol)
 
 def check_triggers(data: dict) -> str:
     """
     Checks if price movement triggers alerts based on config.yaml.
     """
-    if not data:
-        return None
-        
-    c1 = data['change_1d']
-    c3 = data['change_3d']
-    
-    triggers = CONFIG.get('triggers', {})
-    l1 = triggers.get('level_1', {})
-    l2 = triggers.get('level_2', {})
-    
-    # Check Level 2 (Severe)
-    if c1 <= l2.get('change_1d', -99) or c3 <= l2.get('change_3d', -99):
-        return 'L2'
-        
-    # Check Level 1 (Warning)
-    elif c1 <= l1.get('change_1d', -99):
-        return 'L1'
-        
-    return None
+    return get_triggers().check(data)
+
+def check_triggers_matrix(matrix: PriceMatrix) -> dict:
+    """
+    Evaluates triggers for every symbol of a PriceMatrix in one vectorized pass.
+    Returns {symbol: 'L1'|'L2'} for the symbols that fired.
+    """
+    levels, _ = get_triggers().evaluate(matrix.symbols, matrix.closes)
+    return {symbol: level for symbol, level in zip(matrix.symbols, levels) if level}
+
+def check_group_triggers(matrix: PriceMatrix, fired: dict) -> list:
+    """
+    Evaluates the asset groups over a PriceMatrix, given the individual
+    triggers from check_triggers_matrix. Returns one dict per group with
+    all members in the matrix: 'key', 'info' (name and news query), 'level'
+    (None when it does not fire), 'members' (the fired members it folds)
+    and 'market_data' (the group index, with the members' market data).
+    """
+    engine = get_groups()
+    results = []
+    for result in engine.evaluate(matrix.symbols, matrix.closes, fired):
+        group = result['group']
+        market_data = index_market_data(group.key, result['closes'])
+        if not market_data:
+            continue
+        members = []
+        for ticker in group.members:
+            data = matrix.market_data(ticker)
+            if data:
+                members.append(dict(data, level=fired.get(ticker)))
+        results.append({
+            "key": group.key,
+            "info": {"name": group.name, "query": group.query},
+            "level": result['level'],
+            "members": result['members'],
+            "market_data": describe(market_data, result['correlation'], members)
+        })
+    return results
@@ -0,0 +1,45 @@
+import logging
+
+# External services the pipeline talks to
+SERVICES = ("prices", "news", "llm", "line")
+
+# service -> installed stand-in; a missing entry means the live service
+_backends = {}
+
+def install(service: str, backend):
+    """
+    Routes a service to a stand-in backend instead of the live API.
+    """
+    if service not in SERVICES:
+        raise ValueError(f"Unknown service '{service}' (expected one of {', '.join(SERVICES)})")
+    _backends[service] = backend
+
+def get(service: str):
+    """
+    Returns the stand-in installed for a service, or None for the live API.
+    """
+    return _backends.get(service)
+
+def reset():
+    """Routes every service back to its live API."""
+    _backends.clear()
+
+def configure(provider_config: dict):
+    """
+    Installs backends from the 'providers' config section, e.g.
+        providers:
+          llm: {backend: fake, latency_ms: 800}
+    Services that are not listed, or set to 'live', use the real API.
+    """
+    reset()
+    for service, spec in (provider_config or {}).items():
+        spec = spec if isinstance(spec, dict) else {"backend": spec}
+        backend = spec.get('backend', 'live')
+        if backend == 'live':
+            continue
+        if backend != 'fake':
+            raise ValueError(f"Unknown backend '{backend}' for service '{service}'")
+        # Only loaded when a stand-in is actually requested
+        from . import fakes
+        install(service, fakes.build(service, spec))
+        logging.info(f"Using offline stand-in for '{service}'")
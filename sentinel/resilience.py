@@ -0,0 +1,296 @@
+import time
+import logging
+import threading
+from . import metrics
+from .providers import SERVICES
+
+# Settings of every service unless the 'resilience' config section overrides them
+DEFAULT_POLICY = {
+    "rate_per_second": None,   # token bucket refill rate; None = no rate limit
+    "burst": None,             # bucket size (default: one second of tokens)
+    "max_concurrency": 8,
+    "min_concurrency": 1,
+    "failure_threshold": 5,    # consecutive failures that open the circuit
+    "reset_seconds": 30,       # open circuit: time before a trial call
+    "acquire_timeout": 30,     # longest wait for a token or a concurrency slot
+    "backoff_seconds": 5       # pause after a 429 without Retry-After
+}
+
+# Per-service defaults, sized for the public APIs' limits
+SERVICE_DEFAULTS = {
+    "prices": {"rate_per_second": 2, "burst": 4, "max_concurrency": 4},
+    "news": {"rate_per_second": 20, "burst": 40, "max_concurrency": 8},
+    "llm": {"rate_per_second": 10, "burst": 20, "max_concurrency": 8},
+    "line": {"rate_per_second": 50, "burst": 100, "max_concurrency": 4}
+}
+
+# Call outcomes
+OK = "ok"
+CLIENT_ERROR = "client_error"  # the service answered; retrying won't help
+FAILED = "failed"              # 5xx, timeout or network error
+THROTTLED = "throttled"        # 429
+
+class ServiceUnavailable(Exception):
+    """Raised instead of calling a service that is failing or saturated."""
+
+class CircuitOpenError(ServiceUnavailable):
+    """Raised while a service's circuit breaker is open."""
+
+def _status_code(obj):
+    # requests/OpenAI errors carry the status on themselves or on .response
+    status = getattr(obj, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(obj, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(obj):
+    headers = getattr(obj, 'headers', None) or getattr(getattr(obj, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def classify(obj, raised: bool) -> str:
+    """
+    Outcome of a call from its result (a response with a status_code, or
+    anything else) or the exception it raised.
+    """
+    status = _status_code(obj)
+    if status == 429 or (raised and "RateLimit" in type(obj).__name__):
+        return THROTTLED
+    if status is not None and status >= 500:
+        return FAILED
+    if status is not None and status >= 400:
+        return CLIENT_ERROR
+    return FAILED if raised else OK
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average and bursts of up to `burst`.
+    pause() empties the bucket until a Retry-After period has passed.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst or rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Takes one token, waiting for it if needed. Returns False right away
+        if it would not be available within `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the service (AIMD): it grows by one
+    slot per `limit` successful calls, up to `maximum`, and halves on a
+    429 or a failure, down to `minimum`.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = max(1, int(maximum))
+        self.minimum = max(1, min(int(minimum), self.maximum))
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: str):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome in (THROTTLED, FAILED):
+                self.limit = max(float(self.minimum), self.limit / 2)
+            elif outcome == OK:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, so calls fail fast
+    instead of waiting out timeouts. After `reset_seconds` one trial call is
+    let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, service: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.service = service
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    return False
+                self.probing = True
+            return True
+
+    def cancel(self):
+        """The allowed call was not made after all."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, success: bool):
+        with self._lock:
+            self.probing = False
+            if success:
+                if self.state != self.CLOSED:
+                    logging.info(f"{self.service} recovered; circuit closed.")
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                logging.warning(f"{self.service} is failing ({self.failures} in a row); circuit open for "
+                                f"{self.reset_seconds:.0f}s.")
+                metrics.incr("circuit_opened_total", service=self.service)
+
+class Guard:
+    """
+    Everything between the pipeline and one external service: circuit
+    breaker, token bucket and adaptive concurrency limit. Failed calls raise
+    as before; calls the guard refuses raise ServiceUnavailable, so every
+    caller's existing error handling (cached feed, stored prices, retry
+    queue, last-known-good classification) applies unchanged.
+    """
+
+    def __init__(self, service: str, rate_per_second: float = None, burst: float = None,
+                 max_concurrency: int = 8, min_concurrency: int = 1, failure_threshold: int = 5,
+                 reset_seconds: float = 30, acquire_timeout: float = 30, backoff_seconds: float = 5):
+        self.service = service
+        self.bucket = TokenBucket(rate_per_second, burst) if rate_per_second else None
+        self.limiter = AdaptiveLimiter(max_concurrency, min_concurrency)
+        self.breaker = CircuitBreaker(service, failure_threshold, reset_seconds)
+        self.acquire_timeout = float(acquire_timeout)
+        self.backoff_seconds = float(backoff_seconds)
+
+    def _reject(self, reason: str, error=ServiceUnavailable):
+        metrics.incr("calls_rejected_total", service=self.service, reason=reason)
+        raise error(f"{self.service} unavailable ({reason})")
+
+    def call(self, fn, *args, **kwargs):
+        if not self.breaker.allow():
+            self._reject("circuit open", CircuitOpenError)
+        if self.bucket is not None and not self.bucket.acquire(self.acquire_timeout):
+            self.breaker.cancel()
+            self._reject("rate limited")
+        if not self.limiter.acquire(self.acquire_timeout):
+            self.breaker.cancel()
+            self._reject("concurrency limit")
+        if self.breaker.state == CircuitBreaker.OPEN:
+            # Opened by other calls while this one waited for a slot
+            self.limiter.release(None)
+            self.breaker.cancel()
+            self._reject("circuit open", CircuitOpenError)
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(classify(e, raised=True), e)
+            raise
+        self._finish(classify(result, raised=False), result)
+        return result
+
+    def _finish(self, outcome: str, obj):
+        self.limiter.release(outcome)
+        self.breaker.record(outcome in (OK, CLIENT_ERROR))
+        if outcome == THROTTLED:
+            pause = _retry_after(obj) or self.backoff_seconds
+            logging.warning(f"{self.service} is throttling; slowing down for {pause:g}s "
+                            f"(concurrency {int(self.limiter.limit)}).")
+            metrics.incr("calls_throttled_total", service=self.service)
+            if self.bucket is not None:
+                self.bucket.pause(pause)
+
+    def status(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "concurrency": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight
+        }
+
+_guards = {}
+_policies = {}
+_enabled = True
+_lock = threading.Lock()
+
+def policy_for(service: str, resilience_config: dict = None) -> dict:
+    policy = dict(DEFAULT_POLICY, **SERVICE_DEFAULTS.get(service, {}))
+    policy.update((resilience_config or {}).get(service) or {})
+    return policy
+
+def configure(resilience_config: dict):
+    """
+    Applies the 'resilience' config section. A service keeps its guard (and
+    so its circuit and learned concurrency) while its settings are unchanged.
+    """
+    global _enabled
+    resilience_config = resilience_config or {}
+    with _lock:
+        _enabled = resilience_config.get('enabled', True)
+        for service in SERVICES:
+            policy = policy_for(service, resilience_config)
+            if _policies.get(service) != policy:
+                _policies[service] = policy
+                _guards[service] = Guard(service, **policy)
+
+def get(service: str) -> Guard:
+    """The guard of a service (with the default settings until configured)."""
+    guard = _guards.get(service)
+    if guard is None:
+        with _lock:
+            guard = _guards.get(service)
+            if guard is None:
+                _policies[service] = policy_for(service)
+                guard = _guards[service] = Guard(service, **_policies[service])
+    return guard
+
+def call(service: str, fn, *args, **kwargs):
+    """Calls fn(*args, **kwargs) through the service's guard."""
+    if not _enabled:
+        return fn(*args, **kwargs)
+    return get(service).call(fn, *args, **kwargs)
+
+def status() -> dict:
+    """{service: {'circuit', 'concurrency', 'in_flight'}} of the guards in use."""
+    return {service: guard.status() for service, guard in sorted(_guards.items())}
@@ -0,0 +1,137 @@
+import os
+import re
+import logging
+import threading
+import numpy as np
+
+# One record per daily bar: day number since 1970-01-01 and the close
+BAR_DTYPE = np.dtype([('day', '<i8'), ('close', '<f8')])
+
+EMPTY_BARS = np.zeros(0, dtype=BAR_DTYPE)
+
+def to_day(value) -> int:
+    """
+    Converts a date/datetime/np.datetime64 to a day number since the epoch.
+    """
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+def from_day(day: int) -> np.datetime64:
+    return np.datetime64(int(day), 'D')
+
+class PriceStore:
+    """
+    On-disk daily close history, one binary file per symbol. New bars are
+    appended; a correction of stored bars rewrites the file. Files are read
+    through read-only memory maps, so lookback windows are zero-copy views
+    of the file pages.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        # Tickers like '^GSPC' or 'BRK/B' must still map to a flat filename
+        safe = re.sub(r'[^A-Za-z0-9._=-]', '_', symbol)
+        return os.path.join(self.root, f"{safe}.bars")
+
+    def bars(self, symbol: str) -> np.ndarray:
+        """
+        All stored bars of a symbol (oldest -> newest) as a read-only memmap.
+        """
+        path = self._path(symbol)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return EMPTY_BARS
+
+        # A crash mid-append may leave a partial record; ignore it
+        count = size // BAR_DTYPE.itemsize
+        if count == 0:
+            return EMPTY_BARS
+
+        cached = self._maps.get(symbol)
+        if cached is not None and len(cached) == count:
+            return cached
+
+        mapped = np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(count,))
+        self._maps[symbol] = mapped
+        return mapped
+
+    def last_day(self, symbol: str):
+        """Day number of the newest stored bar, or None."""
+        bars = self.bars(symbol)
+        return int(bars['day'][-1]) if len(bars) else None
+
+    def window(self, symbol: str, n: int) -> np.ndarray:
+        """Last n closes (zero-copy view)."""
+        return self.bars(symbol)['close'][-n:]
+
+    def append(self, symbol: str, days, closes) -> int:
+        """
+        Appends bars newer than the last stored one. NaN closes are skipped.
+        Bars for days already stored replace them when the close differs: a
+        bar stored before its session closed is corrected, and when the
+        oldest of them moved (adjusted closes after a dividend or split) the
+        older history is rescaled by the same factor.
+        Returns the number of bars written.
+        """
+        days = np.asarray(days, dtype=np.int64)
+        closes = np.asarray(closes, dtype=float)
+
+        with self._lock:
+            last = self.last_day(symbol)
+            keep = ~np.isnan(closes)
+            if last is not None:
+                written = self._correct(symbol, days[keep & (days <= last)], closes[keep & (days <= last)])
+                keep &= days > last
+            else:
+                written = 0
+            if not keep.any():
+                return written
+
+            records = np.empty(int(keep.sum()), dtype=BAR_DTYPE)
+            records['day'] = days[keep]
+            records['close'] = closes[keep]
+            records.sort(order='day')
+
+            path = self._path(symbol)
+            with open(path, 'ab') as f:
+                # Drop a torn trailing record before appending
+                f.truncate((os.path.getsize(path) // BAR_DTYPE.itemsize) * BAR_DTYPE.itemsize)
+                records.tofile(f)
+
+            self._maps.pop(symbol, None)
+            return written + len(records)
+
+    def _correct(self, symbol: str, days: np.ndarray, closes: np.ndarray) -> int:
+        # Rewrites the stored bars whose close changed; returns how many
+        stored = self.bars(symbol)
+        order = np.argsort(days)
+        days, closes = days[order], closes[order]
+        idx = np.searchsorted(stored['day'], days)
+        found = idx < len(stored)
+        found[found] = stored['day'][idx[found]] == days[found]
+        idx, closes = idx[found], closes[found]
+        changed = ~np.isclose(stored['close'][idx], closes, rtol=1e-6, atol=0)
+        if not changed.any():
+            return 0
+
+        bars = np.array(stored)
+        # A single re-downloaded bar cannot tell a correction from an adjustment
+        rescale = len(idx) > 1 and changed[0]
+        if rescale:
+            bars['close'][:idx[0]] *= closes[0] / bars['close'][idx[0]]
+        bars['close'][idx] = closes
+
+        # Write-then-rename so a crash never leaves a half-written history
+        path = self._path(symbol)
+        tmp = f"{path}.tmp"
+        bars.tofile(tmp)
+        os.replace(tmp, path)
+        self._maps.pop(symbol, None)
+        logging.info(f"Corrected {int(changed.sum())} stored bars of {symbol}"
+                     f"{' and rescaled its older history' if rescale else ''}.")
+        return int(changed.sum())
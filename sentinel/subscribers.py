@@ -0,0 +1,79 @@
+import os
+import logging
+
+DEFAULT_LANGUAGE = "en"
+
+class SubscriberRegistry:
+    """
+    Who receives which alerts, in which language (the 'subscribers' config
+    section). Each subscriber has a LINE user ID, a language and a watchlist
+    of asset tickers (every asset when omitted).
+
+    Assets are fetched and classified once per run no matter how many
+    subscribers watch them; the registry tells the pipeline which languages
+    a classification must be written in and whom to deliver it to.
+    """
+
+    def __init__(self, subscribers: list, assets: dict, default_language: str = DEFAULT_LANGUAGE):
+        self.default_language = default_language
+        # ticker -> {language: [user IDs]}
+        self.audiences = {}
+        for subscriber in subscribers or []:
+            user_id = subscriber.get('id')
+            name = subscriber.get('name', user_id)
+            if not user_id:
+                logging.warning(f"Subscriber {name!r} has no LINE user ID; ignored.")
+                continue
+            language = subscriber.get('language', default_language)
+            watchlist = subscriber.get('assets')
+            for ticker in (assets if watchlist is None else watchlist):
+                if ticker not in assets:
+                    logging.warning(f"Subscriber {name!r} watches unknown asset {ticker}; ignored.")
+                    continue
+                recipients = self.audiences.setdefault(ticker, {}).setdefault(language, [])
+                if user_id not in recipients:
+                    recipients.append(user_id)
+
+    def watched(self, assets: dict) -> dict:
+        """The assets at least one subscriber watches."""
+        return {ticker: info for ticker, info in assets.items() if ticker in self.audiences}
+
+    def audience(self, ticker: str) -> dict:
+        """{language: [user IDs]} of the subscribers watching an asset."""
+        return self.audiences.get(ticker, {})
+
+    def languages(self, ticker: str) -> list:
+        """
+        Languages an asset's classification is needed in; the default
+        language comes first when someone reads it.
+        """
+        languages = sorted(self.audiences.get(ticker, {}))
+        if self.default_language in languages:
+            languages.remove(self.default_language)
+            languages.insert(0, self.default_language)
+        return languages or [self.default_language]
+
+    def add_group(self, key: str, members: list):
+        """
+        Registers a grouped alert (see groups): it goes to everyone who
+        watches one of its members.
+        """
+        audience = {}
+        for ticker in members:
+            for language, ids in self.audience(ticker).items():
+                recipients = audience.setdefault(language, [])
+                recipients.extend(user_id for user_id in ids if user_id not in recipients)
+        self.audiences[key] = audience
+
+    def recipient_count(self) -> int:
+        return len({user_id for audience in self.audiences.values() for ids in audience.values() for user_id in ids})
+
+def load_registry(config: dict):
+    """
+    Builds the SubscriberRegistry from the 'subscribers' config section, or
+    returns None without one (alerts then go to LINE_USER_ID in LANGUAGE).
+    """
+    subscribers = config.get('subscribers')
+    if not subscribers:
+        return None
+    return SubscriberRegistry(subscribers, config.get('assets', {}), os.getenv("LANGUAGE", DEFAULT_LANGUAGE))
@@ -0,0 +1,157 @@
+import re
+import numpy as np
+
+# Config key -> trigger label, most severe first
+LEVELS = [("level_2", "L2"), ("level_1", "L1")]
+
+# Threshold keys look like 'change_1d', 'change_3d', 'change_20d', ...
+CHANGE_KEY = re.compile(r"^change_(\d+)d$")
+# Intraday thresholds over minute bars: 'change_5m', 'change_60m', ...
+MINUTE_KEY = re.compile(r"^change_(\d+)m$")
+
+def parse_windows(level_config: dict, key_pattern=CHANGE_KEY) -> dict:
+    """
+    Maps {'change_1d': -5.0, 'change_3d': -8.0} to {1: -5.0, 3: -8.0}.
+    Keys that do not match key_pattern are ignored.
+    """
+    windows = {}
+    for key, threshold in (level_config or {}).items():
+        match = key_pattern.match(key)
+        if match and threshold is not None:
+            windows[int(match.group(1))] = float(threshold)
+    return windows
+
+def minute_changes(data: dict) -> list:
+    """
+    [(bars, change)] of the 'change_<N>m' entries of a market data dict, shortest window first.
+    """
+    return sorted((int(match.group(1)), value) for match, value in (
+        (MINUTE_KEY.match(key), value) for key, value in (data or {}).items()
+    ) if match)
+
+def merge_triggers(defaults: dict, override: dict) -> dict:
+    """
+    Applies a per-asset 'triggers' override on top of the global triggers, level by level.
+    """
+    merged = {name: dict(levels or {}) for name, levels in (defaults or {}).items()}
+    for name, levels in (override or {}).items():
+        merged.setdefault(name, {}).update(levels or {})
+    return merged
+
+def pct_change(closes: np.ndarray, days: int) -> np.ndarray:
+    """
+    N-day % change of the last column for every row of a (symbols x bars) matrix.
+    Rows without enough history come back as NaN.
+    """
+    closes = np.asarray(closes, dtype=float)
+    if closes.ndim != 2 or closes.shape[1] <= days:
+        return np.full(closes.shape[0] if closes.ndim == 2 else 0, np.nan)
+    current = closes[:, -1]
+    past = closes[:, -1 - days]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - past) / past * 100
+    # Same precision as the per-symbol market data dicts
+    return np.round(change, 2)
+
+class TriggerEngine:
+    """
+    Evaluates trigger levels for a whole universe of symbols at once.
+    Thresholds come from the global 'triggers' config; any asset may override
+    them with its own 'triggers' block in config.yaml.
+    """
+
+    def __init__(self, triggers: dict, assets: dict = None):
+        self.triggers = triggers or {}
+        self.assets = assets or {}
+        self.windows = sorted({
+            days
+            for name, _ in LEVELS
+            for days in parse_windows(self.triggers.get(name)).keys()
+        } | {
+            days
+            for info in self.assets.values()
+            for name, _ in LEVELS
+            for days in parse_windows(((info or {}).get('triggers') or {}).get(name)).keys()
+        })
+        self._compiled_for = None
+        self._thresholds = None
+
+    @property
+    def lookback(self) -> int:
+        """Number of closing prices needed to evaluate every window."""
+        return (max(self.windows) if self.windows else 0) + 1
+
+    def thresholds_for(self, symbol: str) -> dict:
+        """
+        Effective triggers config for one symbol (global merged with its override).
+        """
+        override = (self.assets.get(symbol) or {}).get('triggers')
+        return merge_triggers(self.triggers, override) if override else self.triggers
+
+    def _compile(self, symbols: tuple):
+        # Threshold arrays: {level_label: {days: float[len(symbols)]}}, NaN = not configured
+        if self._compiled_for == symbols:
+            return self._thresholds
+
+        compiled = {label: {days: np.full(len(symbols), np.nan) for days in self.windows} for _, label in LEVELS}
+        global_windows = {label: parse_windows(self.triggers.get(name)) for name, label in LEVELS}
+        for label, windows in global_windows.items():
+            for days, threshold in windows.items():
+                compiled[label][days][:] = threshold
+
+        for i, symbol in enumerate(symbols):
+            override = (self.assets.get(symbol) or {}).get('triggers')
+            if not override:
+                continue
+            for name, label in LEVELS:
+                for days, threshold in parse_windows(override.get(name)).items():
+                    compiled[label][days][i] = threshold
+
+        self._compiled_for = symbols
+        self._thresholds = compiled
+        return compiled
+
+    def changes(self, closes: np.ndarray) -> dict:
+        """
+        All configured N-day changes in one pass: {days: float[len(symbols)]}.
+        """
+        return {days: pct_change(closes, days) for days in self.windows}
+
+    def evaluate(self, symbols: list, closes: np.ndarray) -> tuple:
+        """
+        Returns (levels, changes) where levels[i] is 'L2', 'L1' or None for symbols[i].
+        A level fires if ANY of its windows is at or below its threshold.
+        """
+        symbols = tuple(symbols)
+        thresholds = self._compile(symbols)
+        changes = self.changes(closes)
+
+        levels = np.full(len(symbols), None, dtype=object)
+        undecided = np.ones(len(symbols), dtype=bool)
+
+        for _, label in LEVELS:
+            fired = np.zeros(len(symbols), dtype=bool)
+            for days, limit in thresholds[label].items():
+                # NaN on either side compares False, so missing data never fires
+                with np.errstate(invalid='ignore'):
+                    fired |= changes[days] <= limit
+            hit = fired & undecided
+            levels[hit] = label
+            undecided &= ~hit
+
+        return levels, changes
+
+    def check(self, data: dict) -> str:
+        """
+        Trigger level for a single market data dict (keys 'symbol', 'change_Nd').
+        """
+        if not data:
+            return None
+
+        triggers = self.thresholds_for(data.get('symbol'))
+        for name, label in LEVELS:
+            for days, threshold in parse_windows(triggers.get(name)).items():
+                change = data.get(f"change_{days}d")
+                if change is not None and change <= threshold:
+                    return label
+        return None
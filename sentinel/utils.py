@@ -1,20 +1,83 @@
+import heapq
+from collections import defaultdict
 from difflib import SequenceMatcher
+from .dedup import normalize
+
+FALLBACK_LINK = "https://news.google.com"
+
+# Minimum similarity for a fuzzy match to be trusted
+MIN_MATCH_RATIO = 0.4
+
+# Fuzzy comparisons are only run against this many best token-overlap candidates
+MAX_CANDIDATES = 5
+
+class TitleIndex:
+    """
+    Index over a batch of news items for resolving LLM-echoed titles to links.
+    Exact (normalized) titles resolve with one hash lookup; anything else is
+    narrowed down through a token inverted index before fuzzy matching.
+    """
+
+    def __init__(self, items: list):
+        self.items = items
+        self.exact = {}
+        self.postings = defaultdict(list)
+
+        for i, item in enumerate(items):
+            title = item.get('title', '')
+            norm = normalize(title)
+            self.exact.setdefault(norm, i)
+            # Google News titles end in " - Source"; the LLM often drops it
+            if " - " in title:
+                self.exact.setdefault(normalize(title.rsplit(" - ", 1)[0]), i)
+            for token in set(norm.split()):
+                self.postings[token].append(i)
+
+    def lookup(self, title: str) -> tuple:
+        """
+        Returns (item, score) for the best matching item, or (None, best_score)
+        when nothing is similar enough. Score is 1.0 for exact matches.
+        """
+        norm = normalize(title or "")
+        i = self.exact.get(norm)
+        if i is not None:
+            return self.items[i], 1.0
+
+        # Rare tokens say more about a headline than common ones
+        overlap = defaultdict(float)
+        for token in set(norm.split()):
+            posting = self.postings.get(token)
+            if posting:
+                weight = 1.0 / len(posting)
+                for j in posting:
+                    overlap[j] += weight
+
+        candidates = heapq.nlargest(MAX_CANDIDATES, overlap, key=overlap.get)
+        best_ratio = 0.0
+        best_item = None
+        for j in candidates:
+            ratio = SequenceMatcher(None, norm, normalize(self.items[j].get('title', ''))).ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_item = self.items[j]
+
+        if best_ratio > MIN_MATCH_RATIO:
+            return best_item, best_ratio
+        return None, best_ratio
+
+    def find_link(self, title: str) -> tuple:
+        """
+        Returns (link, score); falls back to the Google News front page.
+        """
+        item, score = self.lookup(title)
+        if item is None:
+            return FALLBACK_LINK, score
+        return item.get('link') or FALLBACK_LINK, score
 
 def find_best_match_link(ai_title: str, original_items: list) -> str:
     """
     Finds the link of the most similar title in the original list.
+    When matching many titles against the same list, build a TitleIndex once instead.
     """
-    best_ratio = 0.0
-    best_link = None
-    
-    for item in original_items:
-        ratio = SequenceMatcher(None, ai_title.lower(), item['title'].lower()).ratio()
-        if ratio > best_ratio:
-            best_ratio = ratio
-            best_link = item.get('link')
-            
-    # If the match is too poor (e.g. < 40%), maybe just return None or search result page?
-    # But usually AI uses the provided title almost exactly.
-    if best_ratio > 0.4:
-        return best_link
-    return "https://news.google.com"
+    link, _ = TitleIndex(original_items).find_link(ai_title)
+    return link